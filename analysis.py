@@ -0,0 +1,99 @@
+"""
+Background analysis of the current position, for the analysis overlay of the
+GUI.
+
+The analysis runs MCTS in a separate process, so it never blocks the UI. It
+searches in short rounds and after every round sends the scores of all legal
+moves, which get better over time, until it gets a new position.
+"""
+import logging, multiprocessing
+
+from board import Board
+from mcts import MCTS
+from config import (ANALYSIS_LOGGING_LEVEL, ANALYSIS_ROUND_TIME,
+                    ANALYSIS_MIN_VISITS)
+
+logger = logging.getLogger(__name__)
+logger.setLevel(ANALYSIS_LOGGING_LEVEL)
+
+
+def analysis_loop(pieces, connection, round_time, min_visits):
+    """
+    Main loop of the analysis process.
+
+    Receives snapshots (or None to stop) over connection and sends back
+    (snapshot, {move: score}) after every round of searching, where score is
+    the win rate (draws count half) for the player to move.
+    """
+    mcts = MCTS()
+    board = None
+    snapshot = None
+    while True:
+        # Wait for a position when there is nothing to do, only look for
+        # a new one while searching.
+        if board is None or board.game_over or connection.poll():
+            try:
+                new_snapshot = connection.recv()
+            except EOFError:
+                return
+            if new_snapshot is None:
+                return
+            if new_snapshot != snapshot:
+                snapshot = new_snapshot
+                board = Board.from_snapshot(pieces, snapshot)
+            continue
+
+        root = mcts.search(board, round_time)
+        scores = {move: value / visits
+                  for move, (visits, value) in mcts.move_stats(root).items()
+                  if visits >= min_visits}
+        connection.send((snapshot, scores))
+
+
+class BackgroundAnalyzer(object):
+    def __init__(self, pieces, round_time=ANALYSIS_ROUND_TIME,
+                 min_visits=ANALYSIS_MIN_VISITS):
+        self.connection, child_connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=analysis_loop,
+            args=(pieces, child_connection, round_time, min_visits))
+        self.process.daemon = True
+        self.process.start()
+        self.snapshot = None
+
+
+    def analyze(self, snapshot):
+        """
+        Start analyzing a new position (a board.Snapshot), if it is new.
+        Returns whether it was.
+        """
+        if snapshot == self.snapshot:
+            return False
+        self.snapshot = snapshot
+        self.connection.send(snapshot)
+        return True
+
+
+    def get_scores(self):
+        """
+        The newest scores for the current position, or None if there are no
+        new ones. Never blocks.
+        """
+        scores = None
+        while self.connection.poll():
+            snapshot, new_scores = self.connection.recv()
+            # Ignore scores of positions we moved away from.
+            if snapshot == self.snapshot:
+                scores = new_scores
+        return scores
+
+
+    def stop(self):
+        """Stop the analysis process."""
+        try:
+            self.connection.send(None)
+        except (OSError, EOFError):
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()
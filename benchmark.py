@@ -0,0 +1,187 @@
+"""
+Benchmarks of the engine and the AIs.
+
+Usage:
+    python benchmark.py startup [--runs N]
+    python benchmark.py scaling [--workers N] [--time SECONDS] [--playout NAME]
+    python benchmark.py moves [--sizes N ...] [--time SECONDS]
+    python benchmark.py perft [--depth D] [--workers N] [--no-cache]
+    python benchmark.py playouts [--time SECONDS] [--games N]
+"""
+import os, sys, time, random, argparse, subprocess
+
+from board import Board
+from constants import CROSS_COLOR, NOUGHT_COLOR, N_ROWS
+from config import MCTS_PLAYOUT
+import pieces
+
+
+def get_pieces():
+    """Pieces without any AI, the benchmarks decide who moves."""
+    return pieces.Cross(CROSS_COLOR), pieces.Nought(NOUGHT_COLOR)
+
+
+def random_position(n_rows=N_ROWS, n_moves=10, seed=0):
+    """A board after n_moves random moves (or fewer, if the game ended)."""
+    rng = random.Random(seed)
+    board = Board(get_pieces(), n_rows)
+    for _ in range(n_moves):
+        if board.game_over:
+            break
+        board.make_a_move(rng.choice(board.allowed_moves))
+    return board
+
+
+# What a headless worker imports.
+HEADLESS_IMPORTS = 'board, config, pieces, mcts, solver'
+
+
+def bench_startup(args):
+    """Time to import the engine and AIs without a display (no pygame)."""
+    check = ('import sys, {}\n'
+             'assert "pygame" not in sys.modules, "pygame was imported"'.format(
+                 HEADLESS_IMPORTS))
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    def run(code):
+        best = None
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            subprocess.check_call([sys.executable, '-c', code], cwd=here)
+            seconds = time.perf_counter() - start
+            best = seconds if best is None else min(best, seconds)
+        return best
+
+    interpreter = run('pass')
+    headless = run(check)
+    print('interpreter startup:     {:.1f} ms\n'
+          'headless engine import:  {:.1f} ms'.format(
+              interpreter * 1000, (headless - interpreter) * 1000))
+
+
+def bench_scaling(args):
+    """Speed of the parallel search compared to the single core engine."""
+    from parallel_search import measure_scaling
+    board = random_position(args.n_rows, args.moves, args.seed)
+    result = measure_scaling(board, args.workers, args.time, args.playout)
+    print('workers:                 {workers}\n'
+          'single core iter/s:      {single_iterations_per_second:.0f}\n'
+          'parallel iter/s:         {parallel_iterations_per_second:.0f}\n'
+          'speedup:                 {speedup:.2f}\n'
+          'efficiency:              {efficiency:.1%}'.format(**result))
+
+
+def bench_moves(args):
+    """Cost of a move (with win detection and allowed moves) by n_rows."""
+    print('n_rows   games   moves/game   us/move')
+    for n_rows in args.sizes:
+        rng = random.Random(args.seed)
+        pieces_ = get_pieces()
+        n_games = n_moves = 0
+        seconds = 0.0
+        while seconds < args.time:
+            board = Board(pieces_, n_rows)
+            start = time.perf_counter()
+            while not board.game_over:
+                board.make_a_move(rng.choice(board.allowed_moves))
+                n_moves += 1
+            seconds += time.perf_counter() - start
+            n_games += 1
+        print('{:>6} {:>7} {:>12.1f} {:>9.2f}'.format(
+            n_rows, n_games, n_moves / n_games, seconds / n_moves * 1e6))
+
+
+def bench_perft(args):
+    """Move generation speed: perft from a random position, in nodes/s."""
+    import perft
+    board = random_position(args.n_rows, args.moves, args.seed)
+    depth, counts, divided, moves, seconds = perft.run(
+        board, args.depth, args.workers, args.cache)[-1]
+    print('depth:                   {}\n'
+          'leaves:                  {}\n'
+          'seconds:                 {:.3f}\n'
+          'leaves/s:                {:.0f}\n'
+          'moves/s:                 {:.0f}'.format(
+              depth, counts[perft.LEAVES], seconds,
+              counts[perft.LEAVES] / seconds, moves / seconds))
+
+
+def bench_playouts(args):
+    """Speed of the playout policies, and tactical against random in MCTS."""
+    from playout import POLICIES
+    from selfplay import Players, play_game
+    rng = random.Random(args.seed)
+    positions = [random_position(args.n_rows, n_moves, args.seed + n_moves)
+                 for n_moves in range(0, 40, 4)]
+    positions = [board for board in positions if not board.game_over]
+    for name, policy_class in sorted(POLICIES.items()):
+        policy = policy_class()
+        n_playouts = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < args.time:
+            for board in positions:
+                policy.play(board.clone(), rng)
+                n_playouts += 1
+        seconds = time.perf_counter() - start
+        print('{:<9} playouts/s:    {:.0f}'.format(name, n_playouts / seconds))
+
+    specs = [('mcts.MCTSAI', {'playout': name, 'use_solver': False,
+                              'time_budget': args.move_time})
+             for name in ('tactical', 'random')]
+    score = {'tactical': 0, 'random': 0, 'draw': 0}
+    players = Players()
+    for game in range(args.games):
+        order = specs if game % 2 == 0 else specs[::-1]
+        seed = args.seed + game
+        winner = play_game(order, args.n_rows, seed,
+                           players.get(order, seed))[0]
+        score[order[winner - 1][1]['playout'] if winner else 'draw'] += 1
+    print('tactical against random ({} games, {}s per move): {} wins, {} '
+          'losses, {} draws'.format(args.games, args.move_time,
+                                    score['tactical'], score['random'],
+                                    score['draw']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--n-rows', type=int, default=N_ROWS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--moves', type=int, default=10,
+                        help='random moves to play before measuring')
+    subparsers = parser.add_subparsers(dest='benchmark')
+    subparsers.required = True
+
+    startup = subparsers.add_parser('startup', help=bench_startup.__doc__)
+    startup.add_argument('--runs', type=int, default=5)
+    startup.set_defaults(func=bench_startup)
+
+    scaling = subparsers.add_parser('scaling', help=bench_scaling.__doc__)
+    scaling.add_argument('--workers', type=int, default=None)
+    scaling.add_argument('--time', type=float, default=2.0)
+    scaling.add_argument('--playout', default=MCTS_PLAYOUT)
+    scaling.set_defaults(func=bench_scaling)
+
+    moves = subparsers.add_parser('moves', help=bench_moves.__doc__)
+    moves.add_argument('--sizes', type=int, nargs='+', default=[2, 3, 4, 5])
+    moves.add_argument('--time', type=float, default=1.0)
+    moves.set_defaults(func=bench_moves)
+
+    perft_ = subparsers.add_parser('perft', help=bench_perft.__doc__)
+    perft_.add_argument('--depth', type=int, default=4)
+    perft_.add_argument('--workers', type=int, default=1)
+    perft_.add_argument('--no-cache', dest='cache', action='store_false')
+    perft_.set_defaults(func=bench_perft)
+
+    playouts = subparsers.add_parser('playouts', help=bench_playouts.__doc__)
+    playouts.add_argument('--time', type=float, default=2.0,
+                          help='seconds to measure the speed of each policy')
+    playouts.add_argument('--games', type=int, default=10)
+    playouts.add_argument('--move-time', type=float, default=0.1)
+    playouts.set_defaults(func=bench_playouts)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,15 +1,71 @@
-import math, logging
-import pygame
-
-from inherit_docstring import InheritableDocstrings
+import time, array, logging, functools
 
+import megatile_table
+import telemetry
 from pieces import Piece
-from config import BOARD_LOGGING_LEVEL
+from config import BOARD_LOGGING_LEVEL, TELEMETRY_BUDGET_SLACK
 
 logger = logging.getLogger(__name__)
 logger.setLevel(BOARD_LOGGING_LEVEL)
 
+# Values of Board.target when moves are not restricted to one megatile.
+ANYWHERE = -1
+NOWHERE = -2
+
+
+@functools.lru_cache(maxsize=None)
+def get_geometry(n_rows):
+    """
+    Lookup lists for a board with n_rows, so moves don't need to scan it:
+        megatile_cells:  cell numbers (x * n_rows ** 2 + y) of every megatile,
+                         in local order (x % n_rows * n_rows + y % n_rows)
+        megatile_coords: the (x, y) coordinates of those cells
+        local_lines:     numbers of the lines through every local cell: x
+                         fixed (0 to n_rows - 1), y fixed (n_rows to
+                         2 * n_rows - 1), diagonal, anti-diagonal
+        line_coords:     local coordinates of every line, like check_has_line
+                         returns them
+    """
+    n = n_rows
+    size = n**2
+    megatile_coords = [[(big_x * n + x, big_y * n + y)
+                        for x in range(n) for y in range(n)]
+                       for big_x in range(n) for big_y in range(n)]
+    megatile_cells = [[x * size + y for x, y in coords]
+                      for coords in megatile_coords]
+    local_lines = []
+    for x in range(n):
+        for y in range(n):
+            lines = [x, n + y]
+            if x == y:
+                lines.append(2 * n)
+            if x == n - 1 - y:
+                lines.append(2 * n + 1)
+            local_lines.append(tuple(lines))
+    line_coords = ([[[x, y] for y in range(n)] for x in range(n)] +
+                   [[[x, y] for x in range(n)] for y in range(n)] +
+                   [[[i, i] for i in range(n)],
+                    [[i, n - 1 - i] for i in range(n)]])
+    return megatile_cells, megatile_coords, local_lines, line_coords
+
+
+@functools.lru_cache(maxsize=None)
+def get_big_lines(n_rows):
+    """
+    The megatiles (x * n_rows + y) of every big line, in the order of the
+    lines of get_geometry. The big lines through megatile m are
+    get_geometry(n_rows)[2][m], like the lines through a local cell.
+    """
+    return tuple(tuple(x * n_rows + y for x, y in line)
+                 for line in get_geometry(n_rows)[3])
+
+
 class Board(object):
+    # End the game as a draw as soon as nobody can complete a big line any
+    # more (see is_dead_draw), in stead of when there are no moves left.
+    # Searches set this on their boards, the game plays on.
+    end_dead_draws = False
+
     def __init__(self, pieces, n_rows):
         # Verify pieces
         self.pieces = []
@@ -25,6 +81,13 @@ class Board(object):
         else:
             raise TypeError('n_rows must be an int, got {}'.format(type(n_rows)))
 
+        # Code of each piece in snapshots, 0 means empty.
+        self.piece_codes = {piece: i + 1 for i, piece in enumerate(self.pieces)}
+        # Lookup tables for megatiles, if there are any for this board.
+        if megatile_table.applies_to(self.n_rows, len(self.pieces)):
+            self.table = megatile_table.get_table()
+        else:
+            self.table = None
         self.reset()
 
 
@@ -32,13 +95,39 @@ class Board(object):
         """Reset the board to play a game from the start."""
         self.subtiles  = [[None]*self.n_rows**2 for i in range(self.n_rows**2)]
         self.megatiles = [[None]*self.n_rows    for i in range(self.n_rows)]
+        # Flat copies of subtiles and megatiles with piece codes, for snapshots.
+        self.cell_codes     = bytearray(self.n_rows**4)
+        self.megatile_codes = bytearray(self.n_rows**2)
+        # Columns of subtiles that might be shared with a clone.
+        self.own_columns = [True] * self.n_rows**2
+        # States of the megatiles in self.table, see megatile_table.
+        self.megatile_states = None if self.table is None else [0] * self.n_rows**2
+        # Without a table: per piece, the number of its pieces in every line
+        # of every megatile (megatile * (2 * n_rows + 2) + line, see
+        # get_geometry).
+        if self.table is None:
+            self.line_counts = [[0] * (self.n_rows**2 * (2 * self.n_rows + 2))
+                                for piece in self.pieces]
+        else:
+            self.line_counts = None
+        # Empty subtiles per megatile and in all megatiles nobody won.
+        self.empty_counts = [self.n_rows**2] * self.n_rows**2
+        self.n_open_empty = self.n_rows**4
+        # Per megatile, bit i is set if piece i can still win it (see
+        # get_chances), and the same per big line (see get_big_lines) for
+        # completing it.
+        everyone = (1 << len(self.pieces)) - 1
+        self.megatile_chances = bytearray([everyone]) * self.n_rows**2
+        self.big_line_chances = bytearray([everyone]) * (2 * self.n_rows + 2)
 
         self.clear_allowed_moves()
-        for x in range(self.n_rows**2):
-            self.allowed_moves.extend([(x, y) for y in range(self.n_rows**2)])
+        # allowed_moves is made from target when it's needed.
+        self.target = ANYWHERE
+        self._allowed_moves = None
 
         self.winning_lines = []
         self.game_over = False
+        self.winner = None
         self.turn = 0
 
 
@@ -53,7 +142,10 @@ class Board(object):
 
     def check_for_draw(self):
         """Check if there is a draw and update the board accordingly"""
-        if len(self.allowed_moves):
+        if self.end_dead_draws and self.is_dead_draw():
+            logger.info('Dead draw!')
+            return True
+        if self.has_allowed_moves():
             return False
         # If there are no allowed moves, there is a draw
         logger.info('Draw!')
@@ -83,6 +175,11 @@ class Board(object):
         area_coords = winning_info[0]
         logger.info('{} won megatile {}'.format(last_piece, area_coords))
         self.megatiles[area_coords[0]][area_coords[1]] = last_piece
+        index = area_coords[0] * self.n_rows + area_coords[1]
+        if not self.megatile_codes[index]:
+            # Its empty subtiles can't be played anymore.
+            self.n_open_empty -= self.empty_counts[index]
+        self.megatile_codes[index] = self.piece_codes[last_piece]
 
         # Check for game
         big_winning_line = self.check_has_line(last_piece, area_coords, self.megatiles)
@@ -111,6 +208,27 @@ class Board(object):
         # Coords of last_move in megatile:
         small_coords = (last_move[0] % self.n_rows, last_move[1] % self.n_rows)
 
+        if self.megatile_states is not None:
+            # Only the lines through the last move count.
+            state = self.megatile_states[big_x * self.n_rows + big_y]
+            lines = self.table.lines_won[self.piece_codes[last_piece] - 1][state] & \
+                    megatile_table.CELL_LINES[small_coords[0] * self.n_rows + small_coords[1]]
+            line = megatile_table.first_line(lines)
+            if line is None:
+                return None
+            return ((big_x, big_y), megatile_table.line_coords(line))
+
+        if self.line_counts is not None:
+            # A line is won when all its subtiles have the piece.
+            n = self.n_rows
+            _, _, local_lines, line_coords = get_geometry(n)
+            counts = self.line_counts[self.pieces.index(last_piece)]
+            offset = (big_x * n + big_y) * (2 * n + 2)
+            for line in local_lines[small_coords[0] * n + small_coords[1]]:
+                if counts[offset + line] == n:
+                    return ((big_x, big_y), [coords[:] for coords in line_coords[line]])
+            return None
+
         # Create working area
         working_grid = []
         for x in range(self.n_rows):
@@ -178,6 +296,79 @@ class Board(object):
         return winning_coords or None
 
 
+    def get_chances(self, megatile):
+        """
+        Bitmask of the pieces that can still win the megatile (index
+        x * n_rows + y): bit i is set if piece i has a line in it without
+        pieces of the others. 0 for megatiles that are won already.
+        """
+        if self.megatile_codes[megatile]:
+            return 0
+        if self.megatile_states is not None:
+            return self.table.chances[self.megatile_states[megatile]]
+        n_lines = 2 * self.n_rows + 2
+        start, end = megatile * n_lines, (megatile + 1) * n_lines
+        counts = [piece_counts[start:end] for piece_counts in self.line_counts]
+        if len(counts) == 2:
+            # A line without pieces of the other.
+            return (0 in counts[1]) | (0 in counts[0]) << 1
+        chances = 0
+        for i in range(len(counts)):
+            # The number of pieces of the others in every line.
+            others = map(sum, zip(*(counts[j] for j in range(len(counts))
+                                    if j != i)))
+            if 0 in others:
+                chances |= 1 << i
+        return chances
+
+
+    def update_chances(self, megatile, piece=None):
+        """
+        Update the chances of the megatile after a move in it, and of the big
+        lines through it if they changed.
+
+        If piece (its index) was put on an empty subtile, only the chances of
+        the others can be lost, so nothing is done if they are already gone
+        (and the megatile wasn't won).
+        """
+        if piece is not None and not self.megatile_codes[megatile] and \
+           not self.megatile_chances[megatile] & ~(1 << piece):
+            return
+        chances = self.get_chances(megatile)
+        if chances != self.megatile_chances[megatile]:
+            self.megatile_chances[megatile] = chances
+            self.update_big_line_chances(get_geometry(self.n_rows)[2][megatile])
+
+
+    def update_big_line_chances(self, lines):
+        """Update the chances of the big lines (numbers, see get_big_lines)."""
+        codes, chances = self.megatile_codes, self.megatile_chances
+        big_lines = get_big_lines(self.n_rows)
+        for line in lines:
+            # A megatile helps its owner and whoever can still win it.
+            line_chances = (1 << len(self.pieces)) - 1
+            for m in big_lines[line]:
+                line_chances &= chances[m] | (1 << codes[m] >> 1)
+            self.big_line_chances[line] = line_chances
+
+
+    def is_dead_draw(self):
+        """
+        Check whether the game can only end in a draw, because nobody can
+        complete a big line any more, even though there may be moves left.
+        """
+        return not self.game_over and not any(self.big_line_chances)
+
+
+    def dead_megatiles(self):
+        """
+        Indices (x * n_rows + y) of the megatiles nobody won and nobody can
+        win any more. Moves in them only decide where the opponent plays next.
+        """
+        return [m for m, chances in enumerate(self.megatile_chances)
+                if not chances and not self.megatile_codes[m]]
+
+
     def make_a_move(self, coords, forced=False):
         """
         Add piece of whoever's turn it is to the given coordinates.
@@ -186,9 +377,14 @@ class Board(object):
         """
         piece = self.get_turn()
         if self.set_tile(coords, piece, forced):
-            if len(self.find_winner(piece, coords)) > 1:
+            won_game = len(self.find_winner(piece, coords)) > 1
+            n = self.n_rows
+            self.update_chances(coords[0] // n * n + coords[1] // n,
+                                None if forced else self.turn)
+            if won_game:
                 # Someone won the game
                 self.game_over = True
+                self.winner = piece
                 self.clear_allowed_moves()
                 return True
 
@@ -202,49 +398,129 @@ class Board(object):
         return False
 
 
+    @property
+    def allowed_moves(self):
+        """
+        List of the coordinates of the allowed moves.
+
+        Moves only keep track of the megatile the next move must be played in
+        (self.target), the list is only made when it is asked for.
+        """
+        if self._allowed_moves is None:
+            self._allowed_moves = self.list_allowed_moves()
+        return self._allowed_moves
+
+
+    @allowed_moves.setter
+    def allowed_moves(self, moves):
+        self._allowed_moves = moves
+        n = self.n_rows
+        megatiles = {x // n * n + y // n for x, y in moves}
+        if not megatiles:
+            self.target = NOWHERE
+        elif len(megatiles) == 1:
+            self.target = megatiles.pop()
+        else:
+            self.target = ANYWHERE
+
+
+    def list_allowed_moves(self):
+        """Make the list of allowed moves from self.target."""
+        if self.target == NOWHERE:
+            return []
+        if self.target != ANYWHERE:
+            return self.get_empty_subtiles(divmod(self.target, self.n_rows))
+        allowed_moves = []
+        for x in range(self.n_rows):
+            for y in range(self.n_rows):
+                if self.megatiles[x][y] is None:
+                    allowed_moves.extend(self.get_empty_subtiles((x, y)))
+        return allowed_moves
+
+
+    def has_allowed_moves(self):
+        if self.target == NOWHERE:
+            return False
+        if self.target == ANYWHERE:
+            return self.n_open_empty > 0
+        return True
+
+
+    def is_allowed(self, coords):
+        """Check whether a move is allowed, without making the list."""
+        x, y = coords
+        n = self.n_rows
+        if self.target == NOWHERE or not (0 <= x < n**2 and 0 <= y < n**2) \
+           or self.cell_codes[x * n**2 + y]:
+            return False
+        megatile = x // n * n + y // n
+        if self.target == ANYWHERE:
+            return not self.megatile_codes[megatile]
+        return megatile == self.target
+
+
     def clear_allowed_moves(self):
         self.allowed_moves = []
 
 
     def update_allowed_moves(self, last_move):
         self.clear_allowed_moves()
-        big_x, big_y = last_move[0] % self.n_rows, last_move[1] % self.n_rows
-        if self.megatiles[big_x][big_y] is None:
+        target = last_move[0] % self.n_rows * self.n_rows + last_move[1] % self.n_rows
+        if not self.megatile_codes[target] and self.empty_counts[target]:
             # Play withing this megatile
-            self.allowed_moves = self.get_empty_subtiles((big_x, big_y))
-            if self.allowed_moves:
-                # There are allowed moves
-                return
-
-        # This megatile was occupied or
-        # There were no allowed moves
-        # >> play anywhere
-        for x in range(self.n_rows):
-            for y in range(self.n_rows):
-                if self.megatiles[x][y] is None:
-                    allowed_moves = self.get_empty_subtiles((x, y))
-                    self.allowed_moves.extend(allowed_moves)
+            self.target = target
+        else:
+            # This megatile was occupied or
+            # There were no allowed moves
+            # >> play anywhere
+            self.target = ANYWHERE
+        self._allowed_moves = None
 
 
     def get_empty_subtiles(self, big_coords):
-        empty = []
-        start_x, start_y = big_coords[0] * self.n_rows, big_coords[1] * self.n_rows
-
-        for x in range(self.n_rows):
-            empty.extend([
-                (start_x + x, start_y + y)
-                for y in range(self.n_rows)
-                if self.get_tile((start_x + x, start_y + y)) is None
-            ])
-
-        return empty
+        index = big_coords[0] * self.n_rows + big_coords[1]
+        cells, coords = get_geometry(self.n_rows)[:2]
+        cell_codes = self.cell_codes
+        return [move for cell, move in zip(cells[index], coords[index])
+                if not cell_codes[cell]]
 
 
     def set_tile(self, coords, value, forced=False):
         """Set the value of the tile at coordinates to given piece."""
-        if forced or coords in self.allowed_moves:
+        if forced or self.is_allowed(coords):
             if value in self.pieces:
-                self.subtiles[coords[0]][coords[1]] = value
+                x, y = coords
+                if not self.own_columns[x]:
+                    # Copy on write, the column is shared with a clone.
+                    self.subtiles[x] = self.subtiles[x][:]
+                    self.own_columns[x] = True
+                self.subtiles[x][y] = value
+
+                n = self.n_rows
+                cell = x * n**2 + y
+                code = self.piece_codes[value]
+                old = self.cell_codes[cell]
+                megatile = x // n * n + y // n
+                local = x % n * n + y % n
+                if self.megatile_states is not None:
+                    self.megatile_states[megatile] += \
+                        (code - old) * megatile_table.POWERS[local]
+                if self.line_counts is not None:
+                    offset = megatile * (2 * n + 2)
+                    lines = get_geometry(n)[2][local]
+                    if old:
+                        counts = self.line_counts[old - 1]
+                        for line in lines:
+                            counts[offset + line] -= 1
+                    counts = self.line_counts[code - 1]
+                    for line in lines:
+                        counts[offset + line] += 1
+                if not old:
+                    self.empty_counts[megatile] -= 1
+                    if not self.megatile_codes[megatile]:
+                        self.n_open_empty -= 1
+                self.cell_codes[cell] = code
+                self._allowed_moves = None
             else:
                 raise ValueError("Value should be one of the board's pieces.")
             return True
@@ -255,292 +531,366 @@ class Board(object):
         return self.subtiles[coords[0]][coords[1]]
 
 
+    def snapshot(self):
+        """Return an immutable Snapshot of the current state."""
+        return Snapshot(self.n_rows, bytes(self.cell_codes),
+                        bytes(self.megatile_codes), self.turn,
+                        tuple(self.allowed_moves), self.game_over,
+                        self.piece_codes.get(self.winner, 0))
 
-class AIBoard(Board):
-    """API for AI players."""
-    def __init__(self, *args, **kwargs):
-        logger.debug('args: {}'.format(args))
-        logger.debug('kwargs: {}'.format(kwargs))
-        self.mutations = {}
-        super(AIBoard, self).__init__(*args, **kwargs)
-        self.mutations = {piece: [] for piece in self.pieces if piece.is_AI()}
-        self.reset()
-
-    def reset(self):
-        """Reset the board"""
-        super(AIBoard, self).reset()
-        for ai in self.mutations:
-            ai.save_board_info(self.n_rows, self.pieces)
-
-    def add_mutation(self, coords, piece):
-        for ai in self.mutations:
-            self.mutations[ai].append((coords, piece))
 
+    def restore(self, snapshot):
+        """Put the board in the state saved in snapshot."""
+        if snapshot.n_rows != self.n_rows:
+            raise ValueError('Snapshot has n_rows {}, board has {}'.format(
+                snapshot.n_rows, self.n_rows))
+        self.reset()
+        size = self.n_rows**2
+        pieces = (None,) + tuple(self.pieces)
+        for i, code in enumerate(snapshot.cells):
+            self.subtiles[i // size][i % size] = pieces[code]
+        for i, code in enumerate(snapshot.megatiles):
+            self.megatiles[i // self.n_rows][i % self.n_rows] = pieces[code]
+        self.cell_codes[:] = snapshot.cells
+        self.megatile_codes[:] = snapshot.megatiles
+        n = self.n_rows
+        cells, _, local_lines, _ = get_geometry(n)
+        for megatile, megatile_cells in enumerate(cells):
+            codes = [snapshot.cells[cell] for cell in megatile_cells]
+            if self.megatile_states is not None:
+                self.megatile_states[megatile] = megatile_table.encode(codes)
+            if self.line_counts is not None:
+                offset = megatile * (2 * n + 2)
+                for local, code in enumerate(codes):
+                    if code:
+                        for line in local_lines[local]:
+                            self.line_counts[code - 1][offset + line] += 1
+            self.empty_counts[megatile] = codes.count(0)
+        self.n_open_empty = sum(count for megatile, count in enumerate(self.empty_counts)
+                                if not self.megatile_codes[megatile])
+        for megatile in range(n**2):
+            self.megatile_chances[megatile] = self.get_chances(megatile)
+        self.update_big_line_chances(range(2 * n + 2))
+        self.allowed_moves = list(snapshot.allowed_moves)
+        self.turn = snapshot.turn
+        self.game_over = snapshot.game_over
+        self.winner = pieces[snapshot.winner]
+
+
+    @classmethod
+    def from_snapshot(cls, pieces, snapshot):
+        """Create a (rules only) Board in the state saved in snapshot."""
+        board = Board(pieces, snapshot.n_rows)
+        board.restore(snapshot)
+        return board
+
+
+    def clone(self):
+        """
+        Return a (rules only) Board with the same state, to try out moves on.
 
-    def get_mutations(self, ai):
-        if ai in self.mutations:
-            out = self.mutations[ai]
-            self.mutations[ai] = []
-            return out
+        The columns of subtiles are shared until either board writes to them,
+        so cloning is cheap, even when done for every node of a search.
+        """
+        other = Board.__new__(Board)
+        other.pieces = self.pieces
+        other.n_rows = self.n_rows
+        other.piece_codes = self.piece_codes
+        other.table = self.table
+
+        other.subtiles = self.subtiles[:]
+        other.own_columns = [False] * len(self.subtiles)
+        self.own_columns = [False] * len(self.subtiles)
+        other.megatiles = [column[:] for column in self.megatiles]
+        other.cell_codes = self.cell_codes[:]
+        other.megatile_codes = self.megatile_codes[:]
+        if self.megatile_states is None:
+            other.megatile_states = None
         else:
-            raise ValueError("{} not in known AIs".format(ai))
+            other.megatile_states = self.megatile_states[:]
+        if self.line_counts is None:
+            other.line_counts = None
+        else:
+            other.line_counts = [counts[:] for counts in self.line_counts]
+        other.empty_counts = self.empty_counts[:]
+        other.n_open_empty = self.n_open_empty
+        other.megatile_chances = self.megatile_chances[:]
+        other.big_line_chances = self.big_line_chances[:]
+        other.end_dead_draws = self.end_dead_draws
+
+        other.target = self.target
+        if self._allowed_moves is None:
+            other._allowed_moves = None
+        else:
+            other._allowed_moves = self._allowed_moves[:]
+        other.winning_lines = self.winning_lines[:]
+        other.game_over = self.game_over
+        other.winner = self.winner
+        other.turn = self.turn
+        return other
 
 
-    def make_a_move(self, coords, *args, **kwargs):
-        player = self.get_turn()
-        if super(AIBoard, self).make_a_move(coords, *args, **kwargs):
-            self.add_mutation(coords, player)
-            return True
-        return False
 
+# Code of empty allowed moves in packed snapshots.
+ALLOWED_CODE = 255
 
 
-class PygameBoard(AIBoard, metaclass=InheritableDocstrings):
-    def __init__(self, pieces, tile_size, line_thickness, margin, style, n_rows):
-        super(PygameBoard, self).__init__(pieces, n_rows)
+class Snapshot(object):
+    """
+    Immutable, compact copy of the state of a Board.
 
-        # Calculate board size
-        if not tile_size % 2:
-            logger.warn('The style of the board is best with an odd tile_size.')
+    Subtile (x, y) is cells[x * n_rows ** 2 + y] and megatile (x, y) is
+    megatiles[x * n_rows + y]. They hold 0 for empty, or the index of the
+    piece in board.pieces plus 1. Snapshots are hashable, so they can be used
+    as dictionary keys. winner is the code of the winner, 0 if there is none.
+    """
+    __slots__ = ('n_rows', 'cells', 'megatiles', 'turn', 'allowed_moves',
+                 'game_over', 'winner')
 
-        self.tile_size = tile_size
-        self.line_thickness = line_thickness
-        self.tile_line_size = tile_size + 2 * line_thickness
-        self.margin = margin
+    def __init__(self, n_rows, cells, megatiles, turn, allowed_moves,
+                 game_over, winner=0):
+        for name, value in (('n_rows', n_rows), ('cells', cells),
+                            ('megatiles', megatiles), ('turn', turn),
+                            ('allowed_moves', allowed_moves),
+                            ('game_over', game_over), ('winner', winner)):
+            object.__setattr__(self, name, value)
 
-        for name in ['tile_size', 'line_thickness', 'margin']:
-            attr = getattr(self, name)
-            if not isinstance(attr, int):
-                raise TypeError('{} must be an int, got {}.'.format(name, type(attr)))
+    def __setattr__(self, name, value):
+        raise AttributeError('Snapshot is immutable')
 
-        self.inner_size = n_rows**2 * self.tile_line_size
-        self.outer_size = self.inner_size + margin * 2
+    def __delattr__(self, name):
+        raise AttributeError('Snapshot is immutable')
 
-        self.style = style
+    def __reduce__(self):
+        return (Snapshot, self.as_tuple())
 
+    def as_tuple(self):
+        return (self.n_rows, self.cells, self.megatiles, self.turn,
+                self.allowed_moves, self.game_over, self.winner)
 
-    def pygame_init(self):
-        """Initialize everything to do with pygame."""
-        self.outer_surface = pygame.Surface([self.outer_size]*2)
-        self.outer_surface.fill(self.style['background-color'])
+    def __eq__(self, other):
+        if not isinstance(other, Snapshot):
+            return NotImplemented
+        return self.as_tuple() == other.as_tuple()
 
-        # Draw the row and column numbers.
-        font = pygame.font.Font(pygame.font.match_font(self.style['font-name']), self.style['font-size'])
-        for i in range(self.n_rows**2):
-            f = font.render(str(i), False, self.style['text-color'])
-            rect = f.get_rect()
-            rect.topleft = (
-                self.tile_line_size*(i+1)-rect.width/2-self.tile_line_size/2+self.margin,
-                self.margin/2-rect.height/2
-            )
-            self.outer_surface.blit(f, rect)
-            rect.topleft = (
-                self.margin/2-rect.width/2,
-                self.tile_line_size*(i+1)-rect.height/2-self.tile_line_size/2+self.margin
-            )
-            self.outer_surface.blit(f, rect)
+    def __hash__(self):
+        return hash(self.as_tuple())
 
-        self.surface = pygame.Surface([self.inner_size]*2)
-        self.highlight_surf = pygame.Surface([self.inner_size]*2, pygame.SRCALPHA)
-        self.draw_board()
+    def __repr__(self):
+        return 'Snapshot(n_rows={}, turn={}, game_over={})'.format(
+            self.n_rows, self.turn, self.game_over)
 
-    @copy_ancestor_docstring
-    def reset(self):
-        super(PygameBoard, self).reset()
-        self.highlights = []
-
-
-    def draw_board(self):
-        """Draw the board to the surface, with everything on it."""
-        self.surface.fill(self.style['background-color'])
-
-        for x in range(self.n_rows**2):
-            for y in range(self.n_rows**2):
-                # First draw the tile itself, which is just some borders.
-                pos = self.coords_to_pos((x, y))
-
-                logger.debug('PygameBoard.draw_board')
-                logger.debug('{}, {}'.format('pos', pos))
-
-                rect = pygame.Rect(pos, [self.tile_line_size]*2)
-                pygame.draw.rect(
-                    self.surface,
-                    self.style['small-border-color'],
-                    rect,
-                    self.line_thickness
-                )
-
-                # Then draw a piece in it, if necessary.
-                tile = self.get_tile((x, y))
-                pos = (pos[0] + self.line_thickness, pos[1] + self.line_thickness)
-                if tile is not None:
-                    tile_surface = pygame.Surface([self.tile_size]*2)
-                    tile_surface.fill(self.style['background-color'])
-                    tile.draw(tile_surface)
-                    self.surface.blit(tile_surface, pos)
-
-        # Now draw the four "big" lines on the board.
-        for n in range(1, self.n_rows):
-            start = self.n_rows*self.tile_line_size*n - self.line_thickness
-            lines = [
-                ((start, 0), (start, self.inner_size)),
-                ((0, start), (self.inner_size, start))
-            ]
-
-            for line in lines:
-                pygame.draw.line(self.surface, self.style['big-border-color'],
-                                 line[0], line[1], self.line_thickness * 2)
-
-        for line in self.winning_lines:
-            pygame.draw.line(
-                self.highlight_surf,
-                self.style['winning-line-color'],
-                line[0],
-                line[1],
-                self.style['winning-line-thickness']
-            )
-            for end in line:
-                pygame.draw.circle(self.highlight_surf,
-                    self.style['winning-line-color'],
-                    end,
-                    self.style['winning-line-thickness'] // 2,
-                    0
-                )
+    def get_tile(self, coords):
+        """Get the code of the tile at coordinates."""
+        return self.cells[coords[0] * self.n_rows**2 + coords[1]]
 
-        self.surface.blit(self.highlight_surf, (0, 0))
-        self.outer_surface.blit(self.surface, [self.margin]*2)
+    def get_megatile(self, big_coords):
+        """Get the code of the owner of the megatile at coordinates."""
+        return self.megatiles[big_coords[0] * self.n_rows + big_coords[1]]
 
+    @staticmethod
+    def packed_size(n_rows):
+        """Number of bytes of a packed snapshot of a board with n_rows."""
+        return n_rows**4 + n_rows**2 + 2
 
-    def coords_to_pos(self, coords):
+    def pack(self):
         """
-        Take coordinates (from 0 to n_rows ** 2 - 1) and turn them into pixel positions.
+        Encode the snapshot in packed_size(n_rows) bytes: the cells, in which
+        empty allowed moves are ALLOWED_CODE, the megatiles, the turn and
+        the winner.
         """
-        logger.debug('PygameBoard.coords_to_pos')
-        logger.debug('{}, {}, {}, {}'.format('Coords', coords, type(coords), [type(x) for x in coords]))
-        x, y = coords
-        return (x)*self.tile_line_size, (y)*self.tile_line_size
+        size = self.n_rows**2
+        cells = bytearray(self.cells)
+        for x, y in self.allowed_moves:
+            cells[x * size + y] = ALLOWED_CODE
+        return bytes(cells) + self.megatiles + bytes((self.turn, self.winner))
+
+    @classmethod
+    def unpack(cls, n_rows, data):
+        """Decode bytes made by pack (allowed_moves come out in cell order)."""
+        data = bytes(data)
+        n_cells = n_rows**4
+        size = n_rows**2
+        allowed_moves = tuple(divmod(i, size)
+                              for i, code in enumerate(data[:n_cells])
+                              if code == ALLOWED_CODE)
+        cells = data[:n_cells].replace(bytes((ALLOWED_CODE,)), b'\x00')
+        megatiles = data[n_cells:n_cells + size]
+        turn, winner = data[n_cells + size], data[n_cells + size + 1]
+        return cls(n_rows, cells, megatiles, turn, allowed_moves,
+                   not allowed_moves, winner)
+
+
+
+class MoveLog(object):
+    """
+    Append-only log of the moves of a game, shared by everyone who wants to
+    know them: the cell numbers (x * n_rows ** 2 + y) and piece codes are
+    kept in two typed arrays and every consumer has a read cursor, so a move
+    costs the same no matter how many consumers there are.
+    """
+    def __init__(self, n_rows, pieces):
+        self.size = n_rows**2
+        self.pieces = (None,) + tuple(pieces)
+        self.cursors = {}
+        self.clear()
+
+    def clear(self):
+        """Start a new game, views of the old one stay as they are."""
+        self.cells = array.array('H')
+        self.codes = array.array('B')
+        for consumer in self.cursors:
+            self.cursors[consumer] = 0
+
+    def __len__(self):
+        return len(self.cells)
+
+    def append(self, coords, code):
+        self.cells.append(coords[0] * self.size + coords[1])
+        self.codes.append(code)
+
+    def add_consumer(self, consumer):
+        """Give consumer (anything hashable) a cursor at the first move."""
+        self.cursors.setdefault(consumer, 0)
+
+    def remove_consumer(self, consumer):
+        del self.cursors[consumer]
+
+    def read(self, consumer):
+        """
+        The moves consumer hasn't read yet, as a MoveLogView, and move its
+        cursor to the end. Raises KeyError for unknown consumers.
+        """
+        start = self.cursors[consumer]
+        end = self.cursors[consumer] = len(self.cells)
+        return MoveLogView(self, start, end)
 
 
-    def pos_to_coords(self, pos):
-        """Take pixel positions and turn them into coordinates (from 0 to n_rows ** 2 - 1)."""
-        x, y = pos
-        coords = (int(math.floor(x/self.tile_line_size)), int(math.floor(y/self.tile_line_size)))
-        logger.debug('PygameBoard.pos_to_coords')
-        logger.debug('{}, {}, {}, {}'.format('Coords', coords, type(coords), [type(x) for x in coords]))
-        return coords
+class MoveLogView(object):
+    """
+    Moves start to end of a MoveLog, as a sequence of ((x, y), piece) tuples
+    that are only made when they are read.
+    """
+    __slots__ = ('cells', 'codes', 'size', 'pieces', 'start', 'end')
 
+    def __init__(self, log, start, end):
+        self.cells, self.codes = log.cells, log.codes
+        self.size, self.pieces = log.size, log.pieces
+        self.start, self.end = start, end
 
-    def find_winner(self, last_piece, last_move):
-        """
-        Check if someone won a megatile and maybe even the whole game!
-        Also updates self.megatiles and self.highlights accordingly.
-        """
-        lines = super(PygameBoard, self).find_winner(last_piece, last_move)
-        if lines:
-            area_coords = lines[0][0]
-            winning_line = lines[0][1]
-            # Didn't feel like writing a loop for this... am I lazy yet?
-            realify = lambda coords: [c + (self.n_rows * area_coords[i]) for i, c in enumerate(coords)]
-            real_line = tuple(map(realify, winning_line))
-
-            self.draw_line(real_line)
-
-            # Highlight megatile
-            for x in range(self.n_rows):
-                for y in range(self.n_rows):
-                    coords = realify([x, y])
-                    self.add_highlight(coords, last_piece.color + (self.style['winning-highlight-alpha'],))
-
-            if len(lines) > 1:
-                realify = lambda coords: [int((c + 0.5) * self.n_rows) for c in coords]
-                big_line = tuple(map(realify, lines[1]))
-                self.draw_line(big_line)
-        return lines
-
-
-    @copy_ancestor_docstring
-    def make_a_move(self, coords, forced=False):
-        legal = super(PygameBoard, self).make_a_move(coords, forced)
-        if legal:
-            self.del_highlights(color=self.style['last-move-color'])
-            self.add_highlight(coords, self.style['last-move-color'])
-            self.draw_highlights()
-        return legal
+    def __len__(self):
+        return self.end - self.start
 
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('MoveLogView index out of range')
+        index += self.start
+        return divmod(self.cells[index], self.size), self.pieces[self.codes[index]]
 
-    @copy_ancestor_docstring
-    def clear_allowed_moves(self):
-        super(PygameBoard, self).clear_allowed_moves()
-        if getattr(self, 'highlights', False):
-            self.del_highlights(color=self.style['allowed-moves-color'])
+    def __iter__(self):
+        cells, codes, size, pieces = self.cells, self.codes, self.size, self.pieces
+        for i in range(self.start, self.end):
+            yield divmod(cells[i], size), pieces[codes[i]]
 
+    def __repr__(self):
+        return 'MoveLogView({!r})'.format(list(self))
 
-    @copy_ancestor_docstring
-    def update_allowed_moves(self, last_move):
-        super(PygameBoard, self).update_allowed_moves(last_move)
-        for move in self.allowed_moves:
-            self.add_highlight(move, self.style['allowed-moves-color'])
+    def as_arrays(self):
+        """The cell numbers and piece codes of the moves as typed arrays."""
+        return self.cells[self.start:self.end], self.codes[self.start:self.end]
 
 
-    def draw_line(self, line):
-        """Draw a line from line[0] to line[-1]."""
-        # Add points for line drawing from/to middle of subtiles.
-        start = self.coords_to_pos(line[0])
-        end = self.coords_to_pos(line[-1])
 
-        half_tile = int(self.tile_size/2)
-        start = start[0] + half_tile, start[1] + half_tile
-        end = end[0] + half_tile, end[1] + half_tile
+class AIBoard(Board):
+    """API for AI players."""
+    def __init__(self, *args, **kwargs):
+        logger.debug('args: {}'.format(args))
+        logger.debug('kwargs: {}'.format(kwargs))
+        self.ais = []
+        self.move_log = None
+        self.telemetry = telemetry.default
+        super(AIBoard, self).__init__(*args, **kwargs)
+        self.ais = [piece for piece in self.pieces if piece.is_AI()]
+        self.move_log = MoveLog(self.n_rows, self.pieces)
+        for ai in self.ais:
+            self.move_log.add_consumer(ai)
+        self.reset()
 
-        line = [start, end]
-        self.winning_lines.append(line)
+    def reset(self):
+        """Reset the board"""
+        super(AIBoard, self).reset()
+        if self.move_log is not None:
+            self.move_log.clear()
+        for ai in self.ais:
+            ai.save_board_info(self.n_rows, self.pieces)
 
+    def add_observer(self, observer):
+        """
+        Let observer (anything hashable, e.g. a spectator's connection) read
+        the moves with get_mutations too.
+        """
+        self.move_log.add_consumer(observer)
 
-    def draw_highlights(self):
-        """Draw the highlights to the surface."""
-        # We're gonna need to recreate the surface, otherwise old highlights
-        # could "stain" it.
-        self.highlight_surf = pygame.Surface([self.inner_size]*2, pygame.SRCALPHA)
-        for coords, color in self.highlights:
-            # Draw the highlight to the highlight surface.
-            x, y = map(lambda i: i + self.line_thickness, self.coords_to_pos(coords))
-            rect = pygame.Rect((x, y), (self.tile_size,)*2)
-            pygame.draw.rect(self.highlight_surf, color, rect, 0)
+    def remove_observer(self, observer):
+        self.move_log.remove_consumer(observer)
 
-    def add_highlight(self, coords, color=None):
-        """Highlight the tile at specified coordinates with a chosen color."""
-        # Default to the style value.
-        color = color or self.style['highlight-color']
-        self.highlights.append((coords, color))
+    def add_mutation(self, coords, piece):
+        self.move_log.append(coords, self.piece_codes[piece])
 
 
-    def del_highlights(self, coords=None, color=None):
-        """Delete all highlights that match the coords and/or color."""
-        new_hls = self.highlights.copy()
-        n_deleted = 0
-        for i, h in enumerate(self.highlights):
-            h_coords, h_color = h
+    def get_mutations(self, ai):
+        """
+        The moves since the last call for ai (or observer), as a sequence of
+        ((x, y), piece) tuples, see MoveLogView.
+        """
+        try:
+            return self.move_log.read(ai)
+        except KeyError:
+            raise ValueError("{} not in known AIs".format(ai))
+
+
+    def get_ai_move(self, ai):
+        """
+        Ask an AI for its next move.
 
-            # If coords are set, check those - same with color.
-            if (coords is None or coords == h_coords) and \
-               (color is None or tuple(color) == tuple(h_color)):
-                del new_hls[i - n_deleted]
-                n_deleted = n_deleted + 1
+        AIs with wants_snapshot set also get a Snapshot of the board, so they
+        don't need to keep a copy of the board themselves.
+        """
+        kwargs = {}
+        if getattr(ai, 'wants_snapshot', False):
+            kwargs['snapshot'] = self.snapshot()
+        start = time.perf_counter()
+        move = ai.move(self.get_mutations(ai), self.allowed_moves, **kwargs)
+        self.record_ai_move(ai, time.perf_counter() - start)
+        return move
 
-        self.highlights = new_hls
 
+    def record_ai_move(self, ai, seconds):
+        """Add the time an AI took to the telemetry, with its statistics."""
+        self.telemetry.record('move {}'.format(ai), seconds)
+        for name, value in ai.get_stats().items():
+            self.telemetry.set_rate('{} {}'.format(ai, name), value)
 
-    def get_size(self):
-        return self.outer_size
+        budget = getattr(ai, 'time_budget', None)
+        if budget is not None and seconds > budget * TELEMETRY_BUDGET_SLACK:
+            logger.warning('{} took {:.3f}s for a move, its time budget is '
+                           '{:.3f}s'.format(ai, seconds, budget))
 
 
-    def pos_in_board(self, pos):
-        x = pos[0] - self.margin
-        y = pos[1] - self.margin
-        if 0 < x < self.inner_size and 0 < y < self.inner_size:
-            return x, y
+    def make_a_move(self, coords, *args, **kwargs):
+        player = self.get_turn()
+        if super(AIBoard, self).make_a_move(coords, *args, **kwargs):
+            self.add_mutation(coords, player)
+            return True
         return False
 
 
-    def get_turn_text(self):
-        return str(self.get_turn())
+
+def __getattr__(name):
+    # PygameBoard lives in its own module, so the rules don't need pygame.
+    if name == 'PygameBoard':
+        from pygame_board import PygameBoard
+        return PygameBoard
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
@@ -1,24 +1,133 @@
+import functools
+import numpy as np
+
+# Code of empty tiles in Board.cells, the list API shows them as None.
+EMPTY = 0
+# Code of values that are not on the board, never in Board.cells.
+UNKNOWN = -1
+
+
+@functools.lru_cache(maxsize=None)
+def get_line_indices(n_rows):
+    """
+    Index array (2 * n_rows + 2, n_rows) of the lines of a square with n_rows,
+    as flat indices (x * n_rows + y): the rows, then the columns and both
+    diagonals, like Board.get_lines_of_square.
+    """
+    n = n_rows
+    lines = [[x * n + y for y in range(n)] for x in range(n)]
+    lines.extend([x * n + y for x in range(n)] for y in range(n))
+    lines.append([i * n + i for i in range(n)])
+    lines.append([i * n + n - 1 - i for i in range(n)])
+    indices = np.array(lines, dtype=np.intp)
+    indices.setflags(write=False)
+    return indices
+
+
 class Board:
-    def __init__(self, n_rows):
+    def __init__(self, n_rows, dtype=np.int16):
         """
         Create a board of n_rows * n_rows big squares, which is
         n_rows ** 2 * n_rows ** 2 small tiles.
 
-        coord (x, y) is saved in self.subtiles[x][y]
+        The tiles are stored in one NumPy array of dtype, self.cells[x, y]
+        holds the code of the value of coord (x, y). Every value that
+        set_tile stores (pieces, numbers, any object) gets a code:
+        self.values[code] is the value. Empty tiles are None and have code
+        EMPTY.
+
+        self.subtiles[x][y] is the value, like the nested lists it used to
+        be, but it reads and writes self.cells.
         """
         self.n_rows = n_rows
+        self.dtype = dtype
         self.reset()
 
     def reset(self):
         """Reset the board to play a game from the start."""
-        self.subtiles = [[None]*self.n_rows**2 for i in range(self.n_rows**2)]
+        size = self.n_rows**2
+        self.cells = np.full((size,)*2, EMPTY, dtype=self.dtype)
+        # Value of every code, and code of every value (by type and value,
+        # so 1, 1.0 and True stay apart).
+        self.values = [None]
+        self.codes = {}
         # self.megatiles = [[None]*self.n_rows for i in range(self.n_rows)]
 
+    def get_code(self, value, add=False):
+        """
+        The code of value in self.cells, UNKNOWN if it was never stored
+        (unless add, then it gets a new code).
+        """
+        if value is None:
+            return EMPTY
+        key = (type(value), value)
+        try:
+            code = self.codes.get(key, UNKNOWN)
+        except TypeError:
+            # Values that can't be hashed are known by identity (self.values
+            # keeps them alive, so the id stays theirs).
+            key = (None, id(value))
+            code = self.codes.get(key, UNKNOWN)
+        if code == UNKNOWN and add:
+            code = len(self.values)
+            if code > np.iinfo(self.dtype).max:
+                raise ValueError('More different values than dtype {} can '
+                                 'hold'.format(np.dtype(self.dtype).name))
+            self.values.append(value)
+            self.codes[key] = code
+        return code
+
+    @property
+    def subtiles(self):
+        """The tiles as self.subtiles[x][y], backed by self.cells."""
+        return _Subtiles(self)
+
+    # Views on the codes in self.cells, these don't copy anything, so they see
+    # later moves (use set_tile to change the board). self.values turns
+    # codes back into values, e.g. np.array(self.values, dtype=object)[codes].
+
+    def megatiles_view(self):
+        """
+        All megatiles as an (n_rows, n_rows, n_rows, n_rows) view, indexed
+        [mega_x, mega_y, x, y].
+        """
+        n = self.n_rows
+        return self.cells.reshape(n, n, n, n).swapaxes(1, 2)
+
+    def get_mega_square(self, mega_coord):
+        """View of the codes of the megatile at the given coordinates."""
+        self.check_mega_coord(mega_coord)
+        mega_x, mega_y = mega_coord
+        n = self.n_rows
+        return self.cells[mega_x*n:(mega_x+1)*n, mega_y*n:(mega_y+1)*n]
+
+    def get_all_lines(self):
+        """
+        All lines of all megatiles at once, as an
+        (n_rows, n_rows, 2 * n_rows + 2, n_rows) array indexed
+        [mega_x, mega_y, line, i] (lines in the order of get_lines_of_square).
+
+        This is a copy, made with a single gather.
+        """
+        n = self.n_rows
+        squares = self.megatiles_view().reshape(n, n, n * n)
+        return squares[:, :, get_line_indices(n)]
+
+    def count_in_lines(self, value):
+        """Number of tiles with value in every line of every megatile."""
+        return (self.get_all_lines() == self.get_code(value)).sum(axis=-1)
+
+    def get_won_lines(self, value):
+        """Boolean array of the lines of all megatiles that are all value."""
+        return (self.get_all_lines() == self.get_code(value)).all(axis=-1)
+
     @classmethod
     def get_lines_of_square(cls, square):
         """
         Get a list of all the rows, then all the columns and the both
         diagonals.
+
+        For a NumPy square (like get_mega_square returns) these are views.
         """
         lines = list(square)
         lines.extend(cls.transpose_square(square))
@@ -43,7 +152,11 @@ class Board:
     def transpose_square(square):
         """
         Turn rows into columns and columns into rows of a given square
+
+        For a NumPy square this is a view.
         """
+        if isinstance(square, np.ndarray):
+            return square.T
         transpose = [list() for _ in square]
         for line in square:
             for i, el in enumerate(line):
@@ -55,19 +168,19 @@ class Board:
         """
         Return both diagonals of a square.
 
+        For a NumPy square these are (read only) views.
+
         :return: (top left to bottom right, top right to bottom left)
         """
+        if isinstance(square, np.ndarray):
+            return np.diagonal(square), np.diagonal(square[:, ::-1])
         diagonals = ([], [])
         for i, line in enumerate(square):
             diagonals[0].append(line[i])
             diagonals[1].append(line[len(line)-i-1])
         return diagonals
 
-    def get_mega_square_with_coords(self, mega_coord):
-        """
-        Get the mega tile at the given coordinates.
-        """
-        square = []
+    def check_mega_coord(self, mega_coord):
         mega_x, mega_y = mega_coord
         if mega_x >= self.n_rows:
             raise ValueError(
@@ -83,6 +196,17 @@ class Board:
                     mega_y
                 )
             )
+
+    def get_mega_square_with_coords(self, mega_coord):
+        """
+        Get the mega tile at the given coordinates.
+
+        Returns nested lists of ((x, y), value) tuples, use get_mega_square
+        for a view without the coordinates.
+        """
+        self.check_mega_coord(mega_coord)
+        square = []
+        mega_x, mega_y = mega_coord
         start_x = mega_x * self.n_rows
         start_y = mega_y * self.n_rows
         for off_x in range(self.n_rows):
@@ -100,11 +224,11 @@ class Board:
 
     def set_tile(self, coords, value):
         """Set the value of the tile at coordinates to given piece."""
-        self.set_tile_of_square(self.subtiles, coords, value)
+        self.set_tile_of_square(self.cells, coords, self.get_code(value, True))
 
     def get_tile(self, coords):
-        """Get the value of the tile at coordinates."""
-        return self.get_tile_of_square(self.subtiles, coords)
+        """Get the value of the tile at coordinates (None if it's empty)."""
+        return self.values[self.get_tile_of_square(self.cells, coords)]
 
     @staticmethod
     def set_tile_of_square(square, coords, value):
@@ -117,6 +241,54 @@ class Board:
         return square[coords[0]][coords[1]]
 
 
+class _Subtiles(object):
+    """The rows of Board.subtiles, each a _SubtileRow."""
+    def __init__(self, board):
+        self.board = board
+
+    def __len__(self):
+        return len(self.board.cells)
+
+    def __getitem__(self, x):
+        if isinstance(x, slice):
+            return [self[i] for i in range(len(self))[x]]
+        return _SubtileRow(self.board, range(len(self))[x])
+
+    def __iter__(self):
+        return (self[x] for x in range(len(self)))
+
+    def __repr__(self):
+        return repr([list(row) for row in self])
+
+
+class _SubtileRow(object):
+    """The values of one row (x) of Board.cells, read and set by y."""
+    def __init__(self, board, x):
+        self.board = board
+        self.x = x
+
+    def __len__(self):
+        return self.board.cells.shape[1]
+
+    def __getitem__(self, y):
+        if isinstance(y, slice):
+            return [self[i] for i in range(len(self))[y]]
+        return self.board.get_tile((self.x, y))
+
+    def __setitem__(self, y, value):
+        self.board.set_tile((self.x, range(len(self))[y]), value)
+
+    def __iter__(self):
+        values = self.board.values
+        return (values[code] for code in self.board.cells[self.x])
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
 if __name__ == '__main__':
     b = Board(3)
     for i in range(81):
@@ -131,3 +303,6 @@ if __name__ == '__main__':
         print(square)
         print("Lines:")
         print(b.get_lines_of_square(square))
+    print()
+    print("All lines of all megatiles:")
+    print(b.get_all_lines())
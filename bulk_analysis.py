@@ -0,0 +1,153 @@
+"""
+Analyze a file of positions (see notation.py) with the tree search, spread
+over a pool of processes, and write the best move and score of every position
+to an output file as soon as it is known.
+
+Input: one position per line, optionally followed by ; and a name. Empty
+lines and lines starting with # are skipped.
+
+    9/9/9/9/9/9/9/9/9 ......... X - ; start
+
+Output: one JSON object per line, in the order the positions are done:
+
+    {"line": 1, "name": "start", "position": "...", "bestmove": "4,4",
+     "score": 0.56, "visits": 1234, "solved": false, "seconds": 1.0}
+
+score is the expected result for the side to move (1 win, 0.5 draw, 0 loss).
+Solved positions (by the endgame solver, or dead draws: nobody can complete
+a big line any more) have an exact score. Positions that can't be analyzed
+get an "error" in stead.
+
+Usage:
+    python bulk_analysis.py POSITIONS OUTPUT [--time SECONDS] [--workers N]
+                            [--playout NAME] [--no-solver]
+"""
+import os, sys, json, time, logging, argparse, multiprocessing
+
+import notation
+from board import Board
+from mcts import MCTS
+from solver import EndgameSolver, WIN, DRAW
+from engine import format_move
+from pieces import Cross, Nought
+from constants import CROSS_COLOR, NOUGHT_COLOR, N_ROWS
+from config import ANALYSIS_LOGGING_LEVEL, MCTS_TIME_BUDGET, MCTS_PLAYOUT
+
+logger = logging.getLogger(__name__)
+logger.setLevel(ANALYSIS_LOGGING_LEVEL)
+
+SOLVED_SCORES = {WIN: 1.0, DRAW: 0.5}
+
+
+def read_positions(f):
+    """Yield (line number, name, position) for the positions in file f."""
+    for number, line in enumerate(f, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        position, _, name = line.partition(';')
+        yield number, name.strip() or None, position.strip()
+
+
+# Every worker process keeps its search (and the solver's cache).
+_worker = None
+
+def init_worker(time_budget, playout, use_solver):
+    global _worker
+    pieces = (Cross(CROSS_COLOR), Nought(NOUGHT_COLOR))
+    mcts = MCTS(seed=os.getpid(), playout=playout)
+    # Allocate the tree now, not in the time of the first position.
+    mcts.set_root(Board(pieces, N_ROWS))
+    _worker = {
+        'pieces': pieces,
+        'mcts': mcts,
+        'solver': EndgameSolver() if use_solver else None,
+        'time_budget': time_budget,
+    }
+
+
+def analyze(job):
+    """Analyze one position in a worker process, returns the output dict."""
+    number, name, position = job
+    out = {'line': number, 'name': name, 'position': position}
+    start = time.perf_counter()
+    deadline = start + _worker['time_budget']
+    try:
+        board = notation.board_from_position(position, _worker['pieces'])
+    except ValueError as e:
+        out['error'] = str(e)
+        return out
+    if board.game_over:
+        out['error'] = 'the game is over'
+        return out
+
+    solver = _worker['solver']
+    solved = None
+    if board.is_dead_draw():
+        solved = DRAW, board.allowed_moves[0]
+    elif solver is not None and solver.is_endgame(board):
+        solved = solver.solve(board, deadline=deadline)
+    if solved is not None and solved[1] is not None:
+        result, move = solved
+        out.update(bestmove=format_move(move),
+                   score=SOLVED_SCORES.get(result, 0.0), visits=0, solved=True)
+    else:
+        mcts = _worker['mcts']
+        root = mcts.search(board, max(deadline - time.perf_counter(), 0))
+        stats = mcts.move_stats(root)
+        move = mcts.best_move(stats)
+        visits, value = stats[move]
+        out.update(bestmove=format_move(move), score=round(value / visits, 4),
+                   visits=visits, solved=False)
+    out['seconds'] = round(time.perf_counter() - start, 3)
+    return out
+
+
+def run(jobs, output, time_budget=MCTS_TIME_BUDGET, n_workers=None,
+        playout=MCTS_PLAYOUT, use_solver=True):
+    """
+    Analyze the (line number, name, position) jobs, writing JSON lines to the
+    output file as the results come in. Returns the number of positions.
+    """
+    n_workers = n_workers or os.cpu_count() or 1
+    count = 0
+    with multiprocessing.Pool(n_workers, init_worker,
+                              (time_budget, playout, use_solver)) as pool:
+        for out in pool.imap_unordered(analyze, jobs):
+            output.write(json.dumps(out) + '\n')
+            output.flush()
+            count += 1
+            if 'error' in out:
+                logger.warning('Line {}: {}'.format(out['line'], out['error']))
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('positions', help='file with positions, - for stdin')
+    parser.add_argument('output', help='file for the results, - for stdout')
+    parser.add_argument('--time', type=float, default=MCTS_TIME_BUDGET,
+                        help='seconds per position')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--playout', default=MCTS_PLAYOUT)
+    parser.add_argument('--no-solver', dest='solver', action='store_false')
+    args = parser.parse_args(argv)
+    logging.basicConfig()
+
+    source = sys.stdin if args.positions == '-' else open(args.positions)
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
+    start = time.perf_counter()
+    try:
+        count = run(read_positions(source), output, args.time, args.workers,
+                    args.playout, args.solver)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+    seconds = time.perf_counter() - start
+    print('{} positions in {:.1f}s'.format(count, seconds), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
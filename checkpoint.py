@@ -0,0 +1,232 @@
+"""
+Save a game in progress, with the caches of its AIs (search trees, solved
+positions), to a binary file and restore it in another process.
+
+A checkpoint is:
+
+    MAGIC, VERSION, byte order  6 bytes, then 2 bytes padding
+    header length               8 bytes, unsigned
+    header                      JSON: the metadata and where every array is
+    arrays                      the raw bytes of every array, each starting
+                                at a multiple of ALIGN bytes
+
+Arrays are written straight from the memory of the array.arrays (or
+memoryviews of part of them) and read back from a mmap of the file straight
+into arrays, one copy per array, so the size of a search tree only costs the
+time to copy its bytes.
+
+What is saved: the position, the move log (and where every AI is in it) and
+for every AI of the board whatever its save_state adds (see
+pieces.AIMixin.save_state). Observers of the move log are not saved.
+"""
+import os, sys, mmap, json, array, struct
+
+from board import Snapshot
+
+MAGIC = b'M3TC'
+VERSION = 1
+BYTE_ORDERS = ('little', 'big')
+PREAMBLE = struct.Struct('<4sBBxxQ')
+ALIGN = 8
+
+
+def padding(offset):
+    return -offset % ALIGN
+
+
+class Writer(object):
+    """
+    Collects the metadata and arrays of a checkpoint. Names are prefixed with
+    the prefix of the scope they are added in.
+    """
+    def __init__(self, meta=None, arrays=None, prefix=''):
+        self.meta = {} if meta is None else meta
+        self.arrays = [] if arrays is None else arrays
+        self.prefix = prefix
+
+    def scope(self, prefix):
+        """A Writer that adds to this one, with names starting with prefix."""
+        return Writer(self.meta, self.arrays, self.prefix + prefix)
+
+    def set(self, name, value):
+        """Save a value that can be written as JSON."""
+        self.meta[self.prefix + name] = value
+
+    def add_array(self, name, data):
+        """Save an array.array, or a memoryview of (part of) one."""
+        self.arrays.append((self.prefix + name, memoryview(data)))
+
+    def write(self, path):
+        """Write the checkpoint to path (replacing the file in one go)."""
+        table, offset = {}, 0
+        for name, view in self.arrays:
+            table[name] = [view.format, view.itemsize, offset, len(view)]
+            offset += view.nbytes + padding(view.nbytes)
+        header = json.dumps({'meta': self.meta, 'arrays': table}).encode()
+
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(PREAMBLE.pack(MAGIC, VERSION,
+                                      BYTE_ORDERS.index(sys.byteorder),
+                                      len(header)))
+                f.write(header)
+                f.write(bytes(padding(PREAMBLE.size + len(header))))
+                for name, view in self.arrays:
+                    f.write(view.cast('B'))
+                    f.write(bytes(padding(view.nbytes)))
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+class Reader(object):
+    """
+    Gives access to the metadata and arrays of a checkpoint file, which is
+    mapped in memory until close. Raises ValueError for files that are not
+    a checkpoint of this version.
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.mmap)
+        try:
+            if len(self.mmap) < PREAMBLE.size:
+                raise ValueError('{} is not a checkpoint'.format(path))
+            magic, version, byte_order, header_size = \
+                PREAMBLE.unpack_from(self.mmap)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError('{} is not a version {} checkpoint'.format(
+                    path, VERSION))
+            end = PREAMBLE.size + header_size
+            header = json.loads(bytes(self.view[PREAMBLE.size:end]).decode())
+            self.swap = BYTE_ORDERS[byte_order] != sys.byteorder
+            self.data_start = end + padding(end)
+            self.meta = header['meta']
+            self.table = header['arrays']
+            self.prefix = ''
+            # Find a truncated file now, not halfway through restoring it.
+            for name in self.table:
+                if self._locate(name)[3] > len(self.mmap):
+                    raise ValueError('{} is truncated'.format(path))
+        except ValueError:
+            self.close()
+            raise
+
+    def scope(self, prefix):
+        """A Reader of the names that start with prefix (without it)."""
+        reader = Reader.__new__(Reader)
+        reader.__dict__.update(self.__dict__)
+        reader.prefix = self.prefix + prefix
+        return reader
+
+    def get(self, name, default=None):
+        return self.meta.get(self.prefix + name, default)
+
+    def __contains__(self, name):
+        name = self.prefix + name
+        return name in self.meta or name in self.table
+
+    def _locate(self, name, typecode=None):
+        try:
+            array_typecode, itemsize, offset, length = self.table[self.prefix + name]
+        except KeyError:
+            raise ValueError('No array {!r} in the checkpoint'.format(
+                self.prefix + name))
+        if typecode is not None and typecode != array_typecode:
+            raise ValueError('Array {!r} has type {!r}, not {!r}'.format(
+                self.prefix + name, array_typecode, typecode))
+        if array.array(array_typecode).itemsize != itemsize:
+            raise ValueError('Array {!r} has items of {} bytes, here they are '
+                             '{}'.format(self.prefix + name, itemsize,
+                                         array.array(array_typecode).itemsize))
+        start = self.data_start + offset
+        return array_typecode, length, start, start + length * itemsize
+
+    def array(self, name):
+        """A new array.array with the contents of the array called name."""
+        typecode, length, start, end = self._locate(name)
+        result = array.array(typecode)
+        with self.view[start:end] as data:
+            result.frombytes(data)
+        if self.swap:
+            result.byteswap()
+        return result
+
+    def read_into(self, name, target):
+        """
+        Copy the array called name to the start of the array.array target
+        (which must be long enough), returns the number of items.
+        """
+        typecode, length, start, end = self._locate(name, target.typecode)
+        if length > len(target):
+            raise ValueError('Array {!r} has {} items, only room for {}'.format(
+                self.prefix + name, length, len(target)))
+        if self.swap:
+            target[:length] = self.array(name)
+            return length
+        with memoryview(target) as view, view.cast('B') as raw, \
+             self.view[start:end] as data:
+            raw[:end - start] = data
+        return length
+
+    def close(self):
+        self.view.release()
+        self.mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def save(path, board):
+    """Write a checkpoint of the game on an AIBoard and the state of its AIs."""
+    writer = Writer()
+    writer.set('n_rows', board.n_rows)
+    writer.set('pieces', [type(piece).__name__ for piece in board.pieces])
+    writer.add_array('position', array.array('B', board.snapshot().pack()))
+
+    log = board.move_log
+    writer.add_array('log.cells', log.cells)
+    writer.add_array('log.codes', log.codes)
+    writer.set('log.cursors', [log.cursors[ai] for ai in board.ais])
+
+    for i, ai in enumerate(board.ais):
+        ai.save_state(writer.scope('ai{}.'.format(i)))
+    writer.write(path)
+
+
+def check(reader, n_rows, pieces):
+    """
+    Raise ValueError if the checkpoint of reader is not of a board with
+    n_rows and (the same kind of) pieces.
+    """
+    names = [type(piece).__name__ for piece in pieces]
+    if reader.get('n_rows') != n_rows or reader.get('pieces') != names:
+        raise ValueError('The checkpoint is of a board with n_rows {} and '
+                         'pieces {}, not {} and {}'.format(
+                             reader.get('n_rows'), reader.get('pieces'),
+                             n_rows, names))
+
+
+def load(path, board):
+    """
+    Put an AIBoard (with the same kind of pieces) in the state of the
+    checkpoint at path, and its AIs too. Raises ValueError if the checkpoint
+    doesn't fit the board, before changing anything.
+    """
+    with Reader(path) as reader:
+        check(reader, board.n_rows, board.pieces)
+        board.restore(Snapshot.unpack(board.n_rows, reader.array('position')))
+        log = board.move_log
+        log.cells = reader.array('log.cells')
+        log.codes = reader.array('log.codes')
+        for ai, cursor in zip(board.ais, reader.get('log.cursors')):
+            log.cursors[ai] = cursor
+
+        for i, ai in enumerate(board.ais):
+            ai.load_state(reader.scope('ai{}.'.format(i)))
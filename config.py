@@ -9,6 +9,86 @@ import logging
 GAME_LOGGING_LEVEL = logging.WARN
 BOARD_LOGGING_LEVEL = logging.WARN
 PIECES_LOGGING_LEVEL = logging.WARN
+SOLVER_LOGGING_LEVEL = logging.WARN
+TABLE_LOGGING_LEVEL = logging.WARN
+MCTS_LOGGING_LEVEL = logging.WARN
+PARALLEL_LOGGING_LEVEL = logging.WARN
+ENGINE_LOGGING_LEVEL = logging.WARN
+ANALYSIS_LOGGING_LEVEL = logging.WARN
+TELEMETRY_LOGGING_LEVEL = logging.WARN
+REPLAY_LOGGING_LEVEL = logging.WARN
+SELFPLAY_LOGGING_LEVEL = logging.WARN
+DISTRIBUTED_LOGGING_LEVEL = logging.INFO
+PERFT_LOGGING_LEVEL = logging.WARN
+SPECTATOR_LOGGING_LEVEL = logging.WARN
+TUNER_LOGGING_LEVEL = logging.INFO
+
+# Telemetry keeps this many of the last timings of everything it measures.
+TELEMETRY_WINDOW = 200
+# Warn when an AI takes longer than this times its time_budget for a move.
+TELEMETRY_BUDGET_SLACK = 1.2
+
+# perft.py remembers the counts of at most this many positions.
+PERFT_CACHE_SIZE = 1000000
+
+# Precomputed tables are cached in this directory.
+import os
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+
+
+
+############################### AI configuration ###############################
+# The endgame solver gives up on a position after creating this many nodes.
+SOLVER_MAX_NODES = 50000
+# The endgame solver only tries positions with at most this many empty tiles
+# in megatiles that are still open.
+SOLVER_MAX_EMPTY_TILES = 24
+
+# Seconds the tree search AIs think per move.
+MCTS_TIME_BUDGET = 1.0
+# Exploration constant of UCT.
+MCTS_EXPLORATION = 1.4
+# Maximum number of nodes in the tree of a search (17 bytes each).
+MCTS_NODE_CAPACITY = 2000000
+# How the tree search plays out new positions: 'random' or 'tactical' (see
+# playout.py).
+MCTS_PLAYOUT = 'random'
+
+# Evaluation weights of heuristic.HeuristicAI. tuner.py writes tuned weights
+# to HEURISTIC_WEIGHTS_FILE, which are used instead when it exists.
+HEURISTIC_WEIGHTS = {
+    'megatile': 1.0,
+    'center': 0.3,
+    'threat': 0.4,
+    'block': 0.5,
+    'big_threat': 0.8,
+    'send_free': -0.6,
+    'send_threat': -0.8,
+}
+HEURISTIC_WEIGHTS_FILE = os.path.join(CACHE_DIR, 'heuristic_weights.json')
+# Pairs of games (with the same seed) per iteration of tuner.py, and the
+# random moves per player at the start of them, for different games.
+TUNER_PAIRS = 16
+TUNER_RANDOM_MOVES = 3
+
+# The analysis overlay (toggled with constants.ANALYSIS_KEY) sends new scores
+# every ANALYSIS_ROUND_TIME seconds, for moves with at least ANALYSIS_MIN_VISITS.
+ANALYSIS_ROUND_TIME = 0.25
+ANALYSIS_MIN_VISITS = 5
+
+# The AI engine.py uses, unless told otherwise.
+ENGINE_AI = 'mcts.MCTSAI'
+
+# Workers of distributed.py need the same key as the coordinator. There is no
+# default: the connections carry pickles, so whoever knows the key can run
+# code on the other side. Use a long random secret.
+DISTRIBUTED_AUTHKEY = os.environ.get('MEGA3T_AUTHKEY', '').encode() or None
+# The coordinator only accepts connections from this host, unless told to
+# bind to another address (like '' for all interfaces).
+DISTRIBUTED_BIND = 'localhost'
+DISTRIBUTED_PORT = 6333
+# Games per batch handed to a worker.
+DISTRIBUTED_BATCH_SIZE = 8
 
 
 
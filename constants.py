@@ -1,5 +1,3 @@
-from pygame import Color, K_r, K_q, K_f
-
 # Constants
 PROGRAM_NAME = 'Mega3T'
 TURN_TEXT = 'Turn: '
@@ -22,24 +20,36 @@ LINE_THICKNESS = 1
 MARGIN = 20
 TPS = 50
 
+# The boards of spectator.py are about this many pixels wide, with a gap
+# between them, and a finished game stays on its board for SPECTATOR_PAUSE
+# seconds.
+SPECTATOR_BOARD_SIZE = 171
+SPECTATOR_GAP = 6
+SPECTATOR_PAUSE = 2.0
+
 BUTTON_MARGIN = 2
 BUTTON_POSITION = 2 * MARGIN
-RESET_KEY = K_r
+# Keys are pygame key codes, which are the ASCII codes for letters.
+RESET_KEY = ord('r')
 RESET_BUTTON_TEXT = "[r]estart"
-QUIT_KEY = K_q
+QUIT_KEY = ord('q')
 QUIT_BUTTON_TEXT = "[q]uit"
-FORCE_KEY = K_f
+FORCE_KEY = ord('f')
+ANALYSIS_KEY = ord('a')
+PERF_KEY = ord('p')
 
 BOARD_STYLE = {
     'background-color'       :  BACKGROUND_COLOR,
-    'small-border-color'     :  Color(0, 0, 0),
-    'big-border-color'       :  Color(255, 0, 0),
-    'highlight-color'        :  Color(0, 0, 0, 32),
-    'winning-line-color'     :  Color(0, 0, 0, 150),
+    'small-border-color'     :  (0, 0, 0),
+    'big-border-color'       :  (255, 0, 0),
+    'highlight-color'        :  (0, 0, 0, 32),
+    'winning-line-color'     :  (0, 0, 0, 150),
     'winning-line-thickness' :  10,
     'winning-highlight-alpha':  100,
-    'allowed-moves-color'    :  Color(0, 255, 0, 90),
-    'last-move-color'        :  Color(0, 0, 0, 33),
+    'allowed-moves-color'    :  (0, 255, 0, 90),
+    'last-move-color'        :  (0, 0, 0, 33),
+    'heatmap-alpha'          :  110,
+    'heatmap-levels'         :  16,
     'font-name'              :  FONT,
     'font-size'              :  FONT_SIZE,
     'text-color'             :  TEXT_COLOR
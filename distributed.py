@@ -0,0 +1,246 @@
+"""
+Spread self-play and tournament games over several processes and hosts.
+
+A coordinator hands out batches of game jobs over sockets to worker processes,
+which play them on headless boards (see selfplay) and send back the winner and
+moves of every game. When a worker dies, its batch goes to another worker.
+
+A job is a tuple (job_id, specs, seed, n_rows), see selfplay.play_game.
+
+Usage:
+    python distributed.py local [--workers N] [--games N] [--ai PATH ...]
+    python distributed.py coordinator [--bind ADDRESS] [--port P] [--games N]
+                                      [--ai PATH ...]
+    python distributed.py worker [--host H] [--port P]
+
+Workers and coordinator need the same secret key, from --authkey or the
+MEGA3T_AUTHKEY environment variable; they refuse to start without one. The
+connections carry pickles, so anyone with the key can run code on the other
+side. The coordinator only listens on localhost, unless it gets --bind (e.g.
+--bind 0.0.0.0 for all interfaces). Local mode makes up a random key.
+"""
+import os, sys, time, queue, logging, argparse, threading, multiprocessing
+from multiprocessing.connection import Listener, Client
+
+from selfplay import Players, play_game
+from constants import N_ROWS
+from config import (DISTRIBUTED_LOGGING_LEVEL, DISTRIBUTED_AUTHKEY,
+                    DISTRIBUTED_BIND, DISTRIBUTED_PORT, DISTRIBUTED_BATCH_SIZE)
+
+logger = logging.getLogger(__name__)
+logger.setLevel(DISTRIBUTED_LOGGING_LEVEL)
+
+
+def make_jobs(specs, n_games, n_rows=N_ROWS, seed=0):
+    """Jobs for n_games between two AIs, switching who starts every game."""
+    jobs = []
+    for i in range(n_games):
+        order = specs if i % 2 == 0 else specs[::-1]
+        jobs.append((i, tuple(order), seed + i, n_rows))
+    return jobs
+
+
+def check_authkey(authkey):
+    """Return authkey (as bytes), raises ValueError if there is none."""
+    if not authkey:
+        raise ValueError('No authkey: set MEGA3T_AUTHKEY (or pass --authkey) '
+                         'to a secret shared by the coordinator and workers')
+    return authkey.encode() if isinstance(authkey, str) else authkey
+
+
+def worker_main(address, authkey=DISTRIBUTED_AUTHKEY):
+    """Play batches of jobs from the coordinator at address until it's done."""
+    connection = Client(address, authkey=check_authkey(authkey))
+    logger.info('Worker {} connected to {}'.format(os.getpid(), address))
+    players = Players()
+    try:
+        while True:
+            batch = connection.recv()
+            if batch is None:
+                return
+            results = []
+            for job_id, specs, seed, n_rows in batch:
+                winner, moves = play_game(specs, n_rows, seed,
+                                          players.get(specs, seed))
+                results.append((job_id, winner, moves))
+            connection.send(results)
+    except EOFError:
+        # The coordinator is gone
+        pass
+    finally:
+        connection.close()
+
+
+class Coordinator(object):
+    def __init__(self, jobs, address=(DISTRIBUTED_BIND, DISTRIBUTED_PORT),
+                 authkey=DISTRIBUTED_AUTHKEY, batch_size=DISTRIBUTED_BATCH_SIZE):
+        """
+        Listen at address, by default on localhost only. Raises ValueError
+        without an authkey.
+        """
+        authkey = check_authkey(authkey)
+        self.jobs = jobs
+        self.pending = queue.Queue()
+        for i in range(0, len(jobs), batch_size):
+            self.pending.put(jobs[i:i + batch_size])
+        self.results = {}
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        if not jobs:
+            self.done.set()
+        self.listener = Listener(address, authkey=authkey)
+        self.address = self.listener.address
+        self.n_resubmitted = 0
+        self.n_moves = 0
+
+
+    def serve(self, connection):
+        """Hand out batches to one worker."""
+        while not self.done.is_set():
+            try:
+                batch = self.pending.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            try:
+                connection.send(batch)
+                results = connection.recv()
+            except (EOFError, OSError) as e:
+                logger.warning('Lost a worker ({!r}), resubmitting {} '
+                               'jobs'.format(e, len(batch)))
+                with self.lock:
+                    self.n_resubmitted += len(batch)
+                self.pending.put(batch)
+                connection.close()
+                return
+            with self.lock:
+                for job_id, winner, moves in results:
+                    if job_id not in self.results:
+                        self.n_moves += len(moves)
+                    self.results[job_id] = (winner, moves)
+                if len(self.results) == len(self.jobs):
+                    self.done.set()
+        try:
+            connection.send(None)
+        except OSError:
+            pass
+        connection.close()
+
+
+    def accept(self):
+        while not self.done.is_set():
+            try:
+                connection = self.listener.accept()
+            except OSError:
+                # The listener was closed
+                return
+            thread = threading.Thread(target=self.serve, args=(connection,))
+            thread.daemon = True
+            thread.start()
+
+
+    def run(self):
+        """
+        Wait until all jobs are done.
+
+        Returns ({job_id: (winner, moves)}, statistics)
+        """
+        start = time.perf_counter()
+        thread = threading.Thread(target=self.accept)
+        thread.daemon = True
+        thread.start()
+        self.done.wait()
+        seconds = time.perf_counter() - start
+        # Give the workers a moment to get their goodbye.
+        time.sleep(0.2)
+        self.listener.close()
+        return self.results, {
+            'games': len(self.results),
+            'moves': self.n_moves,
+            'seconds': seconds,
+            'games_per_second': len(self.results) / seconds if seconds else 0.0,
+            'moves_per_second': self.n_moves / seconds if seconds else 0.0,
+            'resubmitted': self.n_resubmitted,
+        }
+
+
+def run_local(jobs, n_workers=None, batch_size=DISTRIBUTED_BATCH_SIZE):
+    """Run jobs with a coordinator and n_workers local worker processes."""
+    n_workers = n_workers or os.cpu_count() or 1
+    # Only our own workers need it, any other process is kept out.
+    authkey = os.urandom(32)
+    coordinator = Coordinator(jobs, ('localhost', 0), authkey, batch_size)
+    workers = [multiprocessing.Process(target=worker_main,
+                                       args=(coordinator.address, authkey))
+               for _ in range(n_workers)]
+    for worker in workers:
+        worker.daemon = True
+        worker.start()
+    try:
+        return coordinator.run()
+    finally:
+        for worker in workers:
+            worker.join(1)
+            if worker.is_alive():
+                worker.terminate()
+
+
+def summarize(jobs, results):
+    """Wins per AI (and draws) over all games."""
+    scores = {}
+    for job_id, specs, seed, n_rows in jobs:
+        if job_id not in results:
+            continue
+        winner = results[job_id][0]
+        key = 'draws' if not winner else specs[winner - 1][0]
+        scores[key] = scores.get(key, 0) + 1
+    return scores
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Distributed self-play')
+    parser.add_argument('mode', choices=('local', 'coordinator', 'worker'))
+    parser.add_argument('--host', default='localhost',
+                        help='address of the coordinator (for workers)')
+    parser.add_argument('--bind', default=DISTRIBUTED_BIND,
+                        help='address the coordinator listens on, e.g. '
+                             '0.0.0.0 to accept workers of other hosts '
+                             '(default: %(default)s)')
+    parser.add_argument('--port', type=int, default=DISTRIBUTED_PORT)
+    parser.add_argument('--authkey', default=None,
+                        help='secret shared by the coordinator and workers '
+                             '(default: $MEGA3T_AUTHKEY)')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--n-rows', type=int, default=N_ROWS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--ai', nargs=2, default=['pieces.RandomAI'] * 2,
+                        help='dotted paths of the two AI classes')
+    args = parser.parse_args(argv)
+    logging.basicConfig()
+
+    authkey = args.authkey or DISTRIBUTED_AUTHKEY
+    if args.mode != 'local':
+        try:
+            authkey = check_authkey(authkey)
+        except ValueError as e:
+            parser.error(str(e))
+
+    if args.mode == 'worker':
+        worker_main((args.host, args.port), authkey)
+        return
+
+    specs = tuple((path, {}) for path in args.ai)
+    jobs = make_jobs(specs, args.games, args.n_rows, args.seed)
+    if args.mode == 'local':
+        results, stats = run_local(jobs, args.workers)
+    else:
+        results, stats = Coordinator(jobs, (args.bind, args.port),
+                                     authkey).run()
+    print(summarize(jobs, results))
+    print('{games} games, {moves} moves in {seconds:.2f}s: '
+          '{games_per_second:.1f} games/s, {moves_per_second:.0f} moves/s '
+          '({resubmitted} jobs resubmitted)'.format(**stats))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
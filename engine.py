@@ -0,0 +1,227 @@
+"""
+Long running engine process with a line based protocol (in the spirit of UCI),
+so tournament harnesses and other GUIs can use our AIs without starting a new
+process for every move. Caches and search trees stay warm between moves and
+games.
+
+Usage:
+    python engine.py [--ai mcts.MCTSAI]
+
+Commands (one per line on stdin):
+    newgame [n_rows]        start a new game
+    position [x,y ...]      set the position to the start, followed by moves
+    go [seconds]            think (at most seconds) and answer with
+                            "bestmove x,y" (after "info string dead draw" if
+                            the game can only end in a draw), or with
+                            "info string error ..." and "bestmove none" if
+                            the AI fails
+    stop                    answer the running go as soon as possible
+    isready                 answer with "readyok"
+    save PATH               write the game and the AIs' trees and caches to
+                            a checkpoint file (see checkpoint)
+    load PATH               continue from a checkpoint file
+    quit                    stop the engine
+
+Everything else the engine says starts with "info".
+"""
+import sys, logging, argparse, threading
+
+import checkpoint
+from board import AIBoard
+from pieces import Cross, Nought, load_ai_class, make_ai_piece
+from constants import CROSS_COLOR, NOUGHT_COLOR, N_ROWS
+from config import ENGINE_LOGGING_LEVEL, ENGINE_AI
+
+logger = logging.getLogger(__name__)
+logger.setLevel(ENGINE_LOGGING_LEVEL)
+
+
+def parse_move(text):
+    """Turn 'x,y' into (x, y)."""
+    x, y = text.split(',')
+    return int(x), int(y)
+
+
+def format_move(move):
+    return '{},{}'.format(*move)
+
+
+class Engine(object):
+    def __init__(self, ai_class, output=sys.stdout, n_rows=N_ROWS):
+        """
+        The engine plays both sides with two instances of ai_class (an
+        AIMixin that is not a Piece yet).
+        """
+        self.output = output
+        self.output_lock = threading.Lock()
+        self.pieces = (make_ai_piece(ai_class, Cross, CROSS_COLOR),
+                       make_ai_piece(ai_class, Nought, NOUGHT_COLOR))
+        self.board = None
+        self.moves = []
+        self.thread = None
+        self.thinking = None
+        self.newgame(n_rows)
+
+
+    def send(self, line):
+        with self.output_lock:
+            self.output.write(line + '\n')
+            self.output.flush()
+
+
+    def newgame(self, n_rows=None):
+        self.wait()
+        n_rows = n_rows or (self.board.n_rows if self.board else N_ROWS)
+        if self.board is None or self.board.n_rows != n_rows:
+            self.board = AIBoard(self.pieces, n_rows)
+        else:
+            # The AIs keep their caches over a reset.
+            self.board.reset()
+        self.moves = []
+
+
+    def position(self, moves):
+        """Set the position, only playing the moves that are new if possible."""
+        self.wait()
+        if moves[:len(self.moves)] != self.moves:
+            self.board.reset()
+            self.moves = []
+        for move in moves[len(self.moves):]:
+            if not self.board.make_a_move(move):
+                self.send('info string illegal move {}'.format(format_move(move)))
+                return
+            self.moves.append(move)
+
+
+    def go(self, seconds=None):
+        self.wait()
+        if self.board.game_over:
+            self.send('info string game over')
+            self.send('bestmove none')
+            return
+        if self.board.is_dead_draw():
+            self.send('info string dead draw')
+        ai = self.board.get_turn()
+        # Clear it here, so a stop that comes before the thread runs counts.
+        ai.clear_stop()
+        self.thinking = ai
+        self.thread = threading.Thread(target=self.think, args=(ai, seconds))
+        self.thread.daemon = True
+        self.thread.start()
+
+
+    def save(self, path):
+        self.wait()
+        checkpoint.save(path, self.board)
+
+
+    def load(self, path):
+        """
+        Continue from the checkpoint at path, for any n_rows. If it can't be
+        loaded, the game stays as it was.
+        """
+        self.wait()
+        with checkpoint.Reader(path) as reader:
+            n_rows = reader.get('n_rows')
+            checkpoint.check(reader, n_rows, self.pieces)
+        n_rows_before, moves_before = self.board.n_rows, self.moves
+        self.newgame(n_rows)
+        try:
+            checkpoint.load(path, self.board)
+        except Exception:
+            # The AIs start over, but the game is back.
+            self.newgame(n_rows_before)
+            self.position(moves_before)
+            raise
+        size = self.board.n_rows**2
+        self.moves = [divmod(cell, size) for cell in self.board.move_log.cells]
+
+
+    def think(self, ai, seconds=None):
+        # The AI gets the moves since its last move, but the board (and the
+        # AI's idea of it) does not change: the harness sends a new position.
+        # Always answer, a harness waits for the bestmove.
+        # seconds is for this move only, the next go uses the AI's own budget.
+        budget = getattr(ai, 'time_budget', None)
+        if seconds is not None and budget is not None:
+            ai.time_budget = seconds
+        try:
+            move = self.board.get_ai_move(ai)
+        except Exception as e:
+            logger.exception('{} failed to move'.format(ai))
+            self.send('info string error {}: {}'.format(type(e).__name__, e))
+            move = None
+        finally:
+            if seconds is not None and budget is not None:
+                ai.time_budget = budget
+            self.thinking = None
+        self.send('bestmove {}'.format('none' if move is None
+                                       else format_move(move)))
+
+
+    def stop(self):
+        ai = self.thinking
+        if ai is not None:
+            ai.stop()
+
+
+    def wait(self):
+        """Wait for the running go to finish."""
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+
+    def handle(self, line):
+        """Handle one line of input, return False to quit."""
+        words = line.split()
+        if not words:
+            return True
+        command, args = words[0], words[1:]
+        try:
+            if command == 'quit':
+                self.stop()
+                self.wait()
+                return False
+            elif command == 'newgame':
+                self.newgame(int(args[0]) if args else None)
+            elif command == 'position':
+                self.position([parse_move(arg) for arg in args])
+            elif command == 'go':
+                self.go(float(args[0]) if args else None)
+            elif command == 'stop':
+                self.stop()
+            elif command == 'isready':
+                self.send('readyok')
+            elif command in ('save', 'load'):
+                if len(args) != 1:
+                    raise ValueError('expected a path')
+                try:
+                    getattr(self, command)(args[0])
+                except OSError as e:
+                    self.send('info string {} failed: {}'.format(command, e))
+            else:
+                self.send('info string unknown command {}'.format(command))
+        except ValueError as e:
+            self.send('info string bad arguments for {}: {}'.format(command, e))
+        return True
+
+
+    def run(self, lines):
+        for line in lines:
+            if not self.handle(line):
+                break
+        self.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Mega3T engine')
+    parser.add_argument('--ai', default=ENGINE_AI,
+                        help='dotted path of the AI class (default: %(default)s)')
+    args = parser.parse_args(argv)
+    engine = Engine(load_ai_class(args.ai))
+    engine.run(sys.stdin)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,163 @@
+"""
+Batched encoding of positions as NumPy feature tensors, for learning AIs.
+
+A position becomes N_PLANES planes of n_rows ** 2 by n_rows ** 2 (indexed
+[x][y], like board.subtiles) float32 values:
+
+    0: subtiles of the first piece          3: megatiles of the second piece
+    1: subtiles of the second piece         4: allowed moves
+    2: megatiles of the first piece         5: 1 if the second piece is to move
+
+Megatile planes have the owner of the megatile in all its subtiles.
+
+Positions are read from board.Snapshot, whose bytes are used without copying.
+encode_children encodes all children of a position at once with array
+operations, using the megatile tables to find out who wins what.
+"""
+import functools
+import numpy as np
+
+import megatile_table
+
+N_PLANES = 6
+
+
+@functools.lru_cache(maxsize=None)
+def get_indices(n_rows):
+    """
+    Index arrays for a board with n_rows:
+        cell_megatile: megatile number of every cell
+        cell_local:    number of every cell within its megatile
+        megatile_cells: cells of every megatile, in local order
+    """
+    size = n_rows ** 2
+    cell_megatile = np.empty(size ** 2, dtype=np.intp)
+    cell_local = np.empty(size ** 2, dtype=np.intp)
+    megatile_cells = np.empty((size, size), dtype=np.intp)
+    for x in range(size):
+        for y in range(size):
+            cell = x * size + y
+            megatile = x // n_rows * n_rows + y // n_rows
+            local = x % n_rows * n_rows + y % n_rows
+            cell_megatile[cell] = megatile
+            cell_local[cell] = local
+            megatile_cells[megatile, local] = cell
+    return cell_megatile, cell_local, megatile_cells
+
+
+def to_planes(n_rows, cells, megatiles, legal, turn):
+    """
+    Build the feature tensor from arrays of a batch of positions:
+    cells (batch, n_cells) and megatiles (batch, n_megatiles) with piece codes,
+    legal (batch, n_cells) booleans and turn (batch,).
+    """
+    size = n_rows ** 2
+    cell_megatile = get_indices(n_rows)[0]
+    batch = cells.shape[0]
+    planes = np.empty((batch, N_PLANES, size ** 2), dtype=np.float32)
+    planes[:, 0] = cells == 1
+    planes[:, 1] = cells == 2
+    owners = megatiles[:, cell_megatile]
+    planes[:, 2] = owners == 1
+    planes[:, 3] = owners == 2
+    planes[:, 4] = legal
+    planes[:, 5] = turn[:, None]
+    return planes.reshape(batch, N_PLANES, size, size)
+
+
+def encode_batch(snapshots):
+    """Encode a sequence of snapshots (with the same n_rows)."""
+    n_rows = snapshots[0].n_rows
+    size = n_rows ** 2
+    count = len(snapshots)
+    cells = np.frombuffer(b''.join(s.cells for s in snapshots),
+                          dtype=np.uint8).reshape(count, size ** 2)
+    megatiles = np.frombuffer(b''.join(s.megatiles for s in snapshots),
+                              dtype=np.uint8).reshape(count, size)
+    turn = np.array([s.turn for s in snapshots], dtype=np.float32)
+    legal = np.zeros((count, size ** 2), dtype=bool)
+    for i, snapshot in enumerate(snapshots):
+        if snapshot.allowed_moves:
+            moves = np.array(snapshot.allowed_moves, dtype=np.intp)
+            legal[i, moves[:, 0] * size + moves[:, 1]] = True
+    return to_planes(n_rows, cells, megatiles, legal, turn)
+
+
+def encode(snapshot):
+    """Encode a single snapshot."""
+    return encode_batch([snapshot])[0]
+
+
+def encode_children(snapshot, pieces=None):
+    """
+    Encode the positions after every allowed move of snapshot.
+
+    obj.encode_children(snapshot) -> (moves, features)
+
+    For boards with n_rows = 3 and two pieces this is done with array
+    operations for all children at once. Other boards need the pieces, to
+    play the moves on a board.Board.
+    """
+    moves = list(snapshot.allowed_moves)
+    n_rows = snapshot.n_rows
+    size = n_rows ** 2
+    if not moves:
+        return moves, np.empty((0, N_PLANES, size, size), dtype=np.float32)
+    if not megatile_table.applies_to(n_rows, 2):
+        if pieces is None:
+            raise ValueError('pieces are needed for n_rows = {}'.format(n_rows))
+        from board import Board
+        board = Board.from_snapshot(pieces, snapshot)
+        children = []
+        for move in moves:
+            child = board.clone()
+            child.make_a_move(move)
+            children.append(child.snapshot())
+        return moves, encode_batch(children)
+
+    table = megatile_table.get_table()
+    cell_megatile, cell_local, megatile_cells = get_indices(n_rows)
+    powers = np.array(megatile_table.POWERS, dtype=np.intp)
+    code = snapshot.turn + 1
+
+    parent_cells = np.frombuffer(snapshot.cells, dtype=np.uint8)
+    parent_megatiles = np.frombuffer(snapshot.megatiles, dtype=np.uint8)
+    move_cells = np.array([x * size + y for x, y in moves], dtype=np.intp)
+    count = len(moves)
+    rows = np.arange(count)
+
+    # Place the pieces
+    cells = np.repeat(parent_cells[None, :], count, axis=0)
+    cells[rows, move_cells] = code
+
+    # Who wins a megatile (only lines through the move count)
+    move_megatiles = cell_megatile[move_cells]
+    move_locals = cell_local[move_cells]
+    states = (parent_cells[megatile_cells].astype(np.intp) * powers).sum(axis=1)
+    child_states = states[move_megatiles] + code * powers[move_locals]
+    lines_won = np.frombuffer(table.lines_won[code - 1], dtype=np.uint8)
+    cell_lines = np.array(megatile_table.CELL_LINES, dtype=np.uint8)
+    won_megatile = (lines_won[child_states] & cell_lines[move_locals]) != 0
+    won_megatile &= parent_megatiles[move_megatiles] == 0
+
+    megatiles = np.repeat(parent_megatiles[None, :], count, axis=0)
+    megatiles[rows[won_megatile], move_megatiles[won_megatile]] = code
+
+    # Who wins the game
+    big_lines = np.array(megatile_table.LINES, dtype=np.intp)
+    won_game = (megatiles[:, big_lines] == code).all(axis=2).any(axis=1)
+
+    # Allowed moves: in the megatile the move points to, if that is still
+    # open, else in all open megatiles.
+    empty = cells == 0
+    open_cells = megatiles[:, cell_megatile] == 0
+    in_target = cell_megatile[None, :] == move_locals[:, None]
+    target_open = megatiles[rows, move_locals] == 0
+    target_open &= (empty & in_target).any(axis=1)
+    legal = empty & open_cells & np.where(target_open[:, None], in_target, True)
+    legal &= ~won_game[:, None]
+
+    # The winner keeps the turn, like board.Board does.
+    turn = np.where(won_game, snapshot.turn, (snapshot.turn + 1) % 2)
+    return moves, to_planes(n_rows, cells, megatiles, legal,
+                            turn.astype(np.float32))
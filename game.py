@@ -1,7 +1,8 @@
 import sys, logging, pygame
 
-import config
-from board import PygameBoard as Board
+import config, telemetry
+from pygame_board import PygameBoard as Board
+from analysis import BackgroundAnalyzer
 from constants import *
 
 logging.basicConfig(level=config.GAME_LOGGING_LEVEL)
@@ -57,6 +58,40 @@ def draw_turn(window, font, text,
     window.blit(new_surface, pos)
     return new_surface.get_rect(topleft=pos)
 
+# Short names of timings in the performance HUD
+PERF_LABELS = {'draw_board': 'draw', 'update_display': 'flip'}
+
+def get_perf_lines(stats=telemetry.default):
+    """Lines of text for the performance HUD (p50/p99 timings and rates)."""
+    lines = ['p50/p99:']
+    for name, stats_ in sorted(stats.timings.items()):
+        percentiles = stats_.percentiles((50, 99))
+        if name.startswith('move '):
+            lines.append('{:<4}{:>5.2f}/{:.2f}s'.format(
+                name[5:], percentiles[50], percentiles[99]))
+        else:
+            lines.append('{:<5}{:>4.1f}/{:.1f}ms'.format(
+                PERF_LABELS.get(name, name[:5]),
+                percentiles[50] * 1000, percentiles[99] * 1000))
+    for name, value in sorted(stats.rates.items()):
+        piece, _, unit = name.partition(' ')
+        lines.append('{} {:.1f}k {}'.format(piece, value / 1000, unit))
+    return lines
+
+def draw_perf_hud(window, font, lines, pos, rect=None,
+                  bg_color=BACKGROUND_COLOR, text_color=TEXT_COLOR,
+                  anti_alias=ANTI_ALIAS):
+    """Draw the performance HUD, replacing the old one at rect."""
+    if rect:
+        window.fill(bg_color, rect)
+    rect = pygame.Rect(pos, (0, 0))
+    for i, line in enumerate(lines):
+        surface = font.render(line, anti_alias, text_color)
+        line_pos = (pos[0], pos[1] + i * font.get_linesize())
+        window.blit(surface, line_pos)
+        rect.union_ip(surface.get_rect(topleft=line_pos))
+    return rect
+
 def draw_game_over(window, font, text, pos, text_color=TEXT_COLOR,
                    anti_alias=ANTI_ALIAS):
     """Draw game over text."""
@@ -137,6 +172,10 @@ if __name__ == '__main__':
     game_over_pos = (board_size, game_over_pos)
     game_over_rect = None
 
+    # Initialize performance HUD
+    perf_pos = (board_size, game_over_pos[1] + title_font.get_linesize() + MARGIN)
+    perf_rect = None
+
     # Initialize board graphics
     b.pygame_init()
     update_display(window, b)
@@ -144,6 +183,9 @@ if __name__ == '__main__':
     # Initialize main loop
     quit = False
     force_move = config.FORCE_MOVE
+    analyzer = None
+    show_perf = False
+    frame = 0
     clock = pygame.time.Clock()
 
     # Main loop
@@ -151,7 +193,7 @@ if __name__ == '__main__':
         # If it's an AI's turn, let it move
         if b.get_turn().is_AI() and not b.game_over:
             ai = b.get_turn()
-            if b.make_a_move(ai.move(b.get_mutations(ai), b.allowed_moves)):
+            if b.make_a_move(b.get_ai_move(ai)):
                 turn_rect = draw_turn(window, font,
                                       b.get_turn_text(), rect=turn_rect)
             else:
@@ -206,6 +248,19 @@ if __name__ == '__main__':
                 if config.FORCE_MOVE and event.key == FORCE_KEY:
                     force_move = not force_move
                     logger.info("Force move: {}".format(force_move))
+                elif event.key == PERF_KEY:
+                    show_perf = not show_perf
+                    if not show_perf and perf_rect is not None:
+                        window.fill(BACKGROUND_COLOR, perf_rect)
+                        perf_rect = None
+                elif event.key == ANALYSIS_KEY:
+                    if analyzer is None:
+                        analyzer = BackgroundAnalyzer(b.pieces)
+                    else:
+                        analyzer.stop()
+                        analyzer = None
+                        b.clear_heatmap()
+                    logger.info("Analysis: {}".format(analyzer is not None))
 
 
         if b.game_over:
@@ -215,8 +270,25 @@ if __name__ == '__main__':
             game_over_rect = draw_game_over(window, title_font,
                                             GAME_OVER_TEXT, game_over_pos)
 
-        b.draw_board()
-        update_display(window, b)
+        if analyzer is not None:
+            if analyzer.analyze(b.snapshot()):
+                b.clear_heatmap()
+            scores = analyzer.get_scores()
+            if scores is not None:
+                b.set_heatmap(scores)
+
+        # Update the HUD about once a second, it doesn't need to be faster.
+        if show_perf and not frame % TPS:
+            perf_rect = draw_perf_hud(window, font, get_perf_lines(),
+                                      perf_pos, perf_rect)
+        frame += 1
+
+        with telemetry.default.timer('draw_board'):
+            b.draw_board()
+        with telemetry.default.timer('update_display'):
+            update_display(window, b)
         clock.tick(TPS)
 
+    if analyzer is not None:
+        analyzer.stop()
     exit()
@@ -0,0 +1,167 @@
+"""
+An AI that looks one move ahead and picks the move with the best weighted
+sum of features, for the player making it:
+
+    megatile:    the move wins the megatile
+    center:      the move wins the center megatile
+    threat:      the number of lines the player can complete with one more
+                 piece in the megatile goes up by this much
+    block:       ... and the number of the opponent's goes down by this much
+    big_threat:  the number of big lines (of megatiles) the player can
+                 complete with one more megatile goes up by this much
+    send_free:   the opponent may play in any open megatile next
+    send_threat: the opponent can win a megatile with their next move
+
+A move that wins the game is always played. The features are read from the
+tables of megatile_table, so the AI only plays boards with n_rows = 3 (on
+other boards it plays random moves).
+
+The weights come from config.HEURISTIC_WEIGHTS, or from
+config.HEURISTIC_WEIGHTS_FILE when tuner.py wrote tuned weights to it.
+"""
+import os, json, random
+
+import megatile_table
+from board import get_geometry
+from pieces import AIMixin, Cross, Nought
+from megatile_table import N_ROWS, N_CELLS, POWERS
+from config import HEURISTIC_WEIGHTS, HEURISTIC_WEIGHTS_FILE
+
+WEIGHT_NAMES = ('megatile', 'center', 'threat', 'block', 'big_threat',
+                'send_free', 'send_threat')
+CENTER = N_CELLS // 2
+
+
+def load_weights(path=HEURISTIC_WEIGHTS_FILE):
+    """The default weights, updated with the ones in the file at path."""
+    weights = dict(HEURISTIC_WEIGHTS)
+    if path is not None and os.path.exists(path):
+        with open(path) as f:
+            tuned = json.load(f)
+        unknown = set(tuned) - set(WEIGHT_NAMES)
+        if unknown:
+            raise ValueError('Unknown weights in {}: {}'.format(
+                path, ', '.join(sorted(unknown))))
+        weights.update(tuned)
+    return weights
+
+
+def save_weights(weights, path=HEURISTIC_WEIGHTS_FILE):
+    """Write weights to path (replacing the file in one go)."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp = path + '.tmp'
+    with open(temp, 'w') as f:
+        json.dump({name: weights[name] for name in WEIGHT_NAMES}, f, indent=4)
+    os.replace(temp, path)
+
+
+class HeuristicAI(AIMixin):
+    wants_snapshot = True
+    # {name: weight} for every name in WEIGHT_NAMES, None for load_weights().
+    weights = None
+    # Seed for breaking ties (and for the random moves), None for a
+    # different game every time.
+    seed = None
+    # Play this many random moves at the start of a game (per player), to
+    # get different games between the same weights.
+    random_moves = 0
+
+    def save_board_info(self, n_rows, pieces):
+        if self.weights is None:
+            self.weights = load_weights()
+        self.n_rows = n_rows
+        self.random = random.Random(self.seed)
+        if megatile_table.applies_to(n_rows, len(pieces)):
+            self.table = megatile_table.get_table()
+            self.cells = get_geometry(N_ROWS)[0]
+            # The other megatiles of the big lines through every megatile.
+            lines = [[x * N_ROWS + y for x, y in line]
+                     for line in get_geometry(N_ROWS)[3]]
+            self.big_lines = [[[other for other in line if other != m]
+                               for line in lines if m in line]
+                              for m in range(N_CELLS)]
+        else:
+            self.table = None
+
+    def move(self, mutations, allowed_moves, snapshot):
+        cells = snapshot.cells
+        if self.table is None or \
+           len(cells) - cells.count(0) < 2 * self.random_moves:
+            return self.random.choice(allowed_moves)
+
+        states = [sum(cells[cell] * power for cell, power in zip(
+                      megatile_cells, POWERS))
+                  for megatile_cells in self.cells]
+        best, best_score = [], None
+        for coords in allowed_moves:
+            features = self.features(states, snapshot.megatiles,
+                                     snapshot.turn, coords)
+            if features is None:
+                # It wins the game.
+                return coords
+            score = sum(self.weights[name] * value
+                        for name, value in zip(WEIGHT_NAMES, features))
+            if best_score is None or score > best_score:
+                best, best_score = [coords], score
+            elif score == best_score:
+                best.append(coords)
+        return self.random.choice(best)
+
+    def features(self, states, megatiles, turn, coords):
+        """
+        The values of the WEIGHT_NAMES features of the move at coords, or None
+        if it wins the game.
+        """
+        table = self.table
+        x, y = coords
+        m = x // N_ROWS * N_ROWS + y // N_ROWS
+        local = x % N_ROWS * N_ROWS + y % N_ROWS
+        code = turn + 1
+        old = states[m]
+        new = old + POWERS[local] * code
+
+        won = not megatiles[m] and table.owner[new] >> turn & 1
+
+        # Megatiles that can still be won, and their states, after the move.
+        def is_open(i):
+            if i == m:
+                return not won and not megatiles[m] and not table.full[new]
+            return not megatiles[i] and not table.full[states[i]]
+
+        def state(i):
+            return new if i == m else states[i]
+
+        big_threat = 0
+        if won:
+            for line in self.big_lines[m]:
+                mine = [i for i in line if megatiles[i] == code]
+                if len(mine) == len(line):
+                    return None
+                if len(mine) == len(line) - 1 and \
+                   any(is_open(i) for i in line if i not in mine):
+                    big_threat += 1
+            threat = block = 0
+        else:
+            threat = table.threats[turn][new] - table.threats[turn][old]
+            block = table.threats[1 - turn][old] - table.threats[1 - turn][new]
+
+        # Where the opponent plays next.
+        theirs = table.threat_cells[1 - turn]
+        if is_open(local):
+            send_free = 0
+            send_threat = theirs[state(local)] != 0
+        else:
+            send_free = 1
+            send_threat = any(theirs[state(i)] for i in range(N_CELLS)
+                              if is_open(i))
+        return (won, won and m == CENTER, threat, block, big_threat,
+                send_free, send_threat)
+
+
+class NoughtHeuristic(Nought, HeuristicAI):
+    pass
+
+class CrossHeuristic(Cross, HeuristicAI):
+    pass
@@ -0,0 +1,327 @@
+"""
+Monte Carlo tree search (UCT) on the rules of board.Board.
+"""
+import math, time, array, random, logging
+
+from board import Board, Snapshot
+from pieces import AIMixin, Cross, Nought
+from solver import EndgameSolver
+from playout import get_policy
+from node_pool import NodePool, NO_NODE, UNEXPANDED, TERMINAL
+from config import (MCTS_LOGGING_LEVEL, MCTS_TIME_BUDGET, MCTS_EXPLORATION,
+                    MCTS_NODE_CAPACITY, MCTS_PLAYOUT)
+
+logger = logging.getLogger(__name__)
+logger.setLevel(MCTS_LOGGING_LEVEL)
+
+
+class MCTS(object):
+    def __init__(self, exploration=MCTS_EXPLORATION, seed=None,
+                 capacity=MCTS_NODE_CAPACITY, playout=MCTS_PLAYOUT):
+        """
+        The tree is stored in a NodePool of capacity nodes. When the pool is
+        full, the search goes on without growing the tree.
+
+        playout is the name of the playout policy, see playout.POLICIES.
+        """
+        self.exploration = exploration
+        self.policy = get_policy(playout)
+        self.random = random.Random(seed)
+        self.capacity = capacity
+        self.pool = None
+        self.size = None
+        self.root = NO_NODE
+        # The position at the root of the tree.
+        self.root_board = None
+        self.iterations = 0
+        self.seconds = 0.0
+        # Of the last search
+        self.last_iterations = 0
+        self.last_seconds = 0.0
+        self.stopped = False
+
+
+    def stop(self):
+        """
+        Make a running search return as soon as possible, or the next one if
+        none is running, until clear_stop is called.
+        """
+        self.stopped = True
+
+
+    def clear_stop(self):
+        self.stopped = False
+
+
+    def set_root(self, board):
+        """
+        Make the position on board the root of the tree, keeping the tree if
+        it already is.
+        """
+        if self.pool is None or self.size != board.n_rows ** 2:
+            self.pool = NodePool(self.capacity, board.n_rows ** 4)
+            self.size = board.n_rows ** 2
+            self.root = NO_NODE
+        if self.root != NO_NODE and \
+           self.root_board.snapshot() == board.snapshot():
+            return
+        self.pool.clear()
+        self.root = self.pool.allocate()
+        self.root_board = board.clone()
+
+
+    def clear(self):
+        """Forget the tree (but keep the memory for the next one)."""
+        if self.pool is not None:
+            self.pool.clear()
+        self.root = NO_NODE
+
+
+    def advance(self, moves):
+        """
+        Play moves from the root of the tree, keeping the subtree that is
+        reached and recycling all other nodes.
+        """
+        for move in moves:
+            if self.root == NO_NODE:
+                return
+            child = self.pool.find_child(self.root, move[0] * self.size + move[1])
+            if child == NO_NODE or not self.root_board.make_a_move(move):
+                self.pool.clear()
+                self.root = NO_NODE
+                return
+            self.pool.advance_root(self.root, child)
+            self.root = child
+
+
+    def save_state(self, writer):
+        """Add the tree to a checkpoint, see checkpoint."""
+        writer.set('iterations', self.iterations)
+        writer.set('seconds', self.seconds)
+        if self.root == NO_NODE:
+            return
+        writer.set('root', self.root)
+        writer.set('n_rows', self.root_board.n_rows)
+        writer.add_array('root_board',
+                         array.array('B', self.root_board.snapshot().pack()))
+        self.pool.save_state(writer.scope('pool.'))
+
+
+    def load_state(self, reader, pieces):
+        """
+        Restore the tree saved by save_state, pieces are those of the board.
+        The pool is reused when it is large enough.
+        """
+        self.iterations = reader.get('iterations', 0)
+        self.seconds = reader.get('seconds', 0.0)
+        if reader.get('root') is None:
+            self.clear()
+            return
+        n_rows = reader.get('n_rows')
+        capacity = max(self.capacity, reader.get('pool.size'))
+        if self.pool is None or self.size != n_rows ** 2 or \
+           self.pool.capacity < capacity:
+            self.pool = NodePool(capacity, n_rows ** 4)
+            self.size = n_rows ** 2
+        self.pool.load_state(reader.scope('pool.'))
+        self.root = reader.get('root')
+        self.root_board = Board.from_snapshot(pieces, Snapshot.unpack(
+            n_rows, reader.array('root_board')))
+
+
+    def search(self, board, time_budget=None, max_iterations=None):
+        """
+        Search from the position on board until time_budget seconds have
+        passed or max_iterations iterations are done, whichever comes first.
+        Only max_iterations makes the result reproducible (with a seed).
+
+        Returns the root node.
+        """
+        if time_budget is None and max_iterations is None:
+            time_budget = MCTS_TIME_BUDGET
+        start = time.perf_counter()
+        deadline = None if time_budget is None else start + time_budget
+
+        self.set_root(board)
+        if self.pool.first_child[self.root] == TERMINAL and not board.game_over:
+            # An earlier search ended the game here (a dead draw), but the
+            # real game goes on and needs a move.
+            self.pool.first_child[self.root] = UNEXPANDED
+        # The playouts stop at dead draws, their result is known.
+        board = board.clone()
+        board.end_dead_draws = True
+        iterations = 0
+        # Always do one iteration, so there's a move, even when stopped early.
+        while not self.stopped or not iterations:
+            if max_iterations is not None and iterations >= max_iterations:
+                break
+            # Checking the clock is relatively expensive, do it every so often.
+            if deadline is not None and iterations and not iterations % 16 and \
+               time.perf_counter() >= deadline:
+                break
+            self.iterate(self.root, board.clone())
+            iterations += 1
+
+        self.last_iterations = iterations
+        self.last_seconds = time.perf_counter() - start
+        self.iterations += iterations
+        self.seconds += self.last_seconds
+        logger.debug('{} iterations in {:.3f}s, {} nodes'.format(
+            iterations, time.perf_counter() - start, self.pool.n_used))
+        return self.root
+
+
+    def iterate(self, root, board):
+        """Do one selection, expansion, playout and backpropagation."""
+        pool = self.pool
+        first_child = pool.first_child
+        size = self.size
+
+        # Selection and expansion. players[i] made the move to path[i].
+        node = root
+        path = [root]
+        players = [None]
+        while True:
+            child = first_child[node]
+            if child == TERMINAL:
+                break
+            if child == UNEXPANDED:
+                if board.game_over:
+                    first_child[node] = TERMINAL
+                    break
+                if node != root and not pool.visits[node]:
+                    # Play out from new nodes first.
+                    break
+                moves = [x * size + y for x, y in board.allowed_moves]
+                self.random.shuffle(moves)
+                if pool.add_children(node, moves) == NO_NODE:
+                    break
+            node = self.select_child(node)
+            players.append(board.turn)
+            board.make_a_move(divmod(pool.move[node], size))
+            path.append(node)
+
+        # Playout
+        self.playout(board)
+        winner = None if board.winner is None else board.pieces.index(board.winner)
+
+        # Backpropagation
+        visits, value = pool.visits, pool.value
+        for node, player in zip(path, players):
+            visits[node] += 1
+            if winner is None:
+                value[node] += 0.5
+            elif winner == player:
+                value[node] += 1.0
+
+
+    def select_child(self, node):
+        """
+        Pick the child with the highest upper confidence bound, or the first
+        one that was never visited.
+        """
+        pool = self.pool
+        visits, value, next_sibling = pool.visits, pool.value, pool.next_sibling
+        log_visits = math.log(max(visits[node], 1))
+        exploration = self.exploration
+        best, best_ucb = NO_NODE, -1.0
+        child = pool.first_child[node]
+        while child >= 0:
+            child_visits = visits[child]
+            if not child_visits:
+                return child
+            ucb = value[child] / child_visits + \
+                  exploration * math.sqrt(log_visits / child_visits)
+            if ucb > best_ucb:
+                best, best_ucb = child, ucb
+            child = next_sibling[child]
+        return best
+
+
+    def playout(self, board):
+        """Play moves of the playout policy until the game is over."""
+        self.policy.play(board, self.random)
+
+
+    def move_stats(self, root):
+        """Return {move: (visits, value)} of the children of root."""
+        pool = self.pool
+        return {divmod(pool.move[child], self.size):
+                    (pool.visits[child], pool.value[child])
+                for child in pool.children(root)}
+
+
+    @staticmethod
+    def best_move(stats):
+        """The most visited move in a {move: (visits, value)} dict."""
+        return max(sorted(stats), key=lambda move: stats[move][0])
+
+
+
+class MCTSAI(AIMixin):
+    wants_snapshot = True
+    # Seconds to think per move.
+    time_budget = MCTS_TIME_BUDGET
+    # Seed for the random playouts, None for a different game every time.
+    seed = None
+    # Play perfectly once the endgame solver can solve the position.
+    use_solver = True
+    # Name of the playout policy, see playout.POLICIES.
+    playout = MCTS_PLAYOUT
+
+    def save_board_info(self, n_rows, pieces):
+        # Keep the memory of the tree and the solver's cache for the next
+        # game.
+        if getattr(self, 'n_rows', None) != n_rows or self.pieces != pieces or \
+           self.mcts.policy.name != self.playout:
+            self.mcts = MCTS(seed=self.seed, playout=self.playout)
+            self.solver = EndgameSolver() if self.use_solver else None
+        else:
+            # The tree is of another game, and a game with a seed plays out
+            # the same as with a new AI.
+            self.mcts.clear()
+            if self.seed is not None:
+                self.mcts.random.seed(self.seed)
+        self.n_rows = n_rows
+        self.pieces = list(pieces)
+
+    def move(self, mutations, allowed_moves, snapshot):
+        deadline = time.perf_counter() + self.time_budget
+        board = Board.from_snapshot(self.pieces, snapshot)
+        # Keep the part of the tree that is still relevant.
+        self.mcts.advance([coords for coords, piece in mutations])
+        if self.solver is not None:
+            move = self.solver.best_move(board, deadline)
+            if move is not None:
+                return move
+        # The solver's time counts too.
+        root = self.mcts.search(board, max(deadline - time.perf_counter(), 0))
+        return self.mcts.best_move(self.mcts.move_stats(root))
+
+    def save_state(self, writer):
+        self.mcts.save_state(writer.scope('mcts.'))
+        if self.solver is not None:
+            self.solver.save_state(writer.scope('solver.'))
+
+    def load_state(self, reader):
+        self.mcts.load_state(reader.scope('mcts.'), self.pieces)
+        if self.solver is not None:
+            self.solver.load_state(reader.scope('solver.'))
+
+    def stop(self):
+        self.mcts.stop()
+
+    def clear_stop(self):
+        self.mcts.clear_stop()
+
+    def get_stats(self):
+        if not self.mcts.last_seconds:
+            return {}
+        return {'playouts/s': self.mcts.last_iterations / self.mcts.last_seconds}
+
+
+class NoughtMCTS(Nought, MCTSAI):
+    pass
+
+class CrossMCTS(Cross, MCTSAI):
+    pass
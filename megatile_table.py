@@ -0,0 +1,254 @@
+"""
+Precomputed lookup tables for a single megatile of a board with n_rows = 3 and
+two pieces.
+
+A megatile is encoded as a base-3 number (its state): subtile (x, y) of the
+megatile is digit x * 3 + y, which is 0 for empty, 1 for the first piece and 2
+for the second piece (the codes of board.Board.cell_codes). Placing a piece is
+therefore a single addition, see add_piece.
+
+The tables are indexed by state:
+    owner:          0 if nobody has a line, 1 or 2 if that piece has one,
+                    3 if both have one (only possible with forced moves)
+    full:           1 if there are no empty subtiles left, else 0
+    lines_won[p]:   bitmask of the LINES completed by piece p (0 or 1)
+    threats[p]:     number of lines piece p can complete with one more piece
+    threat_cells[p]: bitmask of the subtiles that would complete a line for p
+    chances:        bit p is set if piece p has a line without pieces of the
+                    other, so it can still win the megatile
+    score:          heuristic value for the first piece, from -100 (lost) to
+                    100 (won)
+
+The tables are generated on first use and cached to disk, so later runs start
+instantly. Run this module to generate the cache file at build time.
+"""
+import os, array, logging
+
+from config import TABLE_LOGGING_LEVEL, CACHE_DIR
+
+logger = logging.getLogger(__name__)
+logger.setLevel(TABLE_LOGGING_LEVEL)
+
+N_ROWS = 3
+N_PIECES = 2
+N_CELLS = N_ROWS ** 2
+N_STATES = 3 ** N_CELLS
+POWERS = tuple(3 ** i for i in range(N_CELLS))
+
+# Lines as tuples of subtile numbers (x * 3 + y), in the same order
+# board.Board.check_has_line tries them: x fixed, y fixed, both diagonals.
+LINES = tuple(
+    [tuple(x * N_ROWS + y for y in range(N_ROWS)) for x in range(N_ROWS)] +
+    [tuple(x * N_ROWS + y for x in range(N_ROWS)) for y in range(N_ROWS)] +
+    [tuple(i * N_ROWS + i for i in range(N_ROWS)),
+     tuple(i * N_ROWS + N_ROWS - 1 - i for i in range(N_ROWS))]
+)
+# For every subtile, the bitmask of the lines going through it.
+CELL_LINES = tuple(
+    sum(1 << i for i, line in enumerate(LINES) if cell in line)
+    for cell in range(N_CELLS)
+)
+
+# Weights of the score for lines with 0, 1 or 2 pieces of only one player.
+LINE_WEIGHTS = (0, 1, 8)
+CENTER_WEIGHT = 3
+MAX_SCORE = 100
+
+FILE_NAME = 'megatile_table.bin'
+MAGIC = b'M3TT'
+VERSION = 2
+
+
+def add_piece(state, cell, code):
+    """Return the state after putting the piece with code on an empty cell."""
+    return state + code * POWERS[cell]
+
+
+def encode(codes):
+    """Encode a sequence of 9 piece codes (x * 3 + y order) as a state."""
+    return sum(code * power for code, power in zip(codes, POWERS))
+
+
+def decode(state):
+    """Turn a state back into a list of 9 piece codes."""
+    codes = []
+    for _ in range(N_CELLS):
+        state, code = divmod(state, 3)
+        codes.append(code)
+    return codes
+
+
+def line_coords(line):
+    """Coordinates of the subtiles of line (index in LINES) in the megatile."""
+    return [[cell // N_ROWS, cell % N_ROWS] for cell in LINES[line]]
+
+
+def first_line(mask):
+    """Index of the first line in a bitmask of lines, or None."""
+    if not mask:
+        return None
+    return (mask & -mask).bit_length() - 1
+
+
+class MegatileTable(object):
+    def __init__(self, owner, full, lines_won, threats, threat_cells, chances,
+                 score):
+        self.owner = owner
+        self.full = full
+        self.lines_won = lines_won
+        self.threats = threats
+        self.threat_cells = threat_cells
+        self.chances = chances
+        self.score = score
+
+
+    @classmethod
+    def generate(cls):
+        """Compute the tables for every possible state."""
+        owner = bytearray(N_STATES)
+        full = bytearray(N_STATES)
+        lines_won = (bytearray(N_STATES), bytearray(N_STATES))
+        threats = (bytearray(N_STATES), bytearray(N_STATES))
+        threat_cells = (array.array('H', bytes(2 * N_STATES)),
+                        array.array('H', bytes(2 * N_STATES)))
+        chances = bytearray(N_STATES)
+        score = array.array('b', bytes(N_STATES))
+
+        for state in range(N_STATES):
+            codes = decode(state)
+            full[state] = 0 not in codes
+            value = 0
+            for i, line in enumerate(LINES):
+                line_codes = [codes[cell] for cell in line]
+                for player in range(N_PIECES):
+                    code = player + 1
+                    other = N_PIECES - player
+                    if other in line_codes:
+                        continue
+                    chances[state] |= 1 << player
+                    count = line_codes.count(code)
+                    if count == N_ROWS:
+                        lines_won[player][state] |= 1 << i
+                    elif count == N_ROWS - 1:
+                        threats[player][state] += 1
+                        threat_cells[player][state] |= \
+                            1 << line[line_codes.index(0)]
+                    if count < N_ROWS:
+                        sign = 1 if player == 0 else -1
+                        value += sign * LINE_WEIGHTS[count]
+
+            owner[state] = (lines_won[0][state] != 0) | \
+                           (lines_won[1][state] != 0) << 1
+            center = codes[N_CELLS // 2]
+            if center:
+                value += CENTER_WEIGHT if center == 1 else -CENTER_WEIGHT
+            if owner[state] == 1:
+                value = MAX_SCORE
+            elif owner[state] == 2:
+                value = -MAX_SCORE
+            elif owner[state] or full[state]:
+                value = 0
+            else:
+                value = max(-MAX_SCORE + 1, min(MAX_SCORE - 1, value))
+            score[state] = value
+
+        return cls(bytes(owner), bytes(full),
+                   tuple(bytes(b) for b in lines_won),
+                   tuple(bytes(b) for b in threats),
+                   threat_cells, bytes(chances), score)
+
+
+    def to_bytes(self):
+        parts = [MAGIC, bytes((VERSION,)), self.owner, self.full]
+        parts.extend(self.lines_won)
+        parts.extend(self.threats)
+        parts.extend(cells.tobytes() for cells in self.threat_cells)
+        parts.append(self.chances)
+        parts.append(self.score.tobytes())
+        return b''.join(parts)
+
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Load tables written by to_bytes, raises ValueError if they don't fit."""
+        header = len(MAGIC) + 1
+        if data[:len(MAGIC)] != MAGIC or data[len(MAGIC)] != VERSION:
+            raise ValueError('Not a version {} megatile table'.format(VERSION))
+        if len(data) != header + 12 * N_STATES:
+            raise ValueError('Megatile table has the wrong size')
+
+        offset = [header]
+        def take(n_bytes):
+            start = offset[0]
+            offset[0] += n_bytes
+            return data[start:offset[0]]
+
+        owner = take(N_STATES)
+        full = take(N_STATES)
+        lines_won = (take(N_STATES), take(N_STATES))
+        threats = (take(N_STATES), take(N_STATES))
+        threat_cells = (array.array('H'), array.array('H'))
+        for cells in threat_cells:
+            cells.frombytes(take(2 * N_STATES))
+        chances = take(N_STATES)
+        score = array.array('b')
+        score.frombytes(take(N_STATES))
+        return cls(owner, full, lines_won, threats, threat_cells, chances,
+                   score)
+
+
+    def winning_line(self, state, player):
+        """
+        Coordinates of the first line piece number player has in the megatile
+        (see board.Board.find_winner_megatile), or None.
+        """
+        line = first_line(self.lines_won[player][state])
+        return None if line is None else line_coords(line)
+
+
+def cache_path():
+    return os.path.join(CACHE_DIR, FILE_NAME)
+
+
+def build(path=None):
+    """Generate the tables and write them to the cache file."""
+    path = path or cache_path()
+    table = MegatileTable.generate()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write to a temporary file first, so other processes never read half a table.
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        f.write(table.to_bytes())
+    os.replace(tmp_path, path)
+    logger.info('Wrote megatile table to {}'.format(path))
+    return table
+
+
+_table = None
+
+def get_table():
+    """Return the MegatileTable, loading or generating it on first use."""
+    global _table
+    if _table is None:
+        try:
+            with open(cache_path(), 'rb') as f:
+                _table = MegatileTable.from_bytes(f.read())
+        except (OSError, ValueError) as e:
+            logger.info('Generating megatile table ({})'.format(e))
+            try:
+                _table = build()
+            except OSError as e:
+                logger.warning("Couldn't cache megatile table: {}".format(e))
+                _table = MegatileTable.generate()
+    return _table
+
+
+def applies_to(n_rows, n_pieces):
+    """Check whether the tables can be used for a board."""
+    return n_rows == N_ROWS and n_pieces == N_PIECES
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    logger.setLevel(logging.INFO)
+    build()
@@ -0,0 +1,171 @@
+"""
+Memory compact storage for search trees.
+
+In stead of one Python object per node, all nodes live in preallocated typed
+arrays (struct of arrays) and are referred to by their index. A node takes 17
+bytes (18 for boards with more than 256 subtiles), about a tenth of a small
+Python object, and nodes that are used together are close together in memory.
+
+Children of a node form a linked list: first_child[node] is the first one,
+next_sibling[child] the next. first_child is UNEXPANDED for nodes whose
+children have not been created yet and TERMINAL for nodes without children.
+"""
+import array
+
+NO_NODE = -1
+UNEXPANDED = -1
+TERMINAL = -2
+
+
+class NodePool(object):
+    def __init__(self, capacity, n_cells):
+        """
+        capacity is the maximum number of nodes, n_cells the number of
+        subtiles of the board (moves are stored as cell index).
+        """
+        self.capacity = capacity
+        self.visits = array.array('I', bytes(4 * capacity))
+        self.value = array.array('f', bytes(4 * capacity))
+        self.first_child = array.array('i', bytes(4 * capacity))
+        self.next_sibling = array.array('i', bytes(4 * capacity))
+        if n_cells <= 256:
+            self.move = array.array('B', bytes(capacity))
+        else:
+            self.move = array.array('H', bytes(2 * capacity))
+        self.clear()
+
+
+    def clear(self):
+        """Free all nodes at once."""
+        # Nodes from size on have never been used (since the last clear),
+        # freed nodes before that are in a list linked by next_sibling.
+        self.size = 0
+        self.free = NO_NODE
+        self.n_used = 0
+
+
+    def available(self):
+        """Number of nodes that can still be allocated."""
+        return self.capacity - self.n_used
+
+
+    def allocate(self, move=0):
+        """Return the index of a fresh node, or NO_NODE if the pool is full."""
+        if self.free != NO_NODE:
+            node = self.free
+            self.free = self.next_sibling[node]
+        elif self.size < self.capacity:
+            node = self.size
+            self.size += 1
+        else:
+            return NO_NODE
+        self.n_used += 1
+        self.visits[node] = 0
+        self.value[node] = 0.0
+        self.first_child[node] = UNEXPANDED
+        self.next_sibling[node] = NO_NODE
+        self.move[node] = move
+        return node
+
+
+    def add_children(self, node, moves):
+        """
+        Create children of node for all moves (in that order).
+
+        Returns the first child, or NO_NODE if there is no room for all of
+        them (node is then left unexpanded).
+        """
+        if not moves:
+            self.first_child[node] = TERMINAL
+            return NO_NODE
+        if self.available() < len(moves):
+            return NO_NODE
+        next_child = NO_NODE
+        for move in reversed(moves):
+            child = self.allocate(move)
+            self.next_sibling[child] = next_child
+            next_child = child
+        self.first_child[node] = next_child
+        return next_child
+
+
+    def children(self, node):
+        """Iterate over the children of node."""
+        child = self.first_child[node]
+        next_sibling = self.next_sibling
+        while child >= 0:
+            yield child
+            child = next_sibling[child]
+
+
+    def find_child(self, node, move):
+        """The child of node reached by move, or NO_NODE."""
+        for child in self.children(node):
+            if self.move[child] == move:
+                return child
+        return NO_NODE
+
+
+    def free_subtree(self, node, keep=NO_NODE):
+        """Free node and all its descendants, except the subtree of keep."""
+        first_child = self.first_child
+        next_sibling = self.next_sibling
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node == keep:
+                continue
+            child = first_child[node]
+            while child >= 0:
+                stack.append(child)
+                child = next_sibling[child]
+            next_sibling[node] = self.free
+            self.free = node
+            self.n_used -= 1
+
+
+    def advance_root(self, root, new_root):
+        """
+        Make new_root (a descendant of root) the root of the tree, recycling
+        all nodes that are not in its subtree.
+        """
+        self.free_subtree(root, keep=new_root)
+        self.next_sibling[new_root] = NO_NODE
+
+
+    def arrays(self):
+        return {'visits': self.visits, 'value': self.value,
+                'first_child': self.first_child,
+                'next_sibling': self.next_sibling, 'move': self.move}
+
+
+    def save_state(self, writer):
+        """Add the nodes to a checkpoint (only the part that was ever used)."""
+        writer.set('size', self.size)
+        writer.set('free', self.free)
+        writer.set('n_used', self.n_used)
+        for name, values in self.arrays().items():
+            writer.add_array(name, memoryview(values)[:self.size])
+
+
+    def load_state(self, reader):
+        """
+        Restore the nodes saved by save_state, copying them straight into the
+        arrays. Raises ValueError if they don't fit in the pool.
+        """
+        size = reader.get('size')
+        if size > self.capacity:
+            raise ValueError('The checkpoint has {} nodes, the pool only room '
+                             'for {}'.format(size, self.capacity))
+        for name, values in self.arrays().items():
+            reader.read_into(name, values)
+        self.size = size
+        self.free = reader.get('free')
+        self.n_used = reader.get('n_used')
+
+
+    def memory(self):
+        """Bytes used by the arrays."""
+        return sum(a.itemsize * len(a) for a in (
+            self.visits, self.value, self.first_child, self.next_sibling,
+            self.move))
@@ -0,0 +1,177 @@
+"""
+Text notation of a full position, to keep test positions in files.
+
+A position is four fields separated by spaces:
+
+    cells      the subtiles, one row (x) at a time with / in between; X for
+               the first piece, O for the second and a number for that many
+               empty subtiles
+    megatiles  the owners of the megatiles (x * n_rows + y), . if nobody
+               won it
+    side       X or O, who is to move
+    forced     x,y of the megatile the next move must be played in, or -
+               if it can be played in any open megatile
+
+The start of a game with n_rows = 3 is
+
+    9/9/9/9/9/9/9/9/9 ......... X -
+
+n_rows follows from the number of rows. Games that are over have no allowed
+moves, whatever forced says. Otherwise forced must be a megatile that is still
+open (nobody won it and it has empty subtiles), the rules never send a move
+anywhere else.
+"""
+from board import Board, Snapshot, get_geometry
+
+# Symbols of the piece codes
+SYMBOLS = '.XO'
+CODES = {symbol: code for code, symbol in enumerate(SYMBOLS)}
+ANYWHERE = '-'
+
+
+def format_position(position):
+    """The notation of a Board or Snapshot."""
+    snapshot = position.snapshot() if isinstance(position, Board) else position
+    n_rows = snapshot.n_rows
+    size = n_rows**2
+
+    rows = []
+    for x in range(size):
+        row = []
+        empty = 0
+        for code in snapshot.cells[x * size:(x + 1) * size]:
+            if not code:
+                empty += 1
+                continue
+            if empty:
+                row.append(str(empty))
+                empty = 0
+            row.append(SYMBOLS[code])
+        if empty:
+            row.append(str(empty))
+        rows.append(''.join(row))
+
+    megatiles = ''.join(SYMBOLS[code] for code in snapshot.megatiles)
+    forced = {x // n_rows * n_rows + y // n_rows
+              for x, y in snapshot.allowed_moves}
+    if len(forced) == 1:
+        forced = '{},{}'.format(*divmod(forced.pop(), n_rows))
+    else:
+        forced = ANYWHERE
+    return '{} {} {} {}'.format('/'.join(rows), megatiles,
+                                SYMBOLS[snapshot.turn + 1], forced)
+
+
+def parse_position(text):
+    """
+    Turn notation into a Snapshot. Raises ValueError if it's not valid
+    notation.
+    """
+    fields = text.split()
+    if len(fields) != 4:
+        raise ValueError('A position has 4 fields, got {}: {!r}'.format(
+            len(fields), text))
+    rows, megatiles, side, forced = fields
+
+    rows = rows.split('/')
+    n_rows = int(round(len(rows) ** 0.5))
+    size = n_rows**2
+    if n_rows < 1 or size != len(rows):
+        raise ValueError('The number of rows must be a square, got {}'.format(
+            len(rows)))
+
+    cells = bytearray()
+    for row in rows:
+        start = len(cells)
+        number = ''
+        for char in row:
+            if char.isdigit():
+                number += char
+                continue
+            if number:
+                cells.extend(bytes(int(number)))
+                number = ''
+            code = CODES.get(char)
+            if not code:
+                raise ValueError('Unknown piece {!r}'.format(char))
+            cells.append(code)
+        if number:
+            cells.extend(bytes(int(number)))
+        if len(cells) - start != size:
+            raise ValueError('Row {!r} has {} subtiles, not {}'.format(
+                row, len(cells) - start, size))
+
+    if len(megatiles) != size or any(c not in CODES for c in megatiles):
+        raise ValueError('Megatiles must be {} of {}, got {!r}'.format(
+            size, SYMBOLS, megatiles))
+    megatiles = bytes(CODES[c] for c in megatiles)
+
+    if side not in SYMBOLS[1:]:
+        raise ValueError('Side must be one of {}, got {!r}'.format(
+            SYMBOLS[1:], side))
+    turn = CODES[side] - 1
+
+    check_megatiles(n_rows, cells, megatiles)
+    winner = find_winner(n_rows, megatiles)
+    geometry = get_geometry(n_rows)
+    megatile_cells, megatile_coords = geometry[:2]
+    if forced == ANYWHERE:
+        areas = [m for m in range(size) if not megatiles[m]]
+    else:
+        try:
+            big_x, big_y = map(int, forced.split(','))
+        except ValueError:
+            raise ValueError('Forced must be x,y or {}, got {!r}'.format(
+                ANYWHERE, forced))
+        if not (0 <= big_x < n_rows and 0 <= big_y < n_rows):
+            raise ValueError('Forced megatile {} is not on the board'.format(forced))
+        area = big_x * n_rows + big_y
+        if not winner and (megatiles[area] or
+                           all(cells[cell] for cell in megatile_cells[area])):
+            raise ValueError('Forced megatile {} is not open'.format(forced))
+        areas = [area]
+
+    allowed_moves = ()
+    if not winner:
+        allowed_moves = tuple(coords for m in areas
+                              for cell, coords in zip(megatile_cells[m],
+                                                      megatile_coords[m])
+                              if not cells[cell])
+    return Snapshot(n_rows, bytes(cells), megatiles, turn, allowed_moves,
+                    not allowed_moves, winner)
+
+
+def check_megatiles(n_rows, cells, megatiles):
+    """
+    Raise ValueError if the owners of the megatiles don't follow from the
+    cells: the owner of a megatile has a line in it (and nobody else does),
+    and megatiles without an owner have no lines.
+    """
+    megatile_cells, _, _, line_coords = get_geometry(n_rows)
+    for m, owner in enumerate(megatiles):
+        lines = set()
+        for line in line_coords:
+            codes = {cells[megatile_cells[m][x * n_rows + y]] for x, y in line}
+            if len(codes) == 1 and 0 not in codes:
+                lines |= codes
+        if lines != ({owner} if owner else set()):
+            raise ValueError('Megatile {},{} is owned by {}, but has lines of '
+                             '{}'.format(m // n_rows, m % n_rows, SYMBOLS[owner],
+                                         ''.join(SYMBOLS[c] for c in sorted(lines))
+                                         or 'nobody'))
+
+
+def find_winner(n_rows, megatiles):
+    """Code of the piece with a line of megatiles, or 0."""
+    for line in get_geometry(n_rows)[3]:
+        codes = {megatiles[x * n_rows + y] for x, y in line}
+        if len(codes) == 1:
+            code = codes.pop()
+            if code:
+                return code
+    return 0
+
+
+def board_from_position(text, pieces):
+    """A (rules only) Board in the position of the notation."""
+    return Board.from_snapshot(pieces, parse_position(text))
@@ -0,0 +1,158 @@
+"""
+Run several MCTS workers on one position, on all CPU cores.
+
+This uses root parallelism: every worker process builds its own tree from the
+same position (with its own seed) within the same time budget, and the visit
+counts and values of the root moves are summed. Sharing one tree between
+processes (with virtual loss) would need the tree in shared memory and a lock
+per node, which costs more in Python than it gains.
+
+With one worker the search runs in this process, and with max_iterations (in
+stead of a time budget) it gives the same move every time for the same seed.
+"""
+import os, time, logging, multiprocessing
+
+from board import Board
+from mcts import MCTS
+from playout import get_policy
+from config import (PARALLEL_LOGGING_LEVEL, MCTS_TIME_BUDGET, MCTS_EXPLORATION,
+                    MCTS_PLAYOUT)
+
+logger = logging.getLogger(__name__)
+logger.setLevel(PARALLEL_LOGGING_LEVEL)
+
+
+# Every worker process keeps its MCTS, so the node pool is allocated only once.
+_mcts = None
+
+def search_worker(args):
+    """
+    Search a position in a worker process.
+
+    Returns ({move: (visits, value)}, iterations, seconds)
+    """
+    global _mcts
+    (pieces, snapshot, seed, exploration, playout, time_budget,
+     max_iterations) = args
+    board = Board.from_snapshot(pieces, snapshot)
+    if _mcts is None or _mcts.policy.name != playout:
+        _mcts = MCTS(playout=playout)
+    _mcts.clear()
+    _mcts.exploration = exploration
+    _mcts.random.seed(seed)
+    _mcts.iterations, _mcts.seconds = 0, 0.0
+    root = _mcts.search(board, time_budget, max_iterations)
+    return _mcts.move_stats(root), _mcts.iterations, _mcts.seconds
+
+
+class ParallelSearch(object):
+    def __init__(self, n_workers=None, seed=0, exploration=MCTS_EXPLORATION,
+                 playout=MCTS_PLAYOUT):
+        """
+        n_workers defaults to the number of CPU cores. The pool of worker
+        processes is started once and reused for every search.
+
+        playout is the name of the playout policy, see playout.POLICIES.
+        """
+        # Fail here, not in every worker.
+        get_policy(playout)
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.seed = seed
+        self.exploration = exploration
+        self.playout = playout
+        self.pool = None
+        if self.n_workers > 1:
+            self.pool = multiprocessing.Pool(self.n_workers)
+        self.n_searches = 0
+        self.last_stats = {}
+
+
+    def close(self):
+        """Stop the worker processes."""
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+    def search(self, board, time_budget=None, max_iterations=None):
+        """
+        Search the position on board with all workers.
+
+        Returns {move: (visits, value)} summed over the workers. Statistics of
+        the search are in self.last_stats.
+        """
+        if time_budget is None and max_iterations is None:
+            time_budget = MCTS_TIME_BUDGET
+        snapshot = board.snapshot()
+        # Different seeds per worker and per search, but the same ones every run.
+        base_seed = self.seed * 1000003 + self.n_searches * self.n_workers
+        self.n_searches += 1
+        jobs = [(board.pieces, snapshot, base_seed + i, self.exploration,
+                 self.playout, time_budget, max_iterations)
+                for i in range(self.n_workers)]
+
+        start = time.perf_counter()
+        if self.pool is None:
+            results = [search_worker(job) for job in jobs]
+        else:
+            results = self.pool.map(search_worker, jobs, chunksize=1)
+        seconds = time.perf_counter() - start
+
+        merged = {}
+        iterations = 0
+        for stats, worker_iterations, _ in results:
+            iterations += worker_iterations
+            for move, (visits, value) in stats.items():
+                total = merged.get(move, (0, 0.0))
+                merged[move] = (total[0] + visits, total[1] + value)
+
+        self.last_stats = {
+            'workers': self.n_workers,
+            'iterations': iterations,
+            'seconds': seconds,
+            'iterations_per_second': iterations / seconds if seconds else 0.0,
+        }
+        logger.info('Parallel search: {}'.format(self.last_stats))
+        return merged
+
+
+    def best_move(self, board, time_budget=None, max_iterations=None):
+        """The most visited move over all workers."""
+        return MCTS.best_move(self.search(board, time_budget, max_iterations))
+
+
+def measure_scaling(board, n_workers=None, time_budget=MCTS_TIME_BUDGET,
+                    playout=MCTS_PLAYOUT):
+    """
+    Compare the parallel search to the single core engine on the same
+    position, time budget and playout policy.
+
+    Returns a dict with the iterations per second of both and the scaling
+    efficiency: parallel speed / (workers * single core speed).
+    """
+    single = MCTS(seed=0, playout=playout)
+    single.search(board, time_budget)
+    single_speed = single.iterations / single.seconds
+
+    with ParallelSearch(n_workers, playout=playout) as parallel:
+        # Warm up the pool, so starting processes is not measured.
+        parallel.search(board, max_iterations=1)
+        parallel.search(board, time_budget)
+        stats = parallel.last_stats
+
+    return {
+        'workers': stats['workers'],
+        'single_iterations_per_second': single_speed,
+        'parallel_iterations_per_second': stats['iterations_per_second'],
+        'speedup': stats['iterations_per_second'] / single_speed,
+        'efficiency': stats['iterations_per_second'] /
+                      (stats['workers'] * single_speed),
+    }
@@ -0,0 +1,242 @@
+"""
+Count the positions reachable in a number of moves (perft, as in chess), to
+check the rules engine and to measure how fast it generates moves.
+
+For every depth the leaves are counted, and of the moves leading to them:
+    captures: moves that won a megatile (including game winning moves)
+    wins:     moves that won the game
+    draws:    moves after which there are no allowed moves left
+Games that end before the depth is reached have no leaves there.
+
+Positions that are reached in several ways are counted once per depth and
+looked up in a cache afterwards. The moves from the starting position can be
+split over several processes.
+
+Usage:
+    python perft.py [--depth D] [--n-rows N] [--moves x,y ...] [--workers N]
+                    [--no-cache] [--divide]
+"""
+import os, sys, time, logging, argparse, multiprocessing
+
+from board import Board
+from engine import parse_move, format_move
+from pieces import Cross, Nought
+from constants import CROSS_COLOR, NOUGHT_COLOR, N_ROWS
+from config import PERFT_LOGGING_LEVEL, PERFT_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+logger.setLevel(PERFT_LOGGING_LEVEL)
+
+# Indices in the counts tuples.
+LEAVES, CAPTURES, WINS, DRAWS = range(4)
+ZERO = (0, 0, 0, 0)
+
+
+def add_counts(a, b):
+    return (a[0] + b[0], a[1] + b[1], a[2] + b[2], a[3] + b[3])
+
+
+def position_key(board):
+    """Bytes that tell positions apart (including where the next move goes)."""
+    return bytes(board.cell_codes) + bytes(board.megatile_codes) + \
+        bytes((board.target + 2, board.turn))
+
+
+class Perft(object):
+    def __init__(self, use_cache=True, cache_size=PERFT_CACHE_SIZE):
+        """
+        The cache of {(position_key, depth): counts} is kept between calls, it
+        is emptied when it has cache_size entries.
+        """
+        self.cache = {} if use_cache else None
+        self.cache_size = cache_size
+        # Moves made, cache hits, seconds
+        self.moves = 0
+        self.hits = 0
+        self.seconds = 0.0
+
+
+    def count(self, board, depth):
+        """
+        Count the leaves depth moves from the position on board.
+
+        Returns (leaves, captures, wins, draws)
+        """
+        start = time.perf_counter()
+        try:
+            return self._count(board, depth)
+        finally:
+            self.seconds += time.perf_counter() - start
+
+
+    def divide(self, board, depth):
+        """Count for every allowed move, returns {move: counts}."""
+        start = time.perf_counter()
+        try:
+            return {move: self._count_move(board, move, depth)
+                    for move in board.allowed_moves}
+        finally:
+            self.seconds += time.perf_counter() - start
+
+
+    def _count(self, board, depth):
+        if depth == 0:
+            return (1, 0, 0, 0)
+        if board.game_over:
+            return ZERO
+
+        cache = self.cache
+        if cache is not None and depth > 1:
+            key = (position_key(board), depth)
+            counts = cache.get(key)
+            if counts is not None:
+                self.hits += 1
+                return counts
+
+        counts = ZERO
+        for move in board.allowed_moves:
+            counts = add_counts(counts, self._count_move(board, move, depth))
+
+        if cache is not None and depth > 1:
+            if len(cache) >= self.cache_size:
+                logger.info('Perft cache full, emptying it')
+                cache.clear()
+            cache[key] = counts
+        return counts
+
+
+    def _count_move(self, board, move, depth):
+        """Count the leaves depth - 1 moves after move."""
+        child = board.clone()
+        child.make_a_move(move)
+        self.moves += 1
+        if depth > 1:
+            return self._count(child, depth - 1)
+        captured = child.megatile_codes != board.megatile_codes
+        if not child.game_over:
+            return (1, captured, 0, 0)
+        if child.winner is not None:
+            return (1, captured, 1, 0)
+        return (1, captured, 0, 1)
+
+
+    def stats(self):
+        return {
+            'moves': self.moves,
+            'cache_hits': self.hits,
+            'cache_entries': 0 if self.cache is None else len(self.cache),
+            'seconds': self.seconds,
+            'moves_per_second': self.moves / self.seconds if self.seconds else 0.0,
+        }
+
+
+# Every worker process keeps its Perft, so the cache is shared between the
+# moves it counts.
+_perft = None
+
+def divide_worker(args):
+    """Count the leaves after one move in a worker process."""
+    global _perft
+    pieces, snapshot, move, depth, use_cache = args
+    if _perft is None:
+        _perft = Perft(use_cache)
+    board = Board.from_snapshot(pieces, snapshot)
+    moves_before = _perft.moves
+    counts = _perft._count_move(board, move, depth)
+    return move, counts, _perft.moves - moves_before
+
+
+def parallel_divide(board, depth, n_workers=None, use_cache=True, pool=None):
+    """
+    Like Perft.divide, with the allowed moves split over n_workers processes
+    (defaults to the number of CPU cores). Pass a multiprocessing.Pool to
+    use its processes (and the caches they have) in stead of new ones.
+
+    Returns ({move: counts}, moves made)
+    """
+    snapshot = board.snapshot()
+    jobs = [(board.pieces, snapshot, move, depth, use_cache)
+            for move in board.allowed_moves]
+    if pool is None:
+        with multiprocessing.Pool(n_workers or os.cpu_count() or 1) as pool:
+            results = pool.map(divide_worker, jobs, chunksize=1)
+    else:
+        results = pool.map(divide_worker, jobs, chunksize=1)
+    return ({move: counts for move, counts, _ in results},
+            sum(moves for _, _, moves in results))
+
+
+def get_pieces():
+    return Cross(CROSS_COLOR), Nought(NOUGHT_COLOR)
+
+
+def run(board, depth, n_workers=1, use_cache=True):
+    """
+    Count every depth from 1 to depth.
+
+    Returns a list of (depth, counts, {move: counts}, moves made, seconds)
+    """
+    perft = Perft(use_cache)
+    results = []
+    # One pool for all depths, so the workers keep their caches (and are
+    # started only once).
+    pool = None
+    if n_workers > 1 and depth > 1:
+        pool = multiprocessing.Pool(n_workers)
+    try:
+        for d in range(1, depth + 1):
+            start = time.perf_counter()
+            if pool is not None and d > 1:
+                divided, moves = parallel_divide(board, d, use_cache=use_cache,
+                                                 pool=pool)
+            else:
+                moves_before = perft.moves
+                divided = perft.divide(board, d)
+                moves = perft.moves - moves_before
+            seconds = time.perf_counter() - start
+            counts = ZERO
+            for move_counts in divided.values():
+                counts = add_counts(counts, move_counts)
+            results.append((d, counts, divided, moves, seconds))
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--n-rows', type=int, default=N_ROWS)
+    parser.add_argument('--moves', nargs='*', default=[],
+                        help='moves (x,y) to play before counting')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='processes, 0 for one per CPU core')
+    parser.add_argument('--no-cache', dest='cache', action='store_false')
+    parser.add_argument('--divide', action='store_true',
+                        help='show the counts per move at the last depth')
+    args = parser.parse_args(argv)
+    logging.basicConfig()
+
+    board = Board(get_pieces(), args.n_rows)
+    for text in args.moves:
+        if not board.make_a_move(parse_move(text)):
+            parser.error('illegal move: {}'.format(text))
+    n_workers = args.workers or os.cpu_count() or 1
+
+    results = run(board, args.depth, n_workers, args.cache)
+    print('depth        leaves    captures        wins       draws'
+          '     seconds    leaves/s     moves/s')
+    for depth, counts, divided, moves, seconds in results:
+        print('{:>5} {:>13} {:>11} {:>11} {:>11} {:>11.3f} {:>11.0f} {:>11.0f}'.format(
+            depth, *counts, seconds, counts[LEAVES] / seconds if seconds else 0,
+            moves / seconds if seconds else 0))
+    if args.divide:
+        depth, counts, divided, moves, seconds = results[-1]
+        for move in sorted(divided):
+            print('{:>7} {:>13}'.format(format_move(move), divided[move][LEAVES]))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
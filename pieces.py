@@ -1,10 +1,13 @@
-import pygame, math, logging
+import math, logging, importlib
 from config import PIECES_LOGGING_LEVEL
 
 logger = logging.getLogger(__name__)
 logger.setLevel(PIECES_LOGGING_LEVEL)
 
 class AIMixin(object):
+    # Set to True to get a board.Snapshot of the board with every call to move.
+    wants_snapshot = False
+
     def save_board_info(self, n_rows, pieces):
         """
         Save the info of the board to the AI object, so it can be used for
@@ -22,14 +25,56 @@ class AIMixin(object):
         (0, 0) is top left,
         (board.n_rows ** 2, board.n_rows ** 2) is bottom right.
 
-        mutations is a list of (piece, (x, y)) tuples of the moves made
+        mutations is a sequence of ((x, y), piece) tuples of the moves made
         after your last move.
 
         allowed_moves is a list of coordinates showing you the squares you are
         allowed to play.
+
+        If wants_snapshot is set, a board.Snapshot of the board is passed as
+        the keyword argument snapshot. Use board.Board.from_snapshot to get a
+        board to try out moves on.
         """
         return NotImplemented
 
+    def stop(self):
+        """
+        Return from a running call to move as soon as possible (with a move).
+        Called from another thread, AIs that think for a while should
+        implement it. The stop holds (also for a move that has not started
+        yet) until clear_stop is called.
+        """
+        pass
+
+    def clear_stop(self):
+        """Forget an earlier stop, called before a move that may be stopped."""
+        pass
+
+    def get_stats(self):
+        """
+        Statistics of the last move, as a {name: number} dict, e.g.
+        {'nodes/s': 1000.0}. They are shown in the performance HUD.
+        """
+        return {}
+
+    def save_state(self, writer):
+        """
+        Add what the AI learned (search trees, caches) to a checkpoint, with
+        writer.set(name, value) for small values that can be written as
+        JSON and writer.add_array(name, array) for array.arrays. Called
+        between moves. See checkpoint.
+        """
+        pass
+
+    def load_state(self, reader):
+        """
+        Restore what save_state saved, with reader.get(name) and
+        reader.array(name) or reader.read_into(name, array). Called after
+        save_board_info. The reader is closed after it returns, keep no
+        views of it.
+        """
+        pass
+
 
 class Piece(object):
     def __init__(self, name, abbr, color, thickness=2):
@@ -67,6 +112,7 @@ class Nought(Piece):
 
     def draw(self, surface):
         """Draws the representation of a Nought."""
+        import pygame
         logger.debug('Nought.draw')
         logger.debug('{}, {}, {}'.format('Surface', surface, type(surface)))
         logger.debug('{}, {}, {}'.format('Thickness', self.thickness, type(self.thickness)))
@@ -94,6 +140,7 @@ class Cross(Piece):
 
     def draw(self, surface):
         """Draws the representation of a Cross."""
+        import pygame
         logger.debug('Cross.draw')
         logger.debug('{}, {}, {}'.format('Surface', surface, type(surface)))
         logger.debug('{}, {}, {}'.format('Thickness', self.thickness, type(self.thickness)))
@@ -202,3 +249,25 @@ class CountingAI(AIMixin):
 
     """
     ...
+
+
+def load_ai_class(path):
+    """Import an AI class from a dotted path, e.g. 'mcts.MCTSAI'."""
+    module_name, _, class_name = path.rpartition('.')
+    if not module_name:
+        raise ValueError('Expected module.Class, got {!r}'.format(path))
+    ai_class = getattr(importlib.import_module(module_name), class_name)
+    if not issubclass(ai_class, AIMixin):
+        raise TypeError('{} is not an AI (subclass of AIMixin)'.format(path))
+    return ai_class
+
+
+def make_ai_piece(ai_class, piece_class, color):
+    """
+    Combine an AI (without a Piece) with a piece, e.g.
+    make_ai_piece(RandomAI, Cross, CROSS_COLOR) is like CrossAI(CROSS_COLOR).
+    """
+    if issubclass(ai_class, Piece):
+        raise TypeError('{} is already a piece'.format(ai_class.__name__))
+    cls = type(piece_class.__name__ + ai_class.__name__, (piece_class, ai_class), {})
+    return cls(color)
@@ -0,0 +1,132 @@
+"""
+Playout policies for the tree search: they play a game on a board until it
+is over.
+
+    random:   uniformly random moves, like pieces.RandomAI.
+    tactical: wins a megatile when it can, else blocks a megatile the
+              opponent could win and doesn't send the opponent to a megatile
+              they can win right away. Among the moves that are equally good
+              it picks one at random.
+
+The tactical policy reads the threats of every megatile from the tables of
+megatile_table (indexed by board.megatile_states), so it never tries out a
+move to see what it does, and it doesn't need the list of allowed moves.
+Boards without tables (n_rows != 3) get random playouts.
+"""
+import functools
+
+import megatile_table
+from board import ANYWHERE, get_geometry
+from megatile_table import N_CELLS, N_STATES, POWERS
+
+# The numbers of the bits that are set, for every 9 bit mask.
+BITS = tuple(tuple(i for i in range(N_CELLS) if mask >> i & 1)
+             for mask in range(1 << N_CELLS))
+
+
+@functools.lru_cache(maxsize=None)
+def get_empty_masks():
+    """Bitmask of the empty subtiles of every megatile state."""
+    masks = [0] * N_STATES
+    for state in range(N_STATES):
+        mask = 0
+        for cell in range(N_CELLS):
+            if not state // POWERS[cell] % 3:
+                mask |= 1 << cell
+        masks[state] = mask
+    return tuple(masks)
+
+
+class RandomPlayout(object):
+    name = 'random'
+
+    def play(self, board, rng):
+        """Play random moves until the game is over."""
+        choice = rng.choice
+        while not board.game_over:
+            board.make_a_move(choice(board.allowed_moves))
+
+
+class TacticalPlayout(RandomPlayout):
+    name = 'tactical'
+
+    def __init__(self):
+        self.table = megatile_table.get_table()
+        self.empty = get_empty_masks()
+        self.coords = get_geometry(megatile_table.N_ROWS)[1]
+
+
+    def play(self, board, rng):
+        """Play the best moves (see the module) until the game is over."""
+        if board.megatile_states is None:
+            return super(TacticalPlayout, self).play(board, rng)
+        threat_cells = self.table.threat_cells
+        empty, coords = self.empty, self.coords
+        states, megatile_codes = board.megatile_states, board.megatile_codes
+        megatiles = range(N_CELLS)
+        choice = rng.choice
+
+        while not board.game_over:
+            mine = threat_cells[board.turn]
+            target = board.target
+            if target != ANYWHERE:
+                # Most of the time there is only one megatile to play in.
+                wins = mine[states[target]]
+                if wins:
+                    board.make_a_move(coords[target][choice(BITS[wins])])
+                    continue
+                areas = (target,)
+            else:
+                areas = [m for m in megatiles
+                         if not megatile_codes[m] and empty[states[m]]]
+                wins = [coords[m][cell] for m in areas
+                        for cell in BITS[mine[states[m]]]]
+                if wins:
+                    board.make_a_move(choice(wins))
+                    continue
+
+            # Megatiles the opponent can win right away, and the ones that
+            # let them play anywhere (which is just as bad if they can win
+            # one somewhere).
+            theirs = threat_cells[1 - board.turn]
+            danger = closed = 0
+            for m in megatiles:
+                if megatile_codes[m] or not empty[states[m]]:
+                    closed |= 1 << m
+                elif theirs[states[m]]:
+                    danger |= 1 << m
+            if danger:
+                danger |= closed
+
+            # From best to worst: blocks, safe moves, any move.
+            best, best_rank = [], 3
+            for m in areas:
+                state = states[m]
+                for rank, mask in enumerate((theirs[state] & ~danger,
+                                             empty[state] & ~danger,
+                                             empty[state])):
+                    if mask:
+                        break
+                if rank < best_rank:
+                    best, best_rank = [(m, mask)], rank
+                elif rank == best_rank:
+                    best.append((m, mask))
+
+            if len(best) == 1:
+                m, mask = best[0]
+                board.make_a_move(coords[m][choice(BITS[mask])])
+            else:
+                board.make_a_move(choice([coords[m][cell] for m, mask in best
+                                          for cell in BITS[mask]]))
+
+
+POLICIES = {policy.name: policy for policy in (RandomPlayout, TacticalPlayout)}
+
+
+def get_policy(name):
+    """Create the playout policy called name."""
+    try:
+        return POLICIES[name]()
+    except KeyError:
+        raise ValueError('Unknown playout policy {!r}, choose from {}'.format(
+            name, ', '.join(sorted(POLICIES))))
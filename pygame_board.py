@@ -0,0 +1,363 @@
+import math, logging
+import pygame
+
+from inherit_docstring import InheritableDocstrings
+
+from board import AIBoard
+from config import BOARD_LOGGING_LEVEL
+
+logger = logging.getLogger(__name__)
+logger.setLevel(BOARD_LOGGING_LEVEL)
+
+class PygameBoard(AIBoard, metaclass=InheritableDocstrings):
+    def __init__(self, pieces, tile_size, line_thickness, margin, style, n_rows):
+        super(PygameBoard, self).__init__(pieces, n_rows)
+
+        # Calculate board size
+        if not tile_size % 2:
+            logger.warn('The style of the board is best with an odd tile_size.')
+
+        self.tile_size = tile_size
+        self.line_thickness = line_thickness
+        self.tile_line_size = tile_size + 2 * line_thickness
+        self.margin = margin
+
+        for name in ['tile_size', 'line_thickness', 'margin']:
+            attr = getattr(self, name)
+            if not isinstance(attr, int):
+                raise TypeError('{} must be an int, got {}.'.format(name, type(attr)))
+
+        self.inner_size = n_rows**2 * self.tile_line_size
+        self.outer_size = self.inner_size + margin * 2
+
+        self.style = style
+
+
+    def pygame_init(self):
+        """Initialize everything to do with pygame."""
+        self.outer_surface = pygame.Surface([self.outer_size]*2)
+        self.outer_surface.fill(self.style['background-color'])
+
+        # Draw the row and column numbers.
+        font = pygame.font.Font(pygame.font.match_font(self.style['font-name']), self.style['font-size'])
+        for i in range(self.n_rows**2):
+            f = font.render(str(i), False, self.style['text-color'])
+            rect = f.get_rect()
+            rect.topleft = (
+                self.tile_line_size*(i+1)-rect.width/2-self.tile_line_size/2+self.margin,
+                self.margin/2-rect.height/2
+            )
+            self.outer_surface.blit(f, rect)
+            rect.topleft = (
+                self.margin/2-rect.width/2,
+                self.tile_line_size*(i+1)-rect.height/2-self.tile_line_size/2+self.margin
+            )
+            self.outer_surface.blit(f, rect)
+
+        self.surface = pygame.Surface([self.inner_size]*2)
+        # The tiles, with their borders and pieces, see draw_board.
+        self.grid_surf = pygame.Surface([self.inner_size]*2)
+        self.redraw_all = True
+        # The grid without any pieces, and a drawn tile for every piece.
+        self.empty_grid_surf = None
+        self.sprites = {}
+        self.highlight_surf = pygame.Surface([self.inner_size]*2, pygame.SRCALPHA)
+        self.heatmap_surf = pygame.Surface([self.inner_size]*2, pygame.SRCALPHA)
+        self.draw_board()
+
+    @copy_ancestor_docstring
+    def reset(self):
+        super(PygameBoard, self).reset()
+        self.highlights = []
+        # Tiles that changed since the last draw_board.
+        self.dirty_tiles = set()
+        self.redraw_all = True
+        if getattr(self, 'heatmap_surf', None) is not None:
+            self.clear_heatmap()
+        self.heatmap = {}
+
+
+    def draw_board(self):
+        """
+        Draw the board to the surface, with everything on it.
+
+        Only the tiles that changed since the last call are drawn again, so
+        big boards stay fast.
+        """
+        if self.redraw_all:
+            # Start from the empty grid, only the pieces need drawing.
+            self.grid_surf.blit(self.get_empty_grid(), (0, 0))
+            size = self.n_rows**2
+            tiles = [divmod(cell, size) for cell, code in enumerate(self.cell_codes)
+                     if code]
+        else:
+            tiles = self.dirty_tiles
+        for coords in tiles:
+            self.draw_tile(coords)
+        if tiles:
+            self.draw_big_lines(self.grid_surf)
+        self.dirty_tiles = set()
+        self.redraw_all = False
+
+        self.surface.blit(self.grid_surf, (0, 0))
+
+        for line in self.winning_lines:
+            pygame.draw.line(
+                self.highlight_surf,
+                self.style['winning-line-color'],
+                line[0],
+                line[1],
+                self.style['winning-line-thickness']
+            )
+            for end in line:
+                pygame.draw.circle(self.highlight_surf,
+                    self.style['winning-line-color'],
+                    end,
+                    self.style['winning-line-thickness'] // 2,
+                    0
+                )
+
+        self.surface.blit(self.highlight_surf, (0, 0))
+        if self.heatmap:
+            self.surface.blit(self.heatmap_surf, (0, 0))
+        self.outer_surface.blit(self.surface, [self.margin]*2)
+
+
+    def get_empty_grid(self):
+        """The surface of the board without pieces, drawn once."""
+        if self.empty_grid_surf is None:
+            surface = pygame.Surface([self.inner_size]*2)
+            surface.fill(self.style['background-color'])
+            for x in range(self.n_rows**2):
+                for y in range(self.n_rows**2):
+                    self.draw_tile((x, y), surface, None)
+            self.draw_big_lines(surface)
+            self.empty_grid_surf = surface
+        return self.empty_grid_surf
+
+
+    def draw_big_lines(self, surface):
+        """Draw the four "big" lines on the board, over the tiles."""
+        for n in range(1, self.n_rows):
+            start = self.n_rows*self.tile_line_size*n - self.line_thickness
+            lines = [
+                ((start, 0), (start, self.inner_size)),
+                ((0, start), (self.inner_size, start))
+            ]
+
+            for line in lines:
+                pygame.draw.line(surface, self.style['big-border-color'],
+                                 line[0], line[1], self.line_thickness * 2)
+
+
+    def get_sprite(self, piece):
+        """A tile with piece drawn on it, drawn once per piece."""
+        sprite = self.sprites.get(piece)
+        if sprite is None:
+            sprite = pygame.Surface([self.tile_size]*2)
+            sprite.fill(self.style['background-color'])
+            piece.draw(sprite)
+            self.sprites[piece] = sprite
+        return sprite
+
+
+    def draw_tile(self, coords, surface=None, tile=False):
+        """
+        Draw a tile to the grid surface (or surface): its borders and its
+        piece (the one on the board, unless tile is given).
+        """
+        if surface is None:
+            surface = self.grid_surf
+        # First draw the tile itself, which is just some borders.
+        pos = self.coords_to_pos(coords)
+        rect = pygame.Rect(pos, [self.tile_line_size]*2)
+        surface.fill(self.style['background-color'], rect)
+        pygame.draw.rect(
+            surface,
+            self.style['small-border-color'],
+            rect,
+            self.line_thickness
+        )
+
+        # Then draw a piece in it, if necessary.
+        if tile is False:
+            tile = self.get_tile(coords)
+        pos = (pos[0] + self.line_thickness, pos[1] + self.line_thickness)
+        if tile is not None:
+            surface.blit(self.get_sprite(tile), pos)
+
+
+    def coords_to_pos(self, coords):
+        """
+        Take coordinates (from 0 to n_rows ** 2 - 1) and turn them into pixel positions.
+        """
+        logger.debug('PygameBoard.coords_to_pos')
+        logger.debug('{}, {}, {}, {}'.format('Coords', coords, type(coords), [type(x) for x in coords]))
+        x, y = coords
+        return (x)*self.tile_line_size, (y)*self.tile_line_size
+
+
+    def pos_to_coords(self, pos):
+        """Take pixel positions and turn them into coordinates (from 0 to n_rows ** 2 - 1)."""
+        x, y = pos
+        coords = (int(math.floor(x/self.tile_line_size)), int(math.floor(y/self.tile_line_size)))
+        logger.debug('PygameBoard.pos_to_coords')
+        logger.debug('{}, {}, {}, {}'.format('Coords', coords, type(coords), [type(x) for x in coords]))
+        return coords
+
+
+    def find_winner(self, last_piece, last_move):
+        """
+        Check if someone won a megatile and maybe even the whole game!
+        Also updates self.megatiles and self.highlights accordingly.
+        """
+        lines = super(PygameBoard, self).find_winner(last_piece, last_move)
+        if lines:
+            area_coords = lines[0][0]
+            winning_line = lines[0][1]
+            # Didn't feel like writing a loop for this... am I lazy yet?
+            realify = lambda coords: [c + (self.n_rows * area_coords[i]) for i, c in enumerate(coords)]
+            real_line = tuple(map(realify, winning_line))
+
+            self.draw_line(real_line)
+
+            # Highlight megatile
+            for x in range(self.n_rows):
+                for y in range(self.n_rows):
+                    coords = realify([x, y])
+                    self.add_highlight(coords, last_piece.color + (self.style['winning-highlight-alpha'],))
+
+            if len(lines) > 1:
+                realify = lambda coords: [int((c + 0.5) * self.n_rows) for c in coords]
+                big_line = tuple(map(realify, lines[1]))
+                self.draw_line(big_line)
+        return lines
+
+
+    @copy_ancestor_docstring
+    def set_tile(self, coords, value, forced=False):
+        changed = super(PygameBoard, self).set_tile(coords, value, forced)
+        if changed:
+            self.dirty_tiles.add(tuple(coords))
+        return changed
+
+
+    @copy_ancestor_docstring
+    def make_a_move(self, coords, forced=False):
+        legal = super(PygameBoard, self).make_a_move(coords, forced)
+        if legal:
+            self.del_highlights(color=self.style['last-move-color'])
+            self.add_highlight(coords, self.style['last-move-color'])
+            self.draw_highlights()
+        return legal
+
+
+    @copy_ancestor_docstring
+    def clear_allowed_moves(self):
+        super(PygameBoard, self).clear_allowed_moves()
+        if getattr(self, 'highlights', False):
+            self.del_highlights(color=self.style['allowed-moves-color'])
+
+
+    @copy_ancestor_docstring
+    def update_allowed_moves(self, last_move):
+        super(PygameBoard, self).update_allowed_moves(last_move)
+        for move in self.allowed_moves:
+            self.add_highlight(move, self.style['allowed-moves-color'])
+
+
+    def draw_line(self, line):
+        """Draw a line from line[0] to line[-1]."""
+        # Add points for line drawing from/to middle of subtiles.
+        start = self.coords_to_pos(line[0])
+        end = self.coords_to_pos(line[-1])
+
+        half_tile = int(self.tile_size/2)
+        start = start[0] + half_tile, start[1] + half_tile
+        end = end[0] + half_tile, end[1] + half_tile
+
+        line = [start, end]
+        self.winning_lines.append(line)
+
+
+    def draw_highlights(self):
+        """Draw the highlights to the surface."""
+        # We're gonna need to recreate the surface, otherwise old highlights
+        # could "stain" it.
+        self.highlight_surf = pygame.Surface([self.inner_size]*2, pygame.SRCALPHA)
+        for coords, color in self.highlights:
+            # Draw the highlight to the highlight surface.
+            x, y = map(lambda i: i + self.line_thickness, self.coords_to_pos(coords))
+            rect = pygame.Rect((x, y), (self.tile_size,)*2)
+            pygame.draw.rect(self.highlight_surf, color, rect, 0)
+
+    def set_heatmap(self, scores):
+        """
+        Show scores (from 0 for bad to 1 for good) of tiles as a heatmap,
+        tiles without a score get none.
+
+        Scores are rounded to style['heatmap-levels'] levels and only the tiles
+        whose level changed are redrawn. Returns the coordinates of those tiles.
+        """
+        top = self.style['heatmap-levels'] - 1
+        alpha = self.style['heatmap-alpha']
+        levels = {coords: int(round(score * top)) for coords, score in scores.items()}
+        changed = [coords for coords in self.heatmap if coords not in levels]
+        changed.extend(coords for coords, level in levels.items()
+                       if self.heatmap.get(coords) != level)
+
+        for coords in changed:
+            level = levels.get(coords)
+            if level is None:
+                color = (0, 0, 0, 0)
+            else:
+                # From red (bad) to green (good)
+                color = (255 * (top - level) // top, 255 * level // top, 0, alpha)
+            x, y = map(lambda i: i + self.line_thickness, self.coords_to_pos(coords))
+            self.heatmap_surf.fill(color, pygame.Rect((x, y), (self.tile_size,)*2))
+        self.heatmap = levels
+        return changed
+
+
+    def clear_heatmap(self):
+        """Remove the heatmap."""
+        return self.set_heatmap({})
+
+
+    def add_highlight(self, coords, color=None):
+        """Highlight the tile at specified coordinates with a chosen color."""
+        # Default to the style value.
+        color = color or self.style['highlight-color']
+        self.highlights.append((coords, color))
+
+
+    def del_highlights(self, coords=None, color=None):
+        """Delete all highlights that match the coords and/or color."""
+        new_hls = self.highlights.copy()
+        n_deleted = 0
+        for i, h in enumerate(self.highlights):
+            h_coords, h_color = h
+
+            # If coords are set, check those - same with color.
+            if (coords is None or coords == h_coords) and \
+               (color is None or tuple(color) == tuple(h_color)):
+                del new_hls[i - n_deleted]
+                n_deleted = n_deleted + 1
+
+        self.highlights = new_hls
+
+
+    def get_size(self):
+        return self.outer_size
+
+
+    def pos_in_board(self, pos):
+        x = pos[0] - self.margin
+        y = pos[1] - self.margin
+        if 0 < x < self.inner_size and 0 < y < self.inner_size:
+            return x, y
+        return False
+
+
+    def get_turn_text(self):
+        return str(self.get_turn())
@@ -0,0 +1,146 @@
+"""
+Render games to PNG images without a display, e.g. for thumbnails.
+
+Input: one game per line, its moves as x,y separated by spaces, optionally
+followed by ; and a name (used for the file names). Empty lines and lines
+starting with # are skipped.
+
+    4,4 4,3 3,1 ; short game
+
+Every worker process sets up one PygameBoard (with BOARD_STYLE), whose empty
+grid and piece sprites are drawn once and reused for every image. Between
+plies only the changed tiles are drawn.
+
+Usage:
+    python render.py GAMES OUTDIR [--every-ply] [--workers N] [--n-rows N]
+                     [--coordinates]
+"""
+import os, sys, time, logging, argparse, multiprocessing
+
+# Render offscreen, pygame must not open a window.
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+import pygame
+
+from pygame_board import PygameBoard
+from engine import parse_move
+from pieces import Cross, Nought
+from constants import (CROSS_COLOR, NOUGHT_COLOR, N_ROWS, TILE_SIZE,
+                       LINE_THICKNESS, MARGIN, BOARD_STYLE)
+from config import BOARD_LOGGING_LEVEL
+
+logger = logging.getLogger(__name__)
+logger.setLevel(BOARD_LOGGING_LEVEL)
+
+
+def read_games(f):
+    """Yield (name, moves) for the games in file f."""
+    for number, line in enumerate(f, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        moves, _, name = line.partition(';')
+        name = name.strip() or 'game-{}'.format(number)
+        yield name, [parse_move(move) for move in moves.split()]
+
+
+class RenderBoard(PygameBoard):
+    """A PygameBoard that only draws its highlights for an image."""
+    def __init__(self, *args, coordinates=False, **kwargs):
+        self.coordinates = coordinates
+        self.highlights_changed = True
+        super(RenderBoard, self).__init__(*args, **kwargs)
+
+    def draw_highlights(self):
+        self.highlights_changed = True
+
+    def save(self, path):
+        """Draw the board and save it as an image (PNG for .png paths)."""
+        if self.highlights_changed:
+            super(RenderBoard, self).draw_highlights()
+            self.highlights_changed = False
+        self.draw_board()
+        pygame.image.save(self.outer_surface if self.coordinates else self.surface,
+                          path)
+
+
+# The board of every worker process.
+_board = None
+
+def init_worker(n_rows, coordinates):
+    global _board
+    pygame.init()
+    _board = RenderBoard((Cross(CROSS_COLOR), Nought(NOUGHT_COLOR)),
+                         TILE_SIZE, LINE_THICKNESS, MARGIN, BOARD_STYLE, n_rows,
+                         coordinates=coordinates)
+    _board.pygame_init()
+
+
+def render_game(job):
+    """
+    Render a game in a worker process: the final position, or every ply.
+
+    Returns (name, number of images, error or None)
+    """
+    name, moves, out_dir, every_ply = job
+    board = _board
+    board.reset()
+    n_images = 0
+    for ply, move in enumerate(moves, 1):
+        if board.game_over or not board.make_a_move(move):
+            return name, n_images, 'illegal move {},{} at ply {}'.format(
+                move[0], move[1], ply)
+        if every_ply:
+            board.save(os.path.join(out_dir, '{}-{:03d}.png'.format(name, ply)))
+            n_images += 1
+    if board.game_over:
+        # Like game.py does, don't show allowed moves after the game.
+        board.del_highlights(color=board.style['allowed-moves-color'])
+        board.draw_highlights()
+    board.save(os.path.join(out_dir, '{}.png'.format(name)))
+    return name, n_images + 1, None
+
+
+def render(games, out_dir, every_ply=False, n_workers=None, n_rows=N_ROWS,
+           coordinates=False):
+    """Render the (name, moves) games to out_dir, returns the number of images."""
+    os.makedirs(out_dir, exist_ok=True)
+    n_workers = n_workers or os.cpu_count() or 1
+    jobs = ((name, moves, out_dir, every_ply) for name, moves in games)
+    count = 0
+    with multiprocessing.Pool(n_workers, init_worker,
+                              (n_rows, coordinates)) as pool:
+        for name, n_images, error in pool.imap_unordered(render_game, jobs,
+                                                         chunksize=8):
+            count += n_images
+            if error is not None:
+                logger.warning('{}: {}'.format(name, error))
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('games', help='file with games, - for stdin')
+    parser.add_argument('out_dir')
+    parser.add_argument('--every-ply', action='store_true',
+                        help='an image after every move, not only at the end')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--n-rows', type=int, default=N_ROWS)
+    parser.add_argument('--coordinates', action='store_true',
+                        help='include the row and column numbers')
+    args = parser.parse_args(argv)
+    logging.basicConfig()
+
+    source = sys.stdin if args.games == '-' else open(args.games)
+    start = time.perf_counter()
+    try:
+        count = render(read_games(source), args.out_dir, args.every_ply,
+                       args.workers, args.n_rows, args.coordinates)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    seconds = time.perf_counter() - start
+    print('{} images in {:.1f}s'.format(count, seconds), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,189 @@
+"""
+Fixed size replay buffer of (position, move, outcome) samples for training
+learning AIs on self-play games.
+
+The buffer lives in memory-mapped files in a directory, so several self-play
+processes can append to it at the same time, it survives restarts and it never
+grows beyond its capacity: when it is full, the oldest samples are replaced.
+
+    position: board.Snapshot.pack() of the position, a fixed number of bytes
+    move:     cell index (x * n_rows ** 2 + y) of the move that was played
+    outcome:  1 if the player to move won the game, -1 if they lost, 0 for
+              a draw
+
+Appending takes a lock on the buffer (fcntl.flock, so Unix only) just long
+enough to reserve slots. Every slot has a sequence number that is 0 while it
+is being written, sampling skips those and the ones that changed while they
+were read.
+"""
+import os, fcntl, logging
+import numpy as np
+
+from board import Snapshot
+from config import REPLAY_LOGGING_LEVEL
+
+logger = logging.getLogger(__name__)
+logger.setLevel(REPLAY_LOGGING_LEVEL)
+
+# Header fields
+CAPACITY, WIDTH, N_ROWS, TOTAL = range(4)
+HEADER_SIZE = 4
+
+
+class ReplayBuffer(object):
+    def __init__(self, path, capacity=None, n_rows=3):
+        """
+        Open the buffer in directory path, creating it with capacity samples
+        if it doesn't exist yet. An existing buffer keeps its own capacity.
+        """
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.lock_file = open(os.path.join(path, 'lock'), 'a+b')
+
+        with self.locked():
+            header_path = os.path.join(path, 'header')
+            create = not os.path.exists(header_path)
+            if create:
+                if capacity is None:
+                    raise ValueError('No buffer in {}, capacity is needed to '
+                                     'create one'.format(path))
+                header = np.memmap(header_path, dtype=np.int64, mode='w+',
+                                   shape=(HEADER_SIZE,))
+                header[CAPACITY] = capacity
+                header[WIDTH] = Snapshot.packed_size(n_rows)
+                header[N_ROWS] = n_rows
+                header[TOTAL] = 0
+                header.flush()
+            else:
+                header = np.memmap(header_path, dtype=np.int64, mode='r+',
+                                   shape=(HEADER_SIZE,))
+            self.header = header
+            self.capacity = int(header[CAPACITY])
+            self.width = int(header[WIDTH])
+            self.n_rows = int(header[N_ROWS])
+
+            mode = 'w+' if create else 'r+'
+            self.positions = self._open('positions', np.uint8,
+                                        (self.capacity, self.width), mode)
+            self.moves = self._open('moves', np.uint16, (self.capacity,), mode)
+            self.outcomes = self._open('outcomes', np.int8, (self.capacity,), mode)
+            self.sequence = self._open('sequence', np.int64, (self.capacity,), mode)
+        logger.info('Opened replay buffer {} ({} of {} samples)'.format(
+            path, len(self), self.capacity))
+
+
+    def _open(self, name, dtype, shape, mode):
+        return np.memmap(os.path.join(self.path, name), dtype=dtype,
+                         mode=mode, shape=shape)
+
+
+    def locked(self):
+        return _FileLock(self.lock_file)
+
+
+    def __len__(self):
+        return int(min(self.header[TOTAL], self.capacity))
+
+
+    def total(self):
+        """Number of samples ever added."""
+        return int(self.header[TOTAL])
+
+
+    def add_batch(self, positions, moves, outcomes):
+        """
+        Append samples: positions as a (n, width) uint8 array (or a list of
+        packed snapshots), moves and outcomes as sequences of n numbers.
+        """
+        if not isinstance(positions, np.ndarray):
+            positions = np.frombuffer(b''.join(positions), dtype=np.uint8)
+        positions = positions.reshape(-1, self.width)
+        count = len(positions)
+        if count > self.capacity:
+            # Only the last ones would survive anyway.
+            positions = positions[-self.capacity:]
+            moves, outcomes = moves[-self.capacity:], outcomes[-self.capacity:]
+            count = self.capacity
+
+        with self.locked():
+            start = int(self.header[TOTAL])
+            self.header[TOTAL] = start + count
+        slots = np.arange(start, start + count) % self.capacity
+
+        self.sequence[slots] = 0
+        self.positions[slots] = positions
+        self.moves[slots] = moves
+        self.outcomes[slots] = outcomes
+        self.sequence[slots] = np.arange(start, start + count) + 1
+
+
+    def add_game(self, snapshots, moves, winner):
+        """
+        Append all positions of a game, with the moves played in them and the
+        code of the winner (0 for a draw).
+        """
+        size = self.n_rows ** 2
+        positions = [snapshot.pack() for snapshot in snapshots]
+        cells = [x * size + y for x, y in moves]
+        outcomes = [0 if not winner else (1 if snapshot.turn + 1 == winner else -1)
+                    for snapshot in snapshots]
+        self.add_batch(positions, cells, outcomes)
+
+
+    def sample(self, batch_size, rng=np.random, attempts=4):
+        """
+        Random minibatch of samples.
+
+        obj.sample(batch_size) -> (positions, moves, outcomes)
+
+        The samples are gathered straight from the memory-mapped files into
+        the batch arrays with one fancy index per array. rng is a
+        np.random.Generator, a np.random.RandomState or np.random itself.
+
+        Slots that a writer touched while they were read are left out (the
+        sequence number is read before and after, like a seqlock) and drawn
+        again, at most attempts times, so the batch can be smaller than
+        batch_size when many samples are being written.
+        """
+        count = len(self)
+        if not count:
+            raise ValueError('The replay buffer is empty')
+        integers = rng.integers if hasattr(rng, 'integers') else rng.randint
+        batches = []
+        needed = batch_size
+        for _ in range(attempts):
+            slots = integers(0, count, size=needed)
+            before = np.array(self.sequence[slots])
+            positions = self.positions[slots]
+            moves = self.moves[slots]
+            outcomes = self.outcomes[slots]
+            valid = (before != 0) & (before == self.sequence[slots])
+            batches.append((positions[valid], moves[valid], outcomes[valid]))
+            needed -= int(valid.sum())
+            if not needed:
+                break
+        if len(batches) == 1:
+            return batches[0]
+        return tuple(np.concatenate(parts) for parts in zip(*batches))
+
+
+    def flush(self):
+        for array in (self.header, self.positions, self.moves, self.outcomes,
+                      self.sequence):
+            array.flush()
+
+
+    def close(self):
+        self.flush()
+        self.lock_file.close()
+
+
+class _FileLock(object):
+    def __init__(self, f):
+        self.f = f
+
+    def __enter__(self):
+        fcntl.flock(self.f, fcntl.LOCK_EX)
+
+    def __exit__(self, *exc_info):
+        fcntl.flock(self.f, fcntl.LOCK_UN)
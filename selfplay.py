@@ -0,0 +1,106 @@
+"""
+Headless games between AIs, for self-play and tournaments.
+
+AIs are given as specs, so they can be sent to other processes: a tuple of
+the dotted path of an AI class (an AIMixin that is not a Piece, see
+pieces.make_ai_piece) and a dict of attributes to set on it, e.g.
+
+    ('mcts.MCTSAI', {'time_budget': 0.1})
+"""
+import array, random, logging
+
+from board import AIBoard
+from pieces import Cross, Nought, load_ai_class, make_ai_piece
+from constants import CROSS_COLOR, NOUGHT_COLOR, N_ROWS
+from config import SELFPLAY_LOGGING_LEVEL
+
+logger = logging.getLogger(__name__)
+logger.setLevel(SELFPLAY_LOGGING_LEVEL)
+
+PIECES = ((Cross, CROSS_COLOR), (Nought, NOUGHT_COLOR))
+
+
+def make_player(spec, i):
+    """Create the AI piece for spec, playing as the i-th player."""
+    path, attributes = spec
+    piece_class, color = PIECES[i]
+    player = make_ai_piece(load_ai_class(path), piece_class, color)
+    for name, value in attributes.items():
+        setattr(player, name, value)
+    return player
+
+
+def seed_players(players, seed):
+    """Give the players of a game their own seed, derived from seed."""
+    if seed is None:
+        return
+    for i, player in enumerate(players):
+        if hasattr(player, 'seed'):
+            player.seed = seed * len(players) + i
+
+
+def make_players(specs, seed=None):
+    """Create the AI pieces for specs, the first one plays first."""
+    players = [make_player(spec, i) for i, spec in enumerate(specs)]
+    seed_players(players, seed)
+    return players
+
+
+class Players(object):
+    """
+    AI pieces that are reused for every game of a process, so their memory
+    (like the NodePool of mcts.MCTSAI) is only allocated once. An AI is
+    reset for every game, like on a new game in the GUI (see
+    AIMixin.save_board_info), and gets the seed of the game.
+    """
+    # Forget all players when there are more, e.g. when tuning makes new
+    # specs all the time.
+    max_players = 16
+
+    def __init__(self):
+        self.players = {}
+
+    def get(self, specs, seed=None):
+        """The AI pieces for specs, the first one plays first."""
+        players = []
+        for i, spec in enumerate(specs):
+            # The attributes can be dicts themselves, which can't be hashed.
+            key = (i, repr(spec))
+            player = self.players.get(key)
+            if player is None:
+                if len(self.players) >= self.max_players:
+                    self.players.clear()
+                player = self.players[key] = make_player(spec, i)
+            players.append(player)
+        seed_players(players, seed)
+        return players
+
+
+def play_game(specs, n_rows=N_ROWS, seed=None, players=None):
+    """
+    Play a game between the AIs of specs (or the ready made players, e.g.
+    from Players.get).
+
+    obj.play_game(specs) -> (winner, moves)
+
+    winner is 1 if the first AI won, 2 if the second one did and 0 for a
+    draw. An AI that makes an illegal move loses. moves is an array.array
+    with the cell index (x * n_rows ** 2 + y) of every move.
+    """
+    if seed is not None:
+        # Some AIs (like pieces.RandomAI) use the random module.
+        random.seed(seed)
+    if players is None:
+        players = make_players(specs, seed)
+    board = AIBoard(players, n_rows)
+    size = n_rows ** 2
+    moves = array.array('B' if size ** 2 <= 256 else 'H')
+    while not board.game_over:
+        player = board.get_turn()
+        move = board.get_ai_move(player)
+        if not board.make_a_move(move):
+            logger.warning('{} made an illegal move: {}'.format(player, move))
+            return 2 - board.turn, moves
+        moves.append(move[0] * size + move[1])
+    winner = board.piece_codes.get(board.winner, 0)
+    return winner, moves
@@ -0,0 +1,341 @@
+"""
+Exact endgame solver, using proof-number search on the rules of board.Board.
+
+Results are from the point of view of the player to move: WIN, DRAW or LOSS.
+A position is solved with (at most) two searches: first try to prove the
+player to move wins, if that fails try to prove they at least draw.
+
+Everything that gets solved along the way is kept in a solution cache, keyed
+by the canonical form of the position (see symmetry), so later positions of
+the same game (and symmetric ones) are usually solved instantly.
+
+To use it from an AI (with wants_snapshot set):
+
+    def save_board_info(self, n_rows, pieces):
+        self.pieces = pieces
+        self.solver = EndgameSolver()
+
+    def move(self, mutations, allowed_moves, snapshot):
+        move = self.solver.best_move(Board.from_snapshot(self.pieces, snapshot))
+        if move is None:
+            # Not solvable (yet), think of something else.
+"""
+import sys, time, array, logging
+
+import symmetry
+from config import (SOLVER_LOGGING_LEVEL, SOLVER_MAX_NODES,
+                    SOLVER_MAX_EMPTY_TILES)
+
+logger = logging.getLogger(__name__)
+logger.setLevel(SOLVER_LOGGING_LEVEL)
+
+WIN, DRAW, LOSS = 1, 0, -1
+
+# Proof and disproof number of nodes that are (dis)proven.
+INFINITY = 10**9
+
+# What the player to move at the root of a search tries to prove.
+GOAL_WIN = WIN
+GOAL_DRAW = DRAW
+
+
+class _Node(object):
+    __slots__ = ('pn', 'dn', 'move', 'children', 'is_or', 'key')
+
+    def __init__(self, move, is_or, key):
+        self.pn = 1
+        self.dn = 1
+        self.move = move
+        self.children = None
+        self.is_or = is_or
+        self.key = key
+
+
+class EndgameSolver(object):
+    def __init__(self, max_nodes=SOLVER_MAX_NODES,
+                 max_empty_tiles=SOLVER_MAX_EMPTY_TILES):
+        """
+        max_nodes is the number of nodes a single call to solve may create.
+        Positions with more than max_empty_tiles playable tiles are not
+        even tried by best_move.
+        """
+        self.max_nodes = max_nodes
+        self.max_empty_tiles = max_empty_tiles
+        # key -> [lower bound, upper bound, best move in canonical coords]
+        self.cache = {}
+        self.nodes = 0
+        self.seconds = 0.0
+        self.peak_tree_nodes = 0
+
+
+    def clear(self):
+        """Empty the solution cache and reset the counters."""
+        self.cache = {}
+        self.nodes = 0
+        self.seconds = 0.0
+        self.peak_tree_nodes = 0
+
+
+    def stats(self):
+        """
+        Instrumentation of the solver, as a dict with:
+            nodes:            nodes created in total
+            seconds:          time spent searching in total
+            nodes_per_second: nodes / seconds
+            peak_tree_nodes:  largest search tree so far
+            cache_entries:    positions in the solution cache
+            cache_bytes:      approximate memory used by the solution cache
+        """
+        cache_bytes = sys.getsizeof(self.cache)
+        for key, entry in self.cache.items():
+            cache_bytes += sys.getsizeof(key) + sys.getsizeof(entry)
+        return {
+            'nodes': self.nodes,
+            'seconds': self.seconds,
+            'nodes_per_second': self.nodes / self.seconds if self.seconds else 0.0,
+            'peak_tree_nodes': self.peak_tree_nodes,
+            'cache_entries': len(self.cache),
+            'cache_bytes': cache_bytes,
+        }
+
+
+    def save_state(self, writer):
+        """
+        Add the solution cache to a checkpoint, as arrays: the keys one after
+        the other (with where every key ends), the bounds and the moves
+        (-1, -1 for no move).
+        """
+        writer.set('nodes', self.nodes)
+        writer.set('seconds', self.seconds)
+        writer.set('peak_tree_nodes', self.peak_tree_nodes)
+        entries = self.cache.values()
+        key_ends, end = array.array('Q'), 0
+        for key in self.cache:
+            end += len(key)
+            key_ends.append(end)
+        writer.add_array('keys', array.array('B', b''.join(self.cache)))
+        writer.add_array('key_ends', key_ends)
+        writer.add_array('bounds', array.array(
+            'b', [bound for entry in entries for bound in entry[:2]]))
+        writer.add_array('moves', array.array(
+            'h', [i for entry in entries
+                  for i in (entry[2] if entry[2] is not None else (-1, -1))]))
+
+
+    def load_state(self, reader):
+        """Restore the solution cache saved by save_state."""
+        self.nodes = reader.get('nodes', 0)
+        self.seconds = reader.get('seconds', 0.0)
+        self.peak_tree_nodes = reader.get('peak_tree_nodes', 0)
+        keys = reader.array('keys').tobytes()
+        bounds = reader.array('bounds').tolist()
+        moves = reader.array('moves').tolist()
+        cache = {}
+        start = 0
+        for i, end in enumerate(reader.array('key_ends')):
+            x, y = moves[2 * i], moves[2 * i + 1]
+            cache[keys[start:end]] = [bounds[2 * i], bounds[2 * i + 1],
+                                      None if x < 0 else (x, y)]
+            start = end
+        self.cache = cache
+
+
+    def count_empty_tiles(self, board):
+        """Count the empty tiles in megatiles nobody has won yet."""
+        return board.n_open_empty
+
+
+    def is_endgame(self, board):
+        """Check whether it is worth trying to solve the position on board."""
+        return self.count_empty_tiles(board) <= self.max_empty_tiles
+
+
+    def best_move(self, board, deadline=None):
+        """
+        Return a move that plays perfectly from the position on board, or None
+        if the position is not (yet) solvable within the node budget (or
+        before deadline, a time.perf_counter() time).
+        """
+        if board.game_over:
+            return None
+        if board.is_dead_draw():
+            # Every move draws.
+            return board.allowed_moves[0]
+        key, transform = symmetry.canonicalize(board)
+        entry = self.cache.get(key)
+        if entry is None or entry[0] != entry[1] or entry[2] is None:
+            if not self.is_endgame(board):
+                return None
+            if self.solve(board, deadline=deadline) is None:
+                return None
+            entry = self.cache[key]
+        return symmetry.from_canonical(entry[2], transform, board.n_rows)
+
+
+    def solve(self, board, max_nodes=None, deadline=None):
+        """
+        Solve the position on board.
+
+        obj.solve(board) -> (result, move) or None
+
+        Returns None if it could not be solved within max_nodes nodes, or
+        before deadline (a time.perf_counter() time).
+        """
+        max_nodes = self.max_nodes if max_nodes is None else max_nodes
+        key, transform = symmetry.canonicalize(board)
+        entry = self.cache.get(key)
+        if entry is None or entry[0] != entry[1] or entry[2] is None:
+            start = time.perf_counter()
+            try:
+                entry = self._solve(board, key, transform, max_nodes, deadline)
+            finally:
+                self.seconds += time.perf_counter() - start
+            if entry is None:
+                logger.info('Not solved within {} nodes or in time'.format(
+                    max_nodes))
+                return None
+        result, move = entry[0], entry[2]
+        # stats() measures the whole cache, only do that when it's logged.
+        if logger.isEnabledFor(logging.INFO):
+            logger.info('Solved: {} ({})'.format(result, self.stats()))
+        return result, symmetry.from_canonical(move, transform, board.n_rows)
+
+
+    def _solve(self, board, key, transform, max_nodes, deadline):
+        if board.game_over:
+            return None
+        budget = self.nodes + max_nodes
+        win_root = self._search(board, GOAL_WIN, budget, deadline)
+        if win_root is None:
+            return None
+        if win_root.pn == 0:
+            result, root = WIN, win_root
+        else:
+            root = self._search(board, GOAL_DRAW, budget, deadline)
+            if root is None:
+                return None
+            result = DRAW if root.pn == 0 else LOSS
+
+        if result == LOSS:
+            # Every move loses, any will do.
+            move = root.children[0].move
+        else:
+            move = next(child.move for child in root.children if child.pn == 0)
+        entry = self.cache[key]
+        entry[2] = symmetry.to_canonical(move, transform, board.n_rows)
+        return entry
+
+
+    def _search(self, board, goal, budget, deadline=None):
+        """
+        Prove or disprove that the player to move on board reaches goal.
+
+        Returns the root node of the search tree, or None if the budget
+        ran out (or the deadline passed) first.
+        """
+        attacker = board.turn
+        key, _ = symmetry.canonicalize(board)
+        root = _Node(None, True, key)
+        tree_nodes = 1
+        expansions = 0
+        while root.pn and root.dn:
+            if self.nodes >= budget:
+                return None
+            # Like the tree search, only look at the clock every so often.
+            expansions += 1
+            if deadline is not None and not expansions % 16 and \
+               time.perf_counter() >= deadline:
+                return None
+
+            # Find the most proving node.
+            path = [root]
+            working = board.clone()
+            working.end_dead_draws = True
+            node = root
+            while node.children is not None:
+                if node.is_or:
+                    node = min(node.children, key=lambda child: child.pn)
+                else:
+                    node = min(node.children, key=lambda child: child.dn)
+                working.make_a_move(node.move)
+                path.append(node)
+
+            tree_nodes += self._expand(node, working, attacker, goal)
+
+            # Update the proof and disproof numbers back to the root.
+            for node in reversed(path):
+                if node.is_or:
+                    node.pn = min(child.pn for child in node.children)
+                    node.dn = min(INFINITY, sum(child.dn for child in node.children))
+                else:
+                    node.pn = min(INFINITY, sum(child.pn for child in node.children))
+                    node.dn = min(child.dn for child in node.children)
+
+        self.peak_tree_nodes = max(self.peak_tree_nodes, tree_nodes)
+        self._store(root, goal)
+        return root
+
+
+    def _expand(self, node, board, attacker, goal):
+        """Create the children of node, return how many were created."""
+        node.children = []
+        for move in board.allowed_moves:
+            child_board = board.clone()
+            child_board.make_a_move(move)
+            self.nodes += 1
+            if child_board.game_over:
+                child = _Node(move, False, None)
+                if child_board.winner is None:
+                    value = DRAW
+                else:
+                    value = WIN if child_board.winner is board.pieces[attacker] else LOSS
+                self._set_decided(child, value >= goal)
+            else:
+                key, _ = symmetry.canonicalize(child_board)
+                child = _Node(move, child_board.turn == attacker, key)
+                bounds = self.cache.get(key)
+                if bounds is not None:
+                    lower, upper = bounds[0], bounds[1]
+                    if not child.is_or:
+                        # The cache is from the point of view of the player
+                        # to move, which is the defender here.
+                        lower, upper = -upper, -lower
+                    if lower >= goal:
+                        self._set_decided(child, True)
+                    elif upper < goal:
+                        self._set_decided(child, False)
+            node.children.append(child)
+        return len(node.children)
+
+
+    @staticmethod
+    def _set_decided(node, proven):
+        if proven:
+            node.pn, node.dn = 0, INFINITY
+        else:
+            node.pn, node.dn = INFINITY, 0
+
+
+    def _store(self, root, goal):
+        """Add everything that was (dis)proven in the tree to the cache."""
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if node.children is not None:
+                stack.extend(node.children)
+            if node.key is None or (node.pn and node.dn):
+                continue
+            proven = node.pn == 0
+            # Bounds on the value for the attacker.
+            if proven:
+                lower, upper = goal, WIN
+            else:
+                lower, upper = LOSS, goal - 1
+            if not node.is_or:
+                lower, upper = -upper, -lower
+            entry = self.cache.get(node.key)
+            if entry is None:
+                self.cache[node.key] = [lower, upper, None]
+            else:
+                entry[0] = max(entry[0], lower)
+                entry[1] = min(entry[1], upper)
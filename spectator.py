@@ -0,0 +1,363 @@
+"""
+Watch many self-play games at once: a wall of small boards in one window.
+
+Worker processes play the games (see selfplay) and send every move over a
+queue. A worker plays a few games at the same time, one move in each in
+turn, and starts a new game on a board a moment after its last one ended.
+Messages on the queue are tuples:
+
+    ('new', board_id)             a new game started on the board
+    ('move', board_id, cell)      a move at cell (x * n_rows ** 2 + y)
+    ('over', board_id, winner)    the game is over, winner is 1 or 2 for
+                                  the first or second AI of the specs (not
+                                  of the game) and 0 for a draw
+
+Every frame only draws the tiles that changed since the last one, straight
+to the window (see WallBoard), so the moves of a board in one frame are
+drawn together. The boards don't show the allowed moves.
+
+Usage:
+    python spectator.py [--boards N] [--workers N] [--ai PATH PATH]
+                        [--time SECONDS] [--size PIXELS]
+"""
+import os, sys, math, time, queue, random, logging, argparse, multiprocessing
+
+import pygame
+
+from board import AIBoard
+from selfplay import Players
+from pygame_board import PygameBoard
+from pieces import Cross, Nought
+from constants import (PROGRAM_NAME, BACKGROUND_COLOR, CROSS_COLOR,
+                       NOUGHT_COLOR, N_ROWS, TILE_SIZE, LINE_THICKNESS, TPS,
+                       QUIT_KEY, BOARD_STYLE, SPECTATOR_BOARD_SIZE, SPECTATOR_GAP,
+                       SPECTATOR_PAUSE)
+from config import SPECTATOR_LOGGING_LEVEL
+
+logger = logging.getLogger(__name__)
+logger.setLevel(SPECTATOR_LOGGING_LEVEL)
+
+# At most this many messages are handled per frame, the rest waits for the
+# next frame, so the window keeps responding when the workers are fast.
+MAX_MESSAGES = 1000
+
+
+def play_games(board_ids, specs, n_rows, seed, messages, stop, pause):
+    """
+    Play games on the boards board_ids (one at a time per board, switching
+    who starts every game) until stop is set, sending the moves to the
+    messages queue.
+    """
+    # Some AIs (like pieces.RandomAI) use the random module.
+    random.seed(seed)
+    # Every board has its own players, a board plays one game at a time.
+    players = {board_id: Players() for board_id in board_ids}
+    games = {}
+    swapped = {}
+    restart = dict.fromkeys(board_ids, 0)
+    n_games = 0
+    while not stop.is_set():
+        now = time.monotonic()
+        for board_id in board_ids:
+            board = games.get(board_id)
+            if board is None:
+                if now < restart[board_id]:
+                    continue
+                swapped[board_id] = n_games % 2 == 1
+                order = specs[::-1] if swapped[board_id] else specs
+                board = AIBoard(players[board_id].get(order, seed + n_games),
+                                n_rows)
+                games[board_id] = board
+                n_games += 1
+                messages.put(('new', board_id))
+
+            player = board.get_turn()
+            move = board.get_ai_move(player)
+            if board.make_a_move(move):
+                messages.put(('move', board_id, move[0] * n_rows**2 + move[1]))
+                if not board.game_over:
+                    continue
+                winner = board.piece_codes.get(board.winner, 0)
+            else:
+                logger.warning('{} made an illegal move: {}'.format(player, move))
+                winner = 2 - board.turn
+            if winner and swapped[board_id]:
+                winner = 3 - winner
+            messages.put(('over', board_id, winner))
+            del games[board_id]
+            restart[board_id] = time.monotonic() + pause
+
+        if not games:
+            # Every board shows a finished game.
+            time.sleep(max(0, min(restart.values()) - time.monotonic()))
+
+
+class WallBoard(PygameBoard):
+    """
+    A PygameBoard that draws only its changed tiles, with their highlights,
+    to the window. The allowed moves are not highlighted (or even listed).
+    """
+    @copy_ancestor_docstring
+    def reset(self):
+        super(WallBoard, self).reset()
+        self.last_move = None
+        # Highlights and winning lines of one tile, see draw_overlay.
+        self.overlay = None
+
+    @copy_ancestor_docstring
+    def make_a_move(self, coords, forced=False):
+        # Like AIBoard does it, PygameBoard redraws all highlights every move.
+        legal = super(PygameBoard, self).make_a_move(coords, forced)
+        if legal:
+            if self.last_move is not None:
+                self.dirty_tiles.add(self.last_move)
+            self.last_move = tuple(coords)
+        return legal
+
+    @copy_ancestor_docstring
+    def update_allowed_moves(self, last_move):
+        super(PygameBoard, self).update_allowed_moves(last_move)
+
+    @copy_ancestor_docstring
+    def clear_allowed_moves(self):
+        super(PygameBoard, self).clear_allowed_moves()
+
+    @copy_ancestor_docstring
+    def find_winner(self, last_piece, last_move):
+        lines = super(WallBoard, self).find_winner(last_piece, last_move)
+        if len(lines) > 1:
+            # The game is won, the big line crosses the whole board.
+            self.redraw_all = True
+        elif lines:
+            # The megatile is highlighted now.
+            n = self.n_rows
+            start_x, start_y = (c // n * n for c in last_move)
+            self.dirty_tiles.update((start_x + x, start_y + y)
+                                    for x in range(n) for y in range(n))
+        return lines
+
+    def draw_highlights(self):
+        """Highlights are drawn with the tiles, see draw_changes."""
+        pass
+
+    def draw_changes(self, window, topleft):
+        """
+        Draw the tiles that changed since the last call to window, with the
+        board at topleft. Returns the rects of window that changed.
+        """
+        if self.redraw_all:
+            return [self.draw_all(window, topleft)]
+        rects = []
+        for coords in self.dirty_tiles:
+            rect = pygame.Rect(self.coords_to_pos(coords),
+                               [self.tile_line_size]*2)
+            # Draw the tile and what lies over it. The big lines are not
+            # clipped (pygame drops thick lines with their middle outside
+            # the clip), only the tile is copied to the window; whatever
+            # else they draw over is drawn again before it is copied.
+            self.draw_tile(coords, self.surface)
+            self.draw_big_lines(self.surface)
+            self.draw_overlay(coords, rect)
+            window_rect = rect.move(topleft)
+            window.blit(self.surface, window_rect, rect)
+            rects.append(window_rect)
+        self.dirty_tiles = set()
+        return rects
+
+    def draw_all(self, window, topleft):
+        """Draw the whole board to window, returns its rect."""
+        PygameBoard.draw_highlights(self)
+        if self.last_move is not None:
+            x, y = (i + self.line_thickness for i in self.coords_to_pos(self.last_move))
+            pygame.draw.rect(self.highlight_surf, self.style['last-move-color'],
+                             pygame.Rect((x, y), (self.tile_size,)*2), 0)
+        self.draw_board()
+        return window.blit(self.surface, topleft)
+
+    def get_highlight_color(self, coords):
+        """
+        The color of the highlight of the tile at coords (the last one, like
+        PygameBoard.draw_highlights), or None.
+        """
+        if coords == self.last_move:
+            return self.style['last-move-color']
+        colors = [color for h_coords, color in self.highlights
+                  if tuple(h_coords) == coords]
+        return colors[-1] if colors else None
+
+    def draw_overlay(self, coords, rect):
+        """
+        Draw the highlight and winning lines of the tile at coords (in rect)
+        to the surface, like draw_board does with highlight_surf.
+        """
+        # Lines just outside the tile can be thick enough to reach into it.
+        pad = self.style['winning-line-thickness']
+        near = rect.inflate(2 * pad, 2 * pad)
+        lines = [line for line in self.winning_lines if near.clipline(*line)]
+        color = self.get_highlight_color(coords)
+        if color is None and not lines:
+            return
+        if self.overlay is None:
+            self.overlay = pygame.Surface([self.tile_line_size + 2 * pad]*2,
+                                          pygame.SRCALPHA)
+        overlay = self.overlay
+        overlay.fill((0, 0, 0, 0))
+        if color is not None:
+            overlay.fill(color, pygame.Rect([pad + self.line_thickness]*2,
+                                            [self.tile_size]*2))
+        dx, dy = pad - rect.x, pad - rect.y
+        thickness = self.style['winning-line-thickness']
+        for line in lines:
+            ends = [(x + dx, y + dy) for x, y in line]
+            pygame.draw.line(overlay, self.style['winning-line-color'],
+                             ends[0], ends[1], thickness)
+            for end in ends:
+                pygame.draw.circle(overlay, self.style['winning-line-color'],
+                                   end, thickness // 2, 0)
+        self.surface.blit(overlay, rect, pygame.Rect((pad, pad), rect.size))
+
+
+class Wall(object):
+    """The boards of the games, laid out in a grid on the window."""
+    def __init__(self, n_boards, board_size, n_rows=N_ROWS, gap=SPECTATOR_GAP):
+        self.n_rows = n_rows
+        self.n_columns = int(math.ceil(math.sqrt(n_boards)))
+        n_wall_rows = int(math.ceil(n_boards / self.n_columns))
+
+        # Draw the boards at their small size, so they never need scaling.
+        tile_size = board_size // n_rows**2 - 2 * LINE_THICKNESS
+        tile_size -= 1 - tile_size % 2
+        style = dict(BOARD_STYLE)
+        style['winning-line-thickness'] = max(
+            2, BOARD_STYLE['winning-line-thickness'] * tile_size // TILE_SIZE)
+        pieces = (Cross(CROSS_COLOR), Nought(NOUGHT_COLOR))
+        self.boards = []
+        for i in range(n_boards):
+            board = WallBoard(pieces, tile_size, LINE_THICKNESS, 0, style,
+                              n_rows)
+            board.pygame_init()
+            if self.boards:
+                # The empty grid is only ever blitted, the boards can share it.
+                board.empty_grid_surf = self.boards[0].get_empty_grid()
+            self.boards.append(board)
+
+        step = self.boards[0].inner_size + gap
+        self.rects = [pygame.Rect(gap + i % self.n_columns * step,
+                                  gap + i // self.n_columns * step,
+                                  step - gap, step - gap)
+                      for i in range(n_boards)]
+        self.size = (gap + self.n_columns * step, gap + n_wall_rows * step)
+        self.dirty = set(range(n_boards))
+        self.scores = [0, 0, 0]
+
+    def handle(self, message):
+        """Apply a message of the workers to its board."""
+        kind, board_id = message[:2]
+        board = self.boards[board_id]
+        if kind == 'new':
+            board.reset()
+        elif kind == 'move':
+            coords = divmod(message[2], self.n_rows**2)
+            if not board.make_a_move(coords):
+                logger.warning('Board {}: move {} is not possible'.format(
+                    board_id, coords))
+        elif kind == 'over':
+            self.scores[message[2]] += 1
+        self.dirty.add(board_id)
+
+    def draw(self, window):
+        """Draw the boards that changed to window, returns their rects."""
+        rects = []
+        for board_id in self.dirty:
+            rects.extend(self.boards[board_id].draw_changes(
+                window, self.rects[board_id].topleft))
+        self.dirty = set()
+        return rects
+
+
+def start_workers(n_boards, n_workers, specs, n_rows, seed, pause):
+    """Start the worker processes, returns (messages, stop, processes)."""
+    messages = multiprocessing.Queue()
+    stop = multiprocessing.Event()
+    processes = []
+    for i in range(n_workers):
+        board_ids = list(range(i, n_boards, n_workers))
+        process = multiprocessing.Process(
+            target=play_games, daemon=True,
+            args=(board_ids, specs, n_rows, seed + i * 1000003, messages,
+                  stop, pause))
+        process.start()
+        processes.append(process)
+    return messages, stop, processes
+
+
+def run(n_boards, n_workers, specs, n_rows=N_ROWS, seed=0,
+        board_size=SPECTATOR_BOARD_SIZE, pause=SPECTATOR_PAUSE):
+    """Show the wall until the window is closed."""
+    pygame.init()
+    wall = Wall(n_boards, board_size, n_rows)
+    window = pygame.display.set_mode(wall.size)
+    window.fill(BACKGROUND_COLOR)
+    pygame.display.update()
+
+    n_workers = min(n_workers, n_boards)
+    messages, stop, processes = start_workers(n_boards, n_workers, specs,
+                                              n_rows, seed, pause)
+    names = [path.rpartition('.')[2] for path, attributes in specs]
+    scores = None
+    clock = pygame.time.Clock()
+    try:
+        while True:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT or \
+                   (event.type == pygame.KEYUP and event.key == QUIT_KEY):
+                    return
+
+            for _ in range(MAX_MESSAGES):
+                try:
+                    wall.handle(messages.get_nowait())
+                except queue.Empty:
+                    break
+
+            rects = wall.draw(window)
+            if rects:
+                pygame.display.update(rects)
+            if wall.scores != scores:
+                scores = list(wall.scores)
+                pygame.display.set_caption(
+                    '{} - {} {}, {} {}, draws {}'.format(
+                        PROGRAM_NAME, names[0], scores[1], names[1],
+                        scores[2], scores[0]))
+            clock.tick(TPS)
+    finally:
+        stop.set()
+        for process in processes:
+            process.join(1)
+            if process.is_alive():
+                process.terminate()
+        pygame.quit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--boards', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--ai', nargs=2, default=['pieces.RandomAI'] * 2,
+                        help='dotted paths of the two AI classes')
+    parser.add_argument('--time', type=float, default=None,
+                        help='time_budget of the AIs, in seconds')
+    parser.add_argument('--n-rows', type=int, default=N_ROWS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--size', type=int, default=SPECTATOR_BOARD_SIZE,
+                        help='pixels per board')
+    args = parser.parse_args(argv)
+    logging.basicConfig()
+
+    attributes = {} if args.time is None else {'time_budget': args.time}
+    specs = tuple((path, attributes) for path in args.ai)
+    run(args.boards, args.workers or os.cpu_count() or 1, specs, args.n_rows,
+        args.seed, args.size)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
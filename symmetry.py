@@ -0,0 +1,133 @@
+"""
+Dihedral symmetries of a Mega3T position.
+
+A board of n_rows * n_rows megatiles is an n_rows ** 2 by n_rows ** 2 grid of
+subtiles. Rotating or mirroring that whole grid rotates or mirrors the big
+board and every megatile in the same way, and the megatile a player is sent to
+moves along with them. So every position has (up to) 8 equivalent versions.
+
+Subtile (x, y) has cell index x * n_rows ** 2 + y, which is the order of
+board.subtiles flattened.
+
+Transforms are numbered 0 to 7:
+
+    0: identity             4: mirror x
+    1: rotate 90 degrees    5: mirror y
+    2: rotate 180 degrees   6: transpose
+    3: rotate 270 degrees   7: anti-transpose
+"""
+import functools, operator
+
+N_TRANSFORMS = 8
+IDENTITY = 0
+
+# Transform 1 and 3 undo each other, all others undo themselves.
+INVERSE = (0, 3, 2, 1, 4, 5, 6, 7)
+
+
+def transform_coords(coords, transform, size):
+    """
+    Apply a transform to coordinates in a size * size grid.
+
+    obj.transform_coords((x, y), transform, size) -> (x', y')
+    """
+    x, y = coords
+    m = size - 1
+    if transform == 0:
+        return (x, y)
+    elif transform == 1:
+        return (y, m - x)
+    elif transform == 2:
+        return (m - x, m - y)
+    elif transform == 3:
+        return (m - y, x)
+    elif transform == 4:
+        return (m - x, y)
+    elif transform == 5:
+        return (x, m - y)
+    elif transform == 6:
+        return (y, x)
+    elif transform == 7:
+        return (m - y, m - x)
+    raise ValueError('transform must be in range({}), got {!r}'.format(
+        N_TRANSFORMS, transform))
+
+
+@functools.lru_cache(maxsize=None)
+def get_tables(n_rows):
+    """
+    Precomputed permutation tables for a board with n_rows.
+
+    Returns a dict with:
+        'cells':     per transform, a tuple mapping cell index -> new index
+        'gather':    per transform, an itemgetter that, given a sequence of
+                     per-cell values, returns them in transformed order
+        'megatiles': per transform, a tuple mapping megatile index -> new index
+        'gather_megatiles': like 'gather', for per-megatile values
+    """
+    size = n_rows ** 2
+    tables = {'cells': [], 'gather': [], 'megatiles': [], 'gather_megatiles': []}
+    for transform in range(N_TRANSFORMS):
+        for grid_size, perm_key, gather_key in ((size, 'cells', 'gather'),
+                (n_rows, 'megatiles', 'gather_megatiles')):
+            perm = [0] * grid_size ** 2
+            for x in range(grid_size):
+                for y in range(grid_size):
+                    new_x, new_y = transform_coords((x, y), transform, grid_size)
+                    perm[x * grid_size + y] = new_x * grid_size + new_y
+            # gather[new] = old, so new_values = gather(old_values)
+            gather = [0] * len(perm)
+            for old, new in enumerate(perm):
+                gather[new] = old
+            tables[perm_key].append(tuple(perm))
+            tables[gather_key].append(operator.itemgetter(*gather))
+    return tables
+
+
+def position_codes(snapshot):
+    """
+    Encode the state of a board.Snapshot as small integers.
+
+    obj.position_codes(snapshot) -> (cell_codes, megatile_codes)
+
+    These are the codes of the snapshot, except that empty subtiles that are
+    allowed moves get board.ALLOWED_CODE, which encodes the forced megatile
+    as well (see board.Snapshot.pack).
+    """
+    return snapshot.pack()[:snapshot.n_rows ** 4], snapshot.megatiles
+
+
+def canonicalize(board):
+    """
+    Find the canonical form of the position on a board.Board or in a
+    board.Snapshot.
+
+    obj.canonicalize(board) -> (key, transform)
+
+    key is a bytes object that is equal for all symmetric positions (with the
+    same player to move), so it can be used as a dictionary key. transform
+    maps the board onto the canonical form: use to_canonical and from_canonical
+    to map moves between them.
+    """
+    if hasattr(board, 'snapshot'):
+        board = board.snapshot()
+    tables = get_tables(board.n_rows)
+    cells, megatiles = position_codes(board)
+    best_key, best_transform = None, IDENTITY
+    for transform in range(N_TRANSFORMS):
+        key = bytes((board.turn,)) + \
+              bytes(tables['gather'][transform](cells)) + \
+              bytes(tables['gather_megatiles'][transform](megatiles))
+        if best_key is None or key < best_key:
+            best_key, best_transform = key, transform
+    return best_key, best_transform
+
+
+def to_canonical(coords, transform, n_rows):
+    """Map a move on the original board to the canonical board."""
+    return transform_coords(coords, transform, n_rows ** 2)
+
+
+def from_canonical(coords, transform, n_rows):
+    """Map a move on the canonical board back to the original board."""
+    return transform_coords(coords, INVERSE[transform], n_rows ** 2)
@@ -0,0 +1,102 @@
+"""
+Timing of AI moves and drawing, as rolling percentiles.
+
+Everything is recorded in telemetry.default, unless you make your own
+Telemetry:
+
+    with telemetry.default.timer('draw_board'):
+        board.draw_board()
+
+    telemetry.default.summary()
+    -> {'draw_board': {'count': 1, 'mean': 0.002, 'p50': 0.002, ...}, ...}
+"""
+import time, logging, collections, contextlib
+
+from config import TELEMETRY_LOGGING_LEVEL, TELEMETRY_WINDOW
+
+logger = logging.getLogger(__name__)
+logger.setLevel(TELEMETRY_LOGGING_LEVEL)
+
+PERCENTILES = (50, 90, 99)
+
+
+class RollingStats(object):
+    def __init__(self, window=TELEMETRY_WINDOW):
+        """Keep the last window samples."""
+        self.samples = collections.deque(maxlen=window)
+        self.count = 0
+
+
+    def add(self, value):
+        self.samples.append(value)
+        self.count += 1
+
+
+    def percentiles(self, percentiles=PERCENTILES):
+        """{percentile: value} over the samples in the window (nearest rank)."""
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {p: None for p in percentiles}
+        last = len(ordered) - 1
+        return {p: ordered[min(last, int(p / 100 * len(ordered)))]
+                for p in percentiles}
+
+
+    def summary(self):
+        ordered = self.samples
+        out = {
+            'count': self.count,
+            'mean': sum(ordered) / len(ordered) if ordered else None,
+            'max': max(ordered) if ordered else None,
+        }
+        for p, value in self.percentiles().items():
+            out['p{}'.format(p)] = value
+        return out
+
+
+class Telemetry(object):
+    def __init__(self, window=TELEMETRY_WINDOW):
+        self.window = window
+        self.timings = {}
+        # Rates (like nodes per second) that were last reported.
+        self.rates = {}
+
+
+    def record(self, name, seconds):
+        """Add a timing in seconds."""
+        stats = self.timings.get(name)
+        if stats is None:
+            stats = self.timings[name] = RollingStats(self.window)
+        stats.add(seconds)
+
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        """Time the body of a with statement."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+
+    def set_rate(self, name, value):
+        self.rates[name] = value
+
+
+    def get(self, name):
+        """The RollingStats of a timing, or None if it was never recorded."""
+        return self.timings.get(name)
+
+
+    def summary(self):
+        """{name: RollingStats.summary()} of all timings."""
+        return {name: stats.summary() for name, stats in self.timings.items()}
+
+
+    def reset(self):
+        self.timings = {}
+        self.rates = {}
+
+
+default = Telemetry()
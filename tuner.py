@@ -0,0 +1,228 @@
+"""
+Tune the evaluation weights of heuristic.HeuristicAI with SPSA
+(simultaneous perturbation stochastic approximation).
+
+Every iteration moves all weights at once a small step up or down at random
+(plus) and the opposite way (minus), lets plus play minus and moves the
+weights towards whichever won. That takes the same number of games however
+many weights there are.
+
+The games are played in pairs over a process pool: both games of a pair get
+the same seed, so the same opening (see HeuristicAI.random_moves) and tie
+breaks, with each side starting once. Most of the luck of a pair cancels out,
+so fewer games per iteration are needed.
+
+Every iteration is appended to a checkpoint file as a JSON line, a tuning run
+that is stopped continues from there. The result (the average of the last
+iterations) is written to config.HEURISTIC_WEIGHTS_FILE, where HeuristicAI
+(and so config.get_pieces, with e.g. heuristic.NoughtHeuristic) finds it.
+
+Usage:
+    python tuner.py [--iterations N] [--pairs N] [--workers N]
+                    [--checkpoint FILE] [--output FILE] [--compare N]
+"""
+import os, sys, json, time, random, logging, argparse, multiprocessing
+
+from heuristic import WEIGHT_NAMES, load_weights, save_weights
+from selfplay import Players, play_game
+from constants import N_ROWS
+from config import (TUNER_LOGGING_LEVEL, HEURISTIC_WEIGHTS_FILE, CACHE_DIR,
+                    TUNER_PAIRS, TUNER_RANDOM_MOVES)
+
+logger = logging.getLogger(__name__)
+logger.setLevel(TUNER_LOGGING_LEVEL)
+
+AI = 'heuristic.HeuristicAI'
+CHECKPOINT_FILE = os.path.join(CACHE_DIR, 'tuner_checkpoint.jsonl')
+
+# Gains of SPSA: iteration k changes the weights by c / (k + 1) ** GAMMA to
+# compare them, and steps a / (k + 1 + STABILITY) ** ALPHA times the result.
+A, C = 0.5, 0.3
+ALPHA, GAMMA = 0.602, 0.101
+STABILITY = 10
+# Weights stay between -LIMIT and LIMIT.
+LIMIT = 5.0
+
+
+# The players of every worker process.
+_players = Players()
+
+def play_pair(job):
+    """
+    Play a pair of games between two sets of weights with the same seed,
+    each starting once. Returns (score of the first weights from 0 to 2,
+    number of moves).
+    """
+    weights_a, weights_b, seed, n_rows, random_moves = job
+    specs = tuple((AI, {'weights': weights, 'random_moves': random_moves})
+                  for weights in (weights_a, weights_b))
+    score = moves = 0
+    for first in (0, 1):
+        order = specs if first == 0 else specs[::-1]
+        winner, game = play_game(order, n_rows, seed, _players.get(order, seed))
+        moves += len(game)
+        if not winner:
+            score += 0.5
+        elif winner - 1 == first:
+            score += 1
+    return score, moves
+
+
+class SPSA(object):
+    def __init__(self, weights, seed=0):
+        self.theta = [float(weights[name]) for name in WEIGHT_NAMES]
+        self.seed = seed
+        self.iteration = 0
+
+    @property
+    def weights(self):
+        return dict(zip(WEIGHT_NAMES, self.theta))
+
+    def perturb(self):
+        """
+        The perturbation of this iteration: (delta, plus, minus), delta is
+        +1 or -1 for every weight, plus and minus are weights dicts.
+        """
+        rng = random.Random(self.seed * 1000003 + self.iteration)
+        delta = [rng.choice((-1, 1)) for _ in self.theta]
+        c = C / (self.iteration + 1) ** GAMMA
+        plus, minus = ({name: clip(value + sign * c * d) for name, value, d
+                        in zip(WEIGHT_NAMES, self.theta, delta)}
+                       for sign in (1, -1))
+        return delta, plus, minus
+
+    def update(self, delta, result):
+        """
+        Step towards plus (result > 0) or minus (result < 0), result is the
+        score of plus minus that of minus per game, from -1 to 1.
+        """
+        k = self.iteration
+        step = A / (k + 1 + STABILITY) ** ALPHA * result / \
+               (2 * C / (k + 1) ** GAMMA)
+        self.theta = [clip(value + step * d)
+                      for value, d in zip(self.theta, delta)]
+        self.iteration += 1
+
+
+def clip(value):
+    return max(-LIMIT, min(LIMIT, value))
+
+
+def read_checkpoint(path):
+    """The records of the iterations in the checkpoint at path, oldest first."""
+    if path is None or not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def average(records, n):
+    """The average weights of the last n records."""
+    records = records[-n:]
+    return {name: sum(record['weights'][name] for record in records) /
+                  len(records)
+            for name in WEIGHT_NAMES}
+
+
+def tune(pool, weights, iterations, n_pairs=TUNER_PAIRS,
+         checkpoint=CHECKPOINT_FILE, n_workers=None, n_rows=N_ROWS,
+         random_moves=TUNER_RANDOM_MOVES, seed=0):
+    """
+    Run SPSA from weights (or from the checkpoint) until iterations
+    iterations are done, playing the games on the multiprocessing pool.
+    Returns the records of all iterations.
+    """
+    spsa = SPSA(weights, seed)
+    records = read_checkpoint(checkpoint)
+    if records:
+        spsa.theta = [records[-1]['weights'][name] for name in WEIGHT_NAMES]
+        spsa.iteration = records[-1]['iteration'] + 1
+        logger.info('Continuing from iteration {}'.format(spsa.iteration))
+
+    n_workers = n_workers or os.cpu_count() or 1
+    chunksize = max(1, n_pairs // (4 * n_workers))
+    log = open(checkpoint, 'a') if checkpoint is not None else None
+    try:
+        while spsa.iteration < iterations:
+            start = time.perf_counter()
+            delta, plus, minus = spsa.perturb()
+            # The seeds are common to plus and minus, new every iteration.
+            first_seed = seed + spsa.iteration * n_pairs
+            jobs = [(plus, minus, first_seed + i, n_rows, random_moves)
+                    for i in range(n_pairs)]
+            results = pool.map(play_pair, jobs, chunksize)
+            score = sum(score for score, moves in results)
+            result = score / n_pairs - 1
+            spsa.update(delta, result)
+
+            record = {'iteration': spsa.iteration - 1,
+                      'weights': spsa.weights,
+                      'result': result,
+                      'games': 2 * n_pairs,
+                      'moves': sum(moves for score, moves in results),
+                      'seconds': round(time.perf_counter() - start, 3)}
+            records.append(record)
+            if log is not None:
+                log.write(json.dumps(record) + '\n')
+                log.flush()
+            logger.info('Iteration {iteration}: result {result:+.3f} in '
+                        '{seconds:.2f}s'.format(**record))
+    finally:
+        if log is not None:
+            log.close()
+    return records
+
+
+def compare(pool, weights_a, weights_b, n_pairs, n_rows=N_ROWS,
+            random_moves=TUNER_RANDOM_MOVES, seed=1 << 20):
+    """The score of weights_a against weights_b per game, from 0 to 1."""
+    jobs = [(weights_a, weights_b, seed + i, n_rows, random_moves)
+            for i in range(n_pairs)]
+    results = pool.map(play_pair, jobs)
+    return sum(score for score, moves in results) / (2 * n_pairs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Tune the weights of '
+                                                 'heuristic.HeuristicAI')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--pairs', type=int, default=TUNER_PAIRS,
+                        help='pairs of games per iteration')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--random-moves', type=int, default=TUNER_RANDOM_MOVES)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--checkpoint', default=CHECKPOINT_FILE)
+    parser.add_argument('--output', default=HEURISTIC_WEIGHTS_FILE)
+    parser.add_argument('--average', type=int, default=20,
+                        help='average the weights of this many last iterations')
+    parser.add_argument('--compare', type=int, default=0, metavar='PAIRS',
+                        help='play the result against the start weights')
+    args = parser.parse_args(argv)
+    logging.basicConfig()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.checkpoint)),
+                exist_ok=True)
+    start_weights = load_weights(args.output)
+    n_workers = args.workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    with multiprocessing.Pool(n_workers) as pool:
+        records = tune(pool, start_weights, args.iterations, args.pairs,
+                       args.checkpoint, n_workers, N_ROWS, args.random_moves,
+                       args.seed)
+        if not records:
+            return
+        weights = average(records, args.average)
+        save_weights(weights, args.output)
+        seconds = time.perf_counter() - start
+        print(json.dumps(weights, indent=4))
+        print('{} iterations, {} games in {:.1f}s, weights written to '
+              '{}'.format(len(records), sum(r['games'] for r in records),
+                          seconds, args.output))
+        if args.compare:
+            score = compare(pool, weights, start_weights, args.compare,
+                            random_moves=args.random_moves)
+            print('Score against the start weights: {:.3f}'.format(score))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])